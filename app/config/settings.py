@@ -55,6 +55,8 @@ INSTALLED_APPS = [
 ]   
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,7 +92,9 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': os.environ.get(
+            'DB_ENGINE', 'django.db.backends.postgresql'
+        ),
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
@@ -99,6 +103,67 @@ DATABASES = {
     }
 }
 
+# Read replicas of the primary, comma separated host or host:port
+# entries sharing its name and credentials. Tests read the primary
+# through them.
+
+DATABASE_REPLICAS = []
+for index, address in enumerate(
+    filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1
+):
+    host, _, port = address.strip().partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Seconds the reads of a client stay on the primary after it writes,
+# longer than the replication lag. The marks are kept in
+# DATABASE_REPLICA_CACHE, which must be shared by every worker process
+# when replicas are set, see core.checks.
+DATABASE_REPLICA_STICKY_SECONDS = int(
+    os.environ.get('DB_REPLICA_STICKY_SECONDS', 5)
+)
+DATABASE_REPLICA_CACHE = os.environ.get('DB_REPLICA_CACHE', 'default')
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Local memory by default, set a shared backend such as memcached in
+# production so all workers see the same entries
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    },
+    # Authenticated API tokens. Entries expire after TIMEOUT seconds and
+    # the least recently used ones are culled past MAX_ENTRIES. Token
+    # deletion and user changes only reach other workers through a
+    # shared backend, local memory bounds their staleness to TIMEOUT.
+    'tokens': {
+        'BACKEND': os.environ.get(
+            'TOKEN_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('TOKEN_CACHE_LOCATION', 'tokens'),
+        'TIMEOUT': int(os.environ.get('TOKEN_CACHE_TIMEOUT', 60)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.environ.get('TOKEN_CACHE_MAX_ENTRIES', 10000)
+            ),
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -149,9 +214,28 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'user.User'
 
+# Cache alias of the API token authentication
+USER_TOKEN_CACHE = 'tokens'
+
+# Token issued by the token endpoint: 'db' for opaque database tokens,
+# 'signed' for signed access tokens with database refresh tokens.
+# Lifetimes are in seconds.
+USER_TOKEN_MODE = os.environ.get('USER_TOKEN_MODE', 'db')
+USER_ACCESS_TOKEN_LIFETIME = int(
+    os.environ.get('USER_ACCESS_TOKEN_LIFETIME', 300)
+)
+USER_REFRESH_TOKEN_LIFETIME = int(
+    os.environ.get('USER_REFRESH_TOKEN_LIFETIME', 14 * 24 * 60 * 60)
+)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'user.authentication.SignedTokenAuthentication',
+        'user.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
@@ -165,3 +249,83 @@ SPECTACULAR_SETTINGS = {
     'SWAGGER_UI_FAVICON_HREF': 'SIDECAR',
     'REDOC_DIST': 'SIDECAR',
 }
+
+# Metrics
+
+# Networks allowed to read the /metrics endpoint, comma separated
+METRICS_ALLOWED_NETWORKS = os.environ.get(
+    'METRICS_ALLOWED_NETWORKS', '127.0.0.0/8,::1/128'
+).split(',')
+
+# Cache the workers store their metrics in, to be added up by the
+# endpoint. It must be shared by all the worker processes, with the
+# local memory cache the endpoint only reports the worker serving it.
+METRICS_CACHE = os.environ.get('METRICS_CACHE', 'default')
+
+# Seconds between two flushes of the metrics of a worker to the cache
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+
+# Pagination
+
+# Counts of at least this many rows, as estimated by the PostgreSQL
+# planner, are served from the estimate in paginated lists
+ESTIMATED_COUNT_THRESHOLD = int(
+    os.environ.get('ESTIMATED_COUNT_THRESHOLD', 10000)
+)
+
+# Pagination of the wallet lists, 'cursor' for keyset pages without a
+# count or 'page' for numbered pages counted with estimates
+WALLET_LIST_PAGINATION = os.environ.get('WALLET_LIST_PAGINATION', 'cursor')
+
+# Wallet
+
+# Number of times a transfer is retried after a deadlock or a
+# serialization failure, and the base delay in seconds between retries
+WALLET_TRANSFER_RETRIES = int(os.environ.get('WALLET_TRANSFER_RETRIES', 5))
+WALLET_TRANSFER_RETRY_DELAY = float(
+    os.environ.get('WALLET_TRANSFER_RETRY_DELAY', 0.05)
+)
+
+# Number of ledger writes after which a balance checkpoint is recorded
+# for a user, bounding the transactions summed by a ledger balance read
+WALLET_CHECKPOINT_INTERVAL = int(
+    os.environ.get('WALLET_CHECKPOINT_INTERVAL', 100)
+)
+
+# Maximum number of items accepted by the bulk transaction endpoint and
+# number of rows written per INSERT statement
+WALLET_BULK_MAX_ITEMS = int(os.environ.get('WALLET_BULK_MAX_ITEMS', 10000))
+WALLET_BULK_BATCH_SIZE = int(os.environ.get('WALLET_BULK_BATCH_SIZE', 1000))
+
+# Number of rows fetched per round-trip by the streaming export
+WALLET_EXPORT_CHUNK_SIZE = int(
+    os.environ.get('WALLET_EXPORT_CHUNK_SIZE', 2000)
+)
+
+# Maximum number of buckets returned by the balance series endpoint
+WALLET_BALANCE_SERIES_MAX_BUCKETS = int(
+    os.environ.get('WALLET_BALANCE_SERIES_MAX_BUCKETS', 2000)
+)
+
+# Cache alias and timeout in seconds of the user balance cache
+WALLET_BALANCE_CACHE = os.environ.get('WALLET_BALANCE_CACHE', 'default')
+WALLET_BALANCE_CACHE_TIMEOUT = int(
+    os.environ.get('WALLET_BALANCE_CACHE_TIMEOUT', 300)
+)
+
+# Seconds the grand totals of the balance report are cached
+WALLET_REPORT_TOTALS_TIMEOUT = int(
+    os.environ.get('WALLET_REPORT_TOTALS_TIMEOUT', 60)
+)
+
+# Seconds a stored response is replayed for a retried Idempotency-Key
+WALLET_IDEMPOTENCY_KEY_TTL = int(
+    os.environ.get('WALLET_IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+)
+
+# Seconds a claimed Idempotency-Key is held while its request is
+# handled, after which a process that died handling it no longer blocks
+# retries
+WALLET_IDEMPOTENCY_PENDING_TIMEOUT = int(
+    os.environ.get('WALLET_IDEMPOTENCY_PENDING_TIMEOUT', 60)
+)
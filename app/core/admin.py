@@ -1,3 +1,18 @@
 from django.contrib import admin
+from core.db import PeriodQuerySet
+from core.pagination import EstimatedCountPaginator
 
-# Register your models here.
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Admin whose changelist cost does not grow with the table: the
+    count is estimated, the unfiltered total is never counted and the
+    date hierarchy periods are read from the first and last dates."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = PeriodQuerySet(self.model)
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
@@ -0,0 +1,37 @@
+"""
+System checks of the project settings.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+# Cache backends whose entries are only seen by the process writing them
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.dummy.DummyCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+)
+
+
+@register(Tags.caches)
+def check_replica_cache(app_configs, **kwargs):
+    """Check that reads stick to the primary across every worker after
+    a write, which needs a cache shared by all of them"""
+    if not settings.DATABASE_REPLICAS:
+        return []
+    alias = settings.DATABASE_REPLICA_CACHE
+    if alias not in settings.CACHES:
+        return [Error(
+            f'DATABASE_REPLICA_CACHE refers to the undefined cache '
+            f'{alias!r}.',
+            id='core.E001',
+        )]
+    if settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_CACHES:
+        return [Error(
+            f'DATABASE_REPLICA_CACHE {alias!r} is not shared between '
+            f'processes, clients would read stale replicas after their '
+            f'writes.',
+            hint='Use a shared cache backend such as memcached when '
+                 'DB_REPLICA_HOSTS is set.',
+            id='core.E002',
+        )]
+    return []
@@ -0,0 +1,151 @@
+"""
+Query helpers keeping pages of large tables cheap.
+"""
+import json
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import (
+    BooleanField,
+    F,
+    Func,
+    Max,
+    Min,
+    QuerySet,
+    Value,
+)
+from django.utils import timezone
+
+
+def estimate_count(queryset, threshold=None):
+    """Return the number of rows of a queryset and whether it is an
+    estimate. On PostgreSQL the planner estimate is returned when it is
+    above threshold, saving a scan of every matching row, smaller
+    results are counted exactly."""
+    if threshold is None:
+        threshold = settings.ESTIMATED_COUNT_THRESHOLD
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count(), False
+    try:
+        # Joins of select_related() only widen the rows, not their number
+        query = queryset.order_by().query.clone()
+        query.select_related = False
+        sql, params = query.sql_with_params()
+    except EmptyResultSet:
+        return 0, False
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]['Plan']['Plan Rows'])
+    if estimate < threshold:
+        return queryset.count(), False
+    return estimate, True
+
+
+class RowComparison(Func):
+    """Compare the row value of fields with a row of values, such as
+    (created_time, id) < (%s, %s).
+
+    PostgreSQL matches the whole comparison against a composite index
+    of the fields, where the equivalent OR of column comparisons only
+    bounds the scan by the first column."""
+    output_field = BooleanField()
+
+    def __init__(self, fields, operator, values):
+        if len(fields) != len(values):
+            raise ValueError('As many values as fields are required.')
+        self.operator = operator
+        self.width = len(fields)
+        super().__init__(*(F(name) for name in fields), *map(Value, values))
+
+    def resolve_expression(self, *args, **kwargs):
+        resolved = super().resolve_expression(*args, **kwargs)
+        columns = resolved.source_expressions[:self.width]
+        values = resolved.source_expressions[self.width:]
+        # Values are adapted to the database like the fields they match
+        resolved.source_expressions[self.width:] = [
+            Value(value.value, output_field=column.output_field)
+            for column, value in zip(columns, values)
+        ]
+        return resolved
+
+    def as_sql(self, compiler, connection):
+        sql, params = [], []
+        for expression in self.get_source_expressions():
+            expression_sql, expression_params = compiler.compile(expression)
+            sql.append(expression_sql)
+            params.extend(expression_params)
+        left = ', '.join(sql[:self.width])
+        right = ', '.join(sql[self.width:])
+        return f'({left}) {self.operator} ({right})', params
+
+
+def truncate(value, kind):
+    if kind == 'year':
+        return value.replace(month=1, day=1)
+    if kind == 'month':
+        return value.replace(day=1)
+    return value
+
+
+def advance(value, kind):
+    if kind == 'year':
+        return value.replace(year=value.year + 1)
+    if kind == 'month':
+        if value.month == 12:
+            return value.replace(year=value.year + 1, month=1)
+        return value.replace(month=value.month + 1)
+    return value + timedelta(days=1)
+
+
+class PeriodQuerySet(QuerySet):
+    """Queryset listing the periods of dates() and datetimes() between
+    the first and the last value, read with MIN and MAX from an index,
+    instead of looking for the distinct periods of every row.
+
+    Periods without rows are listed too, which suits the drill-down of
+    an admin date hierarchy."""
+    period_kinds = ('year', 'month', 'day')
+
+    def periods(self, field_name, kind, order, tzinfo=None):
+        """Return the first day of every period between the first and
+        the last value of a field"""
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds['first'] is None:
+            return []
+        first, last = bounds['first'], bounds['last']
+        if isinstance(first, datetime):
+            if timezone.is_aware(first):
+                first = timezone.localtime(first, tzinfo)
+                last = timezone.localtime(last, tzinfo)
+            first, last = first.date(), last.date()
+        periods = []
+        current = truncate(first, kind)
+        while current <= last:
+            periods.append(current)
+            current = advance(current, kind)
+        if order == 'DESC':
+            periods.reverse()
+        return periods
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in self.period_kinds:
+            return super().dates(field_name, kind, order)
+        return self.periods(field_name, kind, order)
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None,
+                  is_dst=None):
+        if kind not in self.period_kinds or not settings.USE_TZ:
+            return super().datetimes(
+                field_name, kind, order, tzinfo, is_dst
+            )
+        tzinfo = tzinfo or timezone.get_current_timezone()
+        return [
+            timezone.make_aware(datetime.combine(day, time()), tzinfo)
+            for day in self.periods(field_name, kind, order, tzinfo)
+        ]
@@ -0,0 +1,256 @@
+"""
+HTTP load generator driving a mix of wallet API traffic.
+"""
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.core.servers.basehttp import (
+    ThreadedWSGIServer,
+    WSGIRequestHandler,
+    get_internal_wsgi_application,
+)
+
+
+DEFAULT_MIX = {
+    'charge': 15,
+    'purchase': 10,
+    'transfer': 15,
+    'balance': 35,
+    'list': 25,
+}
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler without the per request log line"""
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(host='127.0.0.1', port=0):
+    """Serve the project WSGI application from a background thread,
+    return the server to shut down and its base URL"""
+    server = ThreadedWSGIServer((host, port), QuietRequestHandler)
+    server.daemon_threads = True
+    server.set_app(get_internal_wsgi_application())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_port}'
+
+
+def parse_mix(value):
+    """Parse a mix like "charge=20,list=80" into action weights"""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in DEFAULT_MIX or not weight.isdigit():
+            raise ValueError(f'Invalid mix item {item!r}.')
+        mix[name] = int(weight)
+    if not any(mix.values()):
+        raise ValueError('The mix needs a positive weight.')
+    return mix
+
+
+def percentile(values, fraction):
+    """Return the nearest rank percentile of sorted values"""
+    index = max(0, min(len(values) - 1, round(fraction * len(values)) - 1))
+    return values[index]
+
+
+class Client:
+    """API client of one simulated user on a keep-alive connection"""
+
+    def __init__(self, base_url, record):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.connection = http.client.HTTPConnection(self.host, self.port)
+        self.record = record
+        self.headers = {'Content-Type': 'application/json'}
+        self.user_id = None
+
+    def request(self, endpoint, method, path, payload=None):
+        """Make a timed request, return its status and decoded body"""
+        body = None if payload is None else json.dumps(payload)
+        start = time.perf_counter()
+        try:
+            self.connection.request(method, path, body, self.headers)
+            response = self.connection.getresponse()
+            content = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = http.client.HTTPConnection(
+                self.host, self.port
+            )
+            content, status = b'', None
+        self.record(endpoint, status, time.perf_counter() - start)
+        try:
+            return status, json.loads(content) if content else None
+        except ValueError:
+            return status, None
+
+    def sign_up(self, email, password='loadtest-pass'):
+        """Register the user and authenticate with its token"""
+        status, data = self.request(
+            'register', 'POST', '/api/user/register/',
+            {'email': email, 'password': password}
+        )
+        if status != 201:
+            return False
+        self.user_id = data['id']
+        status, data = self.request(
+            'token', 'POST', '/api/user/token/',
+            {'email': email, 'password': password}
+        )
+        if status != 200:
+            return False
+        if 'access' in data:
+            self.headers['Authorization'] = f'Bearer {data["access"]}'
+        else:
+            self.headers['Authorization'] = f'Token {data["token"]}'
+        return True
+
+    def charge(self, rand, peers):
+        self.request('charge', 'POST', '/api/wallet/transactions/', {
+            'user': self.user_id,
+            'transaction_type': 1,
+            'amount': rand.randint(100, 1000),
+        })
+
+    def purchase(self, rand, peers):
+        self.request('purchase', 'POST', '/api/wallet/transactions/', {
+            'user': self.user_id,
+            'transaction_type': 2,
+            'amount': rand.randint(1, 50),
+        })
+
+    def transfer(self, rand, peers):
+        receiver = rand.choice(peers)
+        if receiver == self.user_id:
+            return
+        amount = rand.randint(1, 100)
+        self.request('transfer', 'POST', '/api/wallet/transfer/', {
+            'sender_transaction': {
+                'user': self.user_id,
+                'transaction_type': 4,
+                'amount': amount,
+            },
+            'receiver_transaction': {
+                'user': receiver,
+                'transaction_type': 3,
+                'amount': amount,
+            },
+        })
+
+    def balance(self, rand, peers):
+        self.request(
+            'balance', 'GET',
+            '/api/wallet/transactions/0/get_user_balance/'
+        )
+
+    def list(self, rand, peers):
+        self.request(
+            'list', 'GET', '/api/wallet/transactions/?page_size=50'
+        )
+
+
+class LoadTest:
+    """Run concurrent simulated users and collect latencies by
+    endpoint"""
+
+    def __init__(self, base_url, workers, requests, mix=None, seed=0):
+        self.base_url = base_url
+        self.workers = workers
+        self.requests = requests
+        self.mix = mix or DEFAULT_MIX
+        self.seed = seed
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.elapsed = None
+        self.failed_sign_ups = 0
+        self._lock = threading.Lock()
+        self._peers = []
+        self._ready = None
+        self._start = None
+
+    def start(self):
+        self._start = time.perf_counter()
+
+    def record(self, endpoint, status, duration):
+        with self._lock:
+            # Only the requests made once every user signed up count
+            if self._start is None:
+                return
+            if status is not None and 200 <= status < 300:
+                self.latencies[endpoint].append(duration)
+            else:
+                self.errors[endpoint] += 1
+
+    def run_worker(self, index):
+        rand = random.Random(self.seed * 1000003 + index)
+        client = Client(self.base_url, self.record)
+        email = f'loadtest-{self.seed}-{index}-{time.time_ns()}@example.com'
+        if client.sign_up(email):
+            with self._lock:
+                self._peers.append(client.user_id)
+            # Give every user a starting balance before transfers begin
+            client.charge(rand, None)
+        else:
+            with self._lock:
+                self.failed_sign_ups += 1
+        self._ready.wait()
+        if client.user_id is None:
+            return
+        actions = list(self.mix)
+        weights = [self.mix[action] for action in actions]
+        for action in rand.choices(actions, weights, k=self.requests):
+            getattr(client, action)(rand, self._peers)
+        client.connection.close()
+
+    def run(self):
+        """Run the load test and return the report rows. The sign ups
+        are not measured, the timer starts once every worker is set up."""
+        self._start = None
+        self._ready = threading.Barrier(self.workers, action=self.start)
+        threads = [
+            threading.Thread(target=self.run_worker, args=(index,))
+            for index in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.elapsed = time.perf_counter() - self._start
+        return self.report()
+
+    def report(self):
+        """Return (endpoint, requests, errors, req/s, p50, p95, p99)
+        rows with latencies in milliseconds, the last row for all"""
+        rows = []
+        endpoints = sorted(set(self.latencies) | set(self.errors))
+        everything = []
+        for endpoint in endpoints + ['all']:
+            if endpoint == 'all':
+                latencies = sorted(everything)
+                errors = sum(self.errors.values())
+            else:
+                latencies = sorted(self.latencies[endpoint])
+                errors = self.errors[endpoint]
+                everything += latencies
+            if latencies:
+                p50 = statistics.median(latencies) * 1000
+                p95 = percentile(latencies, 0.95) * 1000
+                p99 = percentile(latencies, 0.99) * 1000
+            else:
+                p50 = p95 = p99 = None
+            rows.append((
+                endpoint, len(latencies), errors,
+                len(latencies) / self.elapsed, p50, p95, p99
+            ))
+        return rows
@@ -0,0 +1,111 @@
+"""
+Django command to load test the wallet API.
+"""
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from core.loadtest import DEFAULT_MIX, LoadTest, parse_mix, start_server
+
+
+class Command(BaseCommand):
+    """Django command to drive concurrent API traffic."""
+    help = ('Register users and drive a mix of charge, purchase, transfer, '
+            'balance and list requests from concurrent workers, then report '
+            'throughput and latency percentiles per endpoint, sign ups left '
+            'out. Without --url the app is served in process against a '
+            'throwaway database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Base URL of a running deployment to load instead of '
+                 'serving the app in process.',
+        )
+        parser.add_argument(
+            '--current-db',
+            action='store_true',
+            help='Serve the app on the configured database instead of a '
+                 'throwaway test database.',
+        )
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Number of requests made by each worker after signing up.',
+        )
+        parser.add_argument(
+            '--mix',
+            default=','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items()),
+            help='Relative weights of the actions, e.g. "balance=1,list=1".',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['workers'] < 1:
+            raise CommandError('--workers must be positive.')
+        if options['requests'] < 0:
+            raise CommandError('--requests must not be negative.')
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as error:
+            raise CommandError(error)
+
+        server = old_name = None
+        hosts = nullcontext()
+        url = options['url']
+        if url is None:
+            if not options['current_db']:
+                old_name = connection.settings_dict['NAME']
+                connection.creation.create_test_db(
+                    verbosity=0, autoclobber=True
+                )
+            server, url = start_server()
+            # Without DEBUG the in process server is only reachable once
+            # its address is an allowed host
+            hosts = override_settings(ALLOWED_HOSTS=[
+                *settings.ALLOWED_HOSTS, server.server_address[0]
+            ])
+        try:
+            self.stdout.write(
+                f'Loading {url} with {options["workers"]} workers making '
+                f'{options["requests"]} requests each...'
+            )
+            load_test = LoadTest(
+                url, options['workers'], options['requests'],
+                mix=mix, seed=options['seed']
+            )
+            with hosts:
+                rows = load_test.run()
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        def ms(value):
+            return '-' if value is None else f'{value:.1f}'
+
+        self.stdout.write(
+            f'{"endpoint":<10}{"requests":>10}{"errors":>8}{"req/s":>10}'
+            f'{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}'
+        )
+        for endpoint, count, errors, rate, p50, p95, p99 in rows:
+            self.stdout.write(
+                f'{endpoint:<10}{count:>10}{errors:>8}{rate:>10.1f}'
+                f'{ms(p50):>10}{ms(p95):>10}{ms(p99):>10}'
+            )
+        if load_test.failed_sign_ups:
+            self.stdout.write(self.style.WARNING(
+                f'{load_test.failed_sign_ups} of {options["workers"]} users '
+                f'could not sign up.'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Finished in {load_test.elapsed:.2f}s!'
+        ))
@@ -0,0 +1,215 @@
+"""
+Request and database metrics in the Prometheus text format, shared by
+the worker processes through the cache.
+"""
+import bisect
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Cache key of the ids of the workers that flushed metrics
+WORKERS_KEY = 'metrics:workers'
+
+
+class Histogram:
+    """Cumulative histogram with fixed bucket upper bounds"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    def merge(self, counts, total):
+        """Add the bucket counts and total of another histogram"""
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.total += total
+
+    def samples(self):
+        """Yield the le label and cumulative count of every bucket"""
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{bound:g}', cumulative
+        yield '+Inf', cumulative + self.counts[-1]
+
+
+def format_labels(labels):
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name, str(value).replace('\\', r'\\').replace('"', r'\"')
+        )
+        for name, value in labels
+    )
+    return f'{{{pairs}}}'
+
+
+def worker_key(worker):
+    return f'metrics:worker:{worker}'
+
+
+class Metrics:
+    """Request latency, query count and query time per view.
+
+    Updates take a single lock for a few additions, so recording every
+    request stays cheap. Each process keeps its own metrics and flushes
+    them to the METRICS_CACHE every METRICS_FLUSH_SECONDS, collect()
+    adds up the metrics of every worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.renew()
+
+    def renew(self):
+        """Start the metrics of a new worker"""
+        self.worker = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.flushed = time.monotonic()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.latency = {}
+            self.queries = {}
+            self.query_time = defaultdict(float)
+
+    def record(self, view, method, status, duration, queries, query_time):
+        """Record a served request"""
+        with self._lock:
+            self.requests[(view, method, status)] += 1
+            if view not in self.latency:
+                self.latency[view] = Histogram(LATENCY_BUCKETS)
+                self.queries[view] = Histogram(QUERY_COUNT_BUCKETS)
+            self.latency[view].observe(duration)
+            self.queries[view].observe(queries)
+            self.query_time[view] += query_time
+
+    def snapshot(self):
+        """Return the metrics as plain data to be stored in the cache"""
+        with self._lock:
+            return {
+                'requests': [
+                    (*key, count) for key, count in self.requests.items()
+                ],
+                'latency': {
+                    view: (histogram.counts, histogram.total)
+                    for view, histogram in self.latency.items()
+                },
+                'queries': {
+                    view: (histogram.counts, histogram.total)
+                    for view, histogram in self.queries.items()
+                },
+                'query_time': dict(self.query_time),
+            }
+
+    def merge(self, snapshot):
+        """Add the metrics of a snapshot"""
+        with self._lock:
+            for view, method, status, count in snapshot['requests']:
+                self.requests[(view, method, status)] += count
+            for name, buckets in (
+                ('latency', LATENCY_BUCKETS),
+                ('queries', QUERY_COUNT_BUCKETS),
+            ):
+                histograms = getattr(self, name)
+                for view, (counts, total) in snapshot[name].items():
+                    histograms.setdefault(view, Histogram(buckets)).merge(
+                        counts, total
+                    )
+            for view, seconds in snapshot['query_time'].items():
+                self.query_time[view] += seconds
+
+    def flush_due(self):
+        return (
+            time.monotonic() - self.flushed >= settings.METRICS_FLUSH_SECONDS
+        )
+
+    def flush(self):
+        """Store the metrics of this worker in the cache"""
+        cache = caches[settings.METRICS_CACHE]
+        self.flushed = time.monotonic()
+        # Snapshots never expire, so the counters of a worker that
+        # exited still add up and the totals do not go back
+        cache.set(worker_key(self.worker), self.snapshot(), None)
+        # Two workers registering at once may lose one of the ids, it
+        # is added again on the next flush
+        workers = cache.get(WORKERS_KEY, [])
+        if self.worker not in workers:
+            cache.set(WORKERS_KEY, [*workers, self.worker], None)
+
+    def collect(self):
+        """Return the metrics of all the workers"""
+        self.flush()
+        cache = caches[settings.METRICS_CACHE]
+        collected = Metrics()
+        snapshots = cache.get_many(
+            [worker_key(worker) for worker in cache.get(WORKERS_KEY, [])]
+        )
+        for snapshot in snapshots.values():
+            collected.merge(snapshot)
+        return collected
+
+    def render(self):
+        """Return the metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines += [
+                '# HELP http_requests_total Requests served.',
+                '# TYPE http_requests_total counter',
+            ]
+            for (view, method, status), count in sorted(
+                self.requests.items()
+            ):
+                labels = format_labels(
+                    (('view', view), ('method', method), ('status', status))
+                )
+                lines.append(f'http_requests_total{labels} {count}')
+            for name, help_text, histograms in (
+                ('http_request_duration_seconds',
+                 'Request latency.', self.latency),
+                ('db_queries_per_request',
+                 'Database queries made by a request.', self.queries),
+            ):
+                lines += [
+                    f'# HELP {name} {help_text}',
+                    f'# TYPE {name} histogram',
+                ]
+                for view, histogram in sorted(histograms.items()):
+                    for bound, count in histogram.samples():
+                        labels = format_labels((('view', view), ('le', bound)))
+                        lines.append(f'{name}_bucket{labels} {count}')
+                    labels = format_labels((('view', view),))
+                    lines.append(f'{name}_sum{labels} {histogram.total}')
+                    count = sum(histogram.counts)
+                    lines.append(f'{name}_count{labels} {count}')
+            lines += [
+                '# HELP db_query_duration_seconds_total Time spent in '
+                'database queries.',
+                '# TYPE db_query_duration_seconds_total counter',
+            ]
+            for view, seconds in sorted(self.query_time.items()):
+                labels = format_labels((('view', view),))
+                lines.append(
+                    f'db_query_duration_seconds_total{labels} {seconds}'
+                )
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+# Workers forked after the import must not report the counters of their
+# parent under its id
+os.register_at_fork(after_in_child=metrics.renew)
@@ -0,0 +1,201 @@
+"""
+Middleware recording request latency and database usage, and routing
+the reads of safe requests to read replicas.
+"""
+import asyncio
+import hashlib
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from core.metrics import metrics
+from core.routers import read_from_replica
+
+
+# Timer of the queries of the current request. Context variables follow
+# the request into the threads of sync_to_async, so the queries made by
+# async views on pool threads are counted too.
+current_timer = ContextVar('current_timer', default=None)
+
+
+class QueryTimer:
+    """Count and time the queries of a request"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper of every connection, recording queries
+    on the timer of the current request if there is one"""
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.duration += time.perf_counter() - start
+        timer.count += 1
+
+
+class HybridMiddleware:
+    """Middleware running natively under both WSGI and ASGI.
+
+    Under ASGI, sync only middleware is adapted with a thread sensitive
+    sync_to_async, which serves every request of the process on a single
+    thread. Subclasses implement handle() and handle_async()."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Marks the instance as a coroutine function for the handler
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.handle_async(request)
+        return self.handle(request)
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """Record the latency, query count and query time of every request
+    by view name and report them in a Server-Timing header.
+
+    The content of streaming responses is produced after the middleware
+    returns, its queries are not seen."""
+
+    def handle(self, request):
+        timer = QueryTimer()
+        token = current_timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        self.record(request, response, timer, start)
+        if metrics.flush_due():
+            metrics.flush()
+        return response
+
+    async def handle_async(self, request):
+        timer = QueryTimer()
+        token = current_timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        self.record(request, response, timer, start)
+        if metrics.flush_due():
+            await sync_to_async(metrics.flush, thread_sensitive=False)()
+        return response
+
+    def record(self, request, response, timer, start):
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        view = (match.view_name or match._func_path) if match else '<none>'
+        metrics.record(
+            view, request.method, response.status_code,
+            duration, timer.count, timer.duration
+        )
+        response['Server-Timing'] = (
+            f'db;dur={timer.duration * 1000:.1f};desc="{timer.count} '
+            f'queries", total;dur={duration * 1000:.1f}'
+        )
+
+
+def stick_to_primary(response, *credentials):
+    """Keep the reads of requests made with the given credentials, such
+    as tokens issued by the response, on the primary like the reads of
+    the client which wrote"""
+    response.replica_credentials = (
+        getattr(response, 'replica_credentials', ()) + credentials
+    )
+    return response
+
+
+class ReplicaMiddleware(HybridMiddleware):
+    """Serve the reads of safe requests from a read replica.
+
+    Once a client made an unsafe request, its reads stay on the primary
+    for DATABASE_REPLICA_STICKY_SECONDS so it always sees its own
+    writes. Clients are told apart by a hash of the credentials of their
+    Authorization header or of their session cookie, the user is only
+    authenticated later by the views. Credentials issued by a response,
+    a new session or ones marked with stick_to_primary(), stick too."""
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+    key_prefix = 'replica:sticky:'
+
+    @property
+    def cache(self):
+        return caches[settings.DATABASE_REPLICA_CACHE]
+
+    def make_key(self, credentials):
+        """Return the cache key of a client, never its credentials"""
+        digest = hashlib.sha256(credentials.encode()).hexdigest()
+        return f'{self.key_prefix}{digest}'
+
+    def get_client_keys(self, request, response=None):
+        session_cookie = settings.SESSION_COOKIE_NAME
+        # The keyword of the header is left out, tokens are marked
+        # before clients send them.
+        authorization = request.META.get('HTTP_AUTHORIZATION', '').split()
+        credentials = [
+            authorization[-1] if authorization else None,
+            request.COOKIES.get(session_cookie),
+        ]
+        if response is not None:
+            if session_cookie in response.cookies:
+                # A login starts a session the next requests are made with
+                credentials.append(response.cookies[session_cookie].value)
+            credentials.extend(getattr(response, 'replica_credentials', ()))
+        return [self.make_key(value) for value in credentials if value]
+
+    def stick(self, request, response):
+        """Keep the next reads of the client of a write on the primary"""
+        keys = self.get_client_keys(request, response)
+        if keys:
+            self.cache.set_many(
+                dict.fromkeys(keys, True),
+                settings.DATABASE_REPLICA_STICKY_SECONDS
+            )
+
+    def use_replica(self, request):
+        """Return whether the reads of a safe request go to a replica"""
+        if not settings.DATABASE_REPLICAS:
+            return False
+        keys = self.get_client_keys(request)
+        return not (keys and self.cache.get_many(keys))
+
+    def handle(self, request):
+        if request.method not in self.safe_methods:
+            response = self.get_response(request)
+            self.stick(request, response)
+            return response
+        if not self.use_replica(request):
+            return self.get_response(request)
+        with read_from_replica():
+            return self.get_response(request)
+
+    async def handle_async(self, request):
+        # The cache is read and written on pool threads, off the loop
+        if request.method not in self.safe_methods:
+            response = await self.get_response(request)
+            await sync_to_async(self.stick, thread_sensitive=False)(
+                request, response
+            )
+            return response
+        use_replica = await sync_to_async(
+            self.use_replica, thread_sensitive=False
+        )(request)
+        if not use_replica:
+            return await self.get_response(request)
+        with read_from_replica():
+            return await self.get_response(request)
@@ -0,0 +1,99 @@
+"""
+Paginators counting large tables with planner estimates.
+"""
+from collections import OrderedDict
+
+from django.core.paginator import (
+    EmptyPage,
+    Page,
+    PageNotAnInteger,
+    Paginator,
+)
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+from core.db import estimate_count
+
+
+class EstimatedPage(Page):
+    """Page of an estimated count, knowing from its rows whether
+    another page follows"""
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator taking the count of large querysets from the planner
+    estimate rather than a scan of every row.
+
+    An estimate may be off either way, so pages of an estimated count
+    are not bounded by it: one more row is read to tell whether a next
+    page exists, and only a page past the rows is empty."""
+    count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        count, self.count_is_estimate = estimate_count(self.object_list)
+        return count
+
+    def validate_number(self, number):
+        if not (self.count and self.count_is_estimate):
+            return super().validate_number(number)
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_estimate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            raise EmptyPage(_('That page contains no results'))
+        return EstimatedPage(
+            rows[:self.per_page], number, self,
+            has_next=len(rows) > self.per_page
+        )
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    """Page number pagination of list endpoints whose count is a planner
+    estimate on large results, flagged with count_is_estimate."""
+    django_paginator_class = EstimatedCountPaginator
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_is_estimate', self.page.paginator.count_is_estimate),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count_is_estimate'] = {
+            'type': 'boolean',
+            'example': False,
+        }
+        return response_schema
@@ -0,0 +1,42 @@
+"""
+JSON renderer encoding with orjson when it is installed.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Render compact JSON with orjson, falling back to the default
+    renderer without it or when indented output is asked for.
+
+    Datetimes, decimals and other types orjson does not know, or
+    formats differently, go through the encoder of the default
+    renderer so both produce the same documents."""
+    encoder = JSONEncoder()
+    options = 0
+    if orjson is not None:
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type or '', renderer_context)
+        if orjson is None or indent or self.ensure_ascii:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        try:
+            return orjson.dumps(
+                data, default=self.encoder.default, option=self.options
+            )
+        except TypeError:
+            # Integers over 64 bits and other values orjson refuses
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
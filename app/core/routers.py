@@ -0,0 +1,67 @@
+"""
+Database router serving the reads of safe requests from read replicas.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Database the reads of the current request or task are sent to
+read_alias = ContextVar('read_alias', default=DEFAULT_DB_ALIAS)
+
+
+@contextmanager
+def read_from(alias):
+    """Send the reads made inside the block to the given database"""
+    token = read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        read_alias.reset(token)
+
+
+def read_from_primary():
+    return read_from(DEFAULT_DB_ALIAS)
+
+
+def read_from_replica():
+    """Send reads to a random replica, or the primary without any"""
+    if not settings.DATABASE_REPLICAS:
+        return read_from_primary()
+    return read_from(random.choice(settings.DATABASE_REPLICAS))
+
+
+class ReplicaRouter:
+    """Route reads to the database chosen for the current context and
+    every write to the primary.
+
+    Reads stay on the primary inside its transactions, which may lock
+    rows or read their own writes, and for sessions and tokens, which
+    are used as soon as they are written. Replicas are never migrated,
+    they follow the schema of the primary."""
+    primary_app_labels = {'sessions', 'authtoken'}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in self.primary_app_labels:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
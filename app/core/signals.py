@@ -0,0 +1,12 @@
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from core.middleware import time_query
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    """Time the queries of every connection, including the ones of the
+    threads async views read from"""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
@@ -0,0 +1,45 @@
+from django.test import SimpleTestCase, override_settings
+from core.checks import check_replica_cache
+
+
+LOCMEM = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+MEMCACHED = {
+    'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'LOCATION': 'memcached:11211',
+}
+
+
+@override_settings(DATABASE_REPLICA_CACHE='default')
+class ReplicaCacheCheckTests(SimpleTestCase):
+    """Test the check of the cache holding read-your-writes marks"""
+
+    def check_ids(self):
+        return [error.id for error in check_replica_cache(None)]
+
+    @override_settings(DATABASE_REPLICAS=[], CACHES={'default': LOCMEM})
+    def test_no_replicas(self):
+        """Test that any cache does without replicas"""
+        self.assertEqual(self.check_ids(), [])
+
+    @override_settings(
+        DATABASE_REPLICAS=['replica_1'], CACHES={'default': LOCMEM}
+    )
+    def test_process_local_cache(self):
+        """Test that replicas need a cache shared between processes"""
+        self.assertEqual(self.check_ids(), ['core.E002'])
+
+    @override_settings(
+        DATABASE_REPLICAS=['replica_1'], CACHES={'default': MEMCACHED}
+    )
+    def test_shared_cache(self):
+        """Test that a shared cache passes"""
+        self.assertEqual(self.check_ids(), [])
+
+    @override_settings(
+        DATABASE_REPLICAS=['replica_1'],
+        DATABASE_REPLICA_CACHE='replicas',
+        CACHES={'default': MEMCACHED}
+    )
+    def test_undefined_cache(self):
+        """Test that the cache must be defined"""
+        self.assertEqual(self.check_ids(), ['core.E001'])
@@ -1,8 +1,14 @@
+from io import StringIO
+from unittest import skipUnless
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
+from wallet.models import Transaction
 
 
 class CommandTests(TestCase):
@@ -21,3 +27,49 @@ class CommandTests(TestCase):
             gi.side_effect = [OperationalError] * 5 + [True]
             call_command('wait_for_db')
             self.assertEqual(gi.call_count, 6)
+
+
+class LoadTestCommandTests(TransactionTestCase):
+    """Test the load test command. The app is served from other
+    threads, so the requests need committed data."""
+
+    @skipUnless(
+        connection.vendor == 'postgresql',
+        'SQLite locks the whole database against concurrent writers'
+    )
+    @override_settings(DEBUG=False, ALLOWED_HOSTS=[])
+    def test_loadtest_current_db(self):
+        """Test driving traffic against the in process server"""
+        out = StringIO()
+
+        call_command(
+            'loadtest', current_db=True, workers=3, requests=10,
+            mix='charge=1,transfer=1,balance=1,list=1', stdout=out
+        )
+
+        rows = {
+            line.split()[0]: line.split()[1:]
+            for line in out.getvalue().splitlines()[2:-1]
+        }
+        self.assertNotIn('register', rows)
+        self.assertNotIn('token', rows)
+        self.assertEqual(rows['all'][1], '0')
+        self.assertEqual(get_user_model().objects.count(), 3)
+        # Every user is charged once while setting up
+        self.assertEqual(Transaction.objects.filter(
+            transaction_type=Transaction.CHARGE
+        ).count(), int(rows['charge'][0]) + 3)
+
+    def test_loadtest_invalid_mix(self):
+        """Test that unknown actions are rejected"""
+        with self.assertRaises(CommandError):
+            call_command('loadtest', mix='withdraw=1', stdout=StringIO())
+
+    def test_loadtest_invalid_counts(self):
+        """Test that every count is validated with its own message"""
+        for options, message in (
+            ({'workers': 0}, '--workers must be positive.'),
+            ({'requests': -1}, '--requests must not be negative.'),
+        ):
+            with self.assertRaisesMessage(CommandError, message):
+                call_command('loadtest', stdout=StringIO(), **options)
@@ -0,0 +1,131 @@
+from datetime import date, datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.paginator import EmptyPage, PageNotAnInteger
+from django.db import connection
+from django.test import TestCase, override_settings
+from core.db import PeriodQuerySet, estimate_count
+from core.pagination import EstimatedCountPaginator
+from wallet.models import Transaction
+
+
+class EstimatedCountTests(TestCase):
+    """Test counting with planner estimates"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@email.com',
+            password='testpass',
+        )
+        for amount in (10, 20, 30):
+            Transaction.objects.create(
+                user=self.user,
+                transaction_type=Transaction.CHARGE,
+                amount=amount,
+            )
+
+    def test_small_counts_exact(self):
+        """Test that estimates below the threshold are counted"""
+        queryset = Transaction.objects.filter(amount__gt=10)
+
+        # The plan is only read on PostgreSQL
+        queries = 2 if connection.vendor == 'postgresql' else 1
+        with self.assertNumQueries(queries):
+            self.assertEqual(estimate_count(queryset), (2, False))
+
+    def test_estimate_above_threshold(self):
+        """Test that large estimates are returned without counting"""
+        queryset = Transaction.objects.select_related('user')
+
+        with self.assertNumQueries(1):
+            count, is_estimate = estimate_count(queryset, threshold=0)
+
+        self.assertIsInstance(count, int)
+        self.assertIs(is_estimate, connection.vendor == 'postgresql')
+
+    def test_empty_queryset(self):
+        """Test that querysets matching nothing are not queried"""
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                estimate_count(Transaction.objects.none()), (0, False)
+            )
+
+    def test_paginator(self):
+        """Test that the paginator counts querysets with estimates"""
+        paginator = EstimatedCountPaginator(
+            Transaction.objects.order_by('id'), 2
+        )
+
+        self.assertEqual(paginator.count, 3)
+        self.assertFalse(paginator.count_is_estimate)
+        self.assertEqual(paginator.num_pages, 2)
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=0)
+    def test_paginator_estimated_pages(self):
+        """Test that pages of an estimated count end with the rows"""
+        paginator = EstimatedCountPaginator(
+            Transaction.objects.order_by('id'), 2
+        )
+        if not (paginator.count and paginator.count_is_estimate):
+            self.skipTest('Counts are only estimated on PostgreSQL')
+
+        first, last = paginator.page(1), paginator.page('2')
+
+        self.assertTrue(first.has_next())
+        self.assertEqual([row.amount for row in last], [30])
+        self.assertFalse(last.has_next())
+        with self.assertRaises(EmptyPage):
+            paginator.page(3)
+        with self.assertRaises(PageNotAnInteger):
+            paginator.page('last')
+
+
+class PeriodQuerySetTests(TestCase):
+    """Test listing date hierarchy periods from the first and last
+    values"""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email='test@email.com',
+            password='testpass',
+        )
+        for day in (datetime(2022, 11, 30, 23), datetime(2023, 2, 2, 1)):
+            charge = Transaction.objects.create(
+                user=user,
+                transaction_type=Transaction.CHARGE,
+                amount=10,
+            )
+            Transaction.objects.filter(pk=charge.pk).update(
+                created_time=day.replace(tzinfo=timezone.utc)
+            )
+        self.queryset = PeriodQuerySet(Transaction)
+
+    def test_datetimes(self):
+        """Test that every period between the bounds is listed"""
+        with self.assertNumQueries(1):
+            months = self.queryset.datetimes('created_time', 'month')
+
+        self.assertEqual(
+            [(month.year, month.month) for month in months],
+            [(2022, 11), (2022, 12), (2023, 1), (2023, 2)]
+        )
+        self.assertEqual(
+            [year.year for year in self.queryset.datetimes(
+                'created_time', 'year', order='DESC'
+            )],
+            [2023, 2022]
+        )
+
+    def test_dates(self):
+        """Test that dates are listed by day"""
+        days = self.queryset.filter(
+            created_time__year=2023
+        ).dates('created_time', 'day')
+
+        self.assertEqual(days, [date(2023, 2, 2)])
+
+    def test_empty(self):
+        """Test that no rows have no periods"""
+        self.assertEqual(
+            self.queryset.none().datetimes('created_time', 'day'), []
+        )
@@ -0,0 +1,185 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.test import (
+    AsyncClient,
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from core.metrics import Histogram, Metrics, metrics, worker_key
+from core.middleware import MetricsMiddleware
+
+
+METRICS_URL = reverse('metrics')
+TRANSACTION_URL = reverse('wallet:transactions-list')
+ASYNC_BALANCE_URL = reverse('wallet:async-balance')
+
+
+class MetricsTests(TestCase):
+    """Test the request metrics middleware and endpoint"""
+
+    def setUp(self):
+        metrics.reset()
+        caches['default'].clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@email.com',
+            password='testpass',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_server_timing_header(self):
+        """Test that responses report their database time"""
+        res = self.client.get(TRANSACTION_URL)
+
+        self.assertRegex(
+            res['Server-Timing'],
+            r'^db;dur=[\d.]+;desc="1 queries", total;dur=[\d.]+$'
+        )
+
+    def test_requests_recorded_by_view(self):
+        """Test that requests are counted by view name"""
+        self.client.get(TRANSACTION_URL)
+        self.client.get(TRANSACTION_URL)
+
+        view = 'wallet:transactions-list'
+        self.assertEqual(metrics.requests[(view, 'GET', 200)], 2)
+        self.assertEqual(sum(metrics.latency[view].counts), 2)
+        self.assertEqual(metrics.queries[view].total, 2)
+        self.assertGreater(metrics.query_time[view], 0)
+
+    def test_metrics_endpoint(self):
+        """Test that the metrics are exposed in the Prometheus format"""
+        self.client.get(TRANSACTION_URL)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        content = res.content.decode()
+        self.assertIn(
+            'http_requests_total{view="wallet:transactions-list",'
+            'method="GET",status="200"} 1',
+            content
+        )
+        self.assertIn(
+            'db_queries_per_request_bucket'
+            '{view="wallet:transactions-list",le="1"} 1',
+            content
+        )
+
+    def test_metrics_endpoint_adds_up_workers(self):
+        """Test that the endpoint reports the metrics of every worker"""
+        other = Metrics()
+        other.record('wallet:transactions-list', 'GET', 200, 0.1, 3, 0.01)
+        other.flush()
+        self.client.get(TRANSACTION_URL)
+
+        res = self.client.get(METRICS_URL)
+
+        content = res.content.decode()
+        self.assertIn(
+            'http_requests_total{view="wallet:transactions-list",'
+            'method="GET",status="200"} 2',
+            content
+        )
+        self.assertIn(
+            'db_queries_per_request_sum'
+            '{view="wallet:transactions-list"} 4',
+            content
+        )
+
+    @override_settings(METRICS_FLUSH_SECONDS=0)
+    def test_metrics_flushed(self):
+        """Test that the worker stores its metrics once they are due"""
+        self.client.get(TRANSACTION_URL)
+
+        snapshot = caches['default'].get(worker_key(metrics.worker))
+        self.assertIn(
+            ('wallet:transactions-list', 'GET', 200, 1),
+            snapshot['requests']
+        )
+
+    def test_renew_worker(self):
+        """Test that a forked worker starts its own metrics"""
+        self.client.get(TRANSACTION_URL)
+        worker = metrics.worker
+
+        metrics.renew()
+
+        self.assertNotEqual(metrics.worker, worker)
+        self.assertFalse(metrics.requests)
+
+    @override_settings(METRICS_ALLOWED_NETWORKS=['10.0.0.0/8'])
+    def test_metrics_endpoint_restricted(self):
+        """Test that other addresses can not read the metrics"""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_histogram_buckets_cumulative(self):
+        """Test that histogram samples are cumulative"""
+        histogram = Histogram((1, 5))
+        for value in (0.5, 1, 3, 10):
+            histogram.observe(value)
+
+        self.assertEqual(
+            list(histogram.samples()), [('1', 2), ('5', 3), ('+Inf', 4)]
+        )
+        self.assertEqual(histogram.total, 14.5)
+
+
+class AsyncMetricsTests(TransactionTestCase):
+    """Test recording the metrics of async requests. Async views read
+    on pool threads with their own connections, so the test data has to
+    be committed."""
+
+    def setUp(self):
+        metrics.reset()
+        caches['default'].clear()
+        caches['tokens'].clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@email.com',
+            password='testpass',
+        )
+        self.token = Token.objects.create(user=self.user)
+
+    def test_middleware_async(self):
+        """Test that the middleware runs as a coroutine under ASGI"""
+        async def get_response(request):
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(get_response)
+
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        request = RequestFactory().get('/')
+        request.resolver_match = None
+
+        async def call():
+            return await middleware(request)
+
+        response = async_to_sync(call)()
+        self.assertIn('Server-Timing', response)
+
+    def test_pool_thread_queries_counted(self):
+        """Test that the queries of async views made on pool threads
+        are counted for their request"""
+        client = AsyncClient()
+
+        res = async_to_sync(client.get)(
+            ASYNC_BALANCE_URL, authorization=f'Token {self.token.key}'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        view = 'wallet:async-balance'
+        self.assertEqual(metrics.requests[(view, 'GET', 200)], 1)
+        self.assertGreater(metrics.queries[view].total, 0)
+        self.assertRegex(res['Server-Timing'], r'desc="[1-9]\d* queries"')
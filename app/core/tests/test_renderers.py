@@ -0,0 +1,41 @@
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+from rest_framework.renderers import JSONRenderer
+from core.renderers import FastJSONRenderer
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """Test the orjson renderer"""
+
+    def test_same_document_as_default_renderer(self):
+        """Test that types are rendered like the default renderer"""
+        data = {
+            'time': datetime(2023, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc),
+            'decimal': Decimal('1.50'),
+            'text': 'کیف پول',
+            'nested': [{'id': 1, 'amount': 2}],
+            3: None,
+        }
+
+        fast = FastJSONRenderer().render(data)
+        default = JSONRenderer().render(data)
+
+        self.assertEqual(json.loads(fast), json.loads(default))
+        self.assertEqual(
+            json.loads(fast)['time'], '2023-01-02T03:04:05.678901Z'
+        )
+
+    def test_indent(self):
+        """Test that indented output is still available"""
+        content = FastJSONRenderer().render(
+            {'id': 1}, 'application/json; indent=2'
+        )
+
+        self.assertEqual(content, b'{\n  "id": 1\n}')
+
+    def test_none(self):
+        """Test that no data renders an empty body"""
+        self.assertEqual(FastJSONRenderer().render(None), b'')
@@ -0,0 +1,209 @@
+import asyncio
+from contextlib import ExitStack
+from unittest import skipUnless
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.db import connections, router
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from core.middleware import ReplicaMiddleware, stick_to_primary
+from core.routers import read_from_primary, read_from_replica
+from wallet.models import Transaction
+
+
+TRANSACTION_URL = reverse('wallet:transactions-list')
+TOKEN_URL = reverse('user:token')
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaRouterTests(SimpleTestCase):
+    """Test routing reads to replicas"""
+
+    def test_reads_on_primary_by_default(self):
+        """Test that reads outside requests stay on the primary"""
+        self.assertEqual(router.db_for_read(Transaction), 'default')
+
+    def test_reads_on_replica(self):
+        """Test that reads are routed to the chosen replica"""
+        with read_from_replica():
+            self.assertEqual(router.db_for_read(Transaction), 'replica_1')
+            self.assertEqual(router.db_for_read(Session), 'default')
+            self.assertEqual(router.db_for_write(Transaction), 'default')
+            with read_from_primary():
+                self.assertEqual(
+                    router.db_for_read(Transaction), 'default'
+                )
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        """Test that reads stay on the primary without replicas"""
+        with read_from_replica():
+            self.assertEqual(router.db_for_read(Transaction), 'default')
+
+    def test_replicas_not_migrated(self):
+        """Test that migrations only run on the primary"""
+        self.assertFalse(router.allow_migrate('replica_1', 'wallet'))
+        self.assertTrue(router.allow_migrate('default', 'wallet'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaMiddlewareTests(SimpleTestCase):
+    """Test serving safe requests from replicas"""
+
+    def setUp(self):
+        caches[settings.DATABASE_REPLICA_CACHE].clear()
+        self.factory = RequestFactory()
+        self.middleware = ReplicaMiddleware(self.get_response)
+
+    def get_response(self, request):
+        self.read_alias = router.db_for_read(Transaction)
+        response = HttpResponse()
+        if request.path == '/login/':
+            response.set_cookie(settings.SESSION_COOKIE_NAME, 'new')
+        if request.path == '/token/':
+            stick_to_primary(response, 'issued')
+        return response
+
+    def request(self, method, path='/', **extra):
+        self.middleware(getattr(self.factory, method)(path, **extra))
+        return self.read_alias
+
+    def test_safe_requests_on_replica(self):
+        """Test that only safe requests read from the replica"""
+        self.assertEqual(self.request('get'), 'replica_1')
+        self.assertEqual(self.request('post'), 'default')
+
+    def test_reads_stick_after_write(self):
+        """Test that a client reads from the primary after a write"""
+        self.request('post', HTTP_AUTHORIZATION='Token a')
+
+        self.assertEqual(
+            self.request('get', HTTP_AUTHORIZATION='Token a'), 'default'
+        )
+        self.assertEqual(
+            self.request('get', HTTP_AUTHORIZATION='Token b'), 'replica_1'
+        )
+
+    @override_settings(DATABASE_REPLICA_STICKY_SECONDS=0)
+    def test_stickiness_expires(self):
+        """Test that reads go back to the replica after the window"""
+        self.request('post', HTTP_AUTHORIZATION='Token a')
+
+        self.assertEqual(
+            self.request('get', HTTP_AUTHORIZATION='Token a'), 'replica_1'
+        )
+
+    def test_new_session_sticks(self):
+        """Test that the session started by a login sticks"""
+        self.request('post', '/login/')
+        self.factory.cookies[settings.SESSION_COOKIE_NAME] = 'new'
+
+        self.assertEqual(self.request('get'), 'default')
+
+    def test_issued_token_sticks(self):
+        """Test that a token issued by a write sticks before the client
+        sends it"""
+        self.request('post', '/token/')
+
+        self.assertEqual(
+            self.request('get', HTTP_AUTHORIZATION='Bearer issued'),
+            'default'
+        )
+
+    def test_async_requests(self):
+        """Test that the middleware runs as a coroutine under ASGI"""
+        async def get_response(request):
+            return self.get_response(request)
+
+        middleware = ReplicaMiddleware(get_response)
+
+        async def request(method, **extra):
+            await middleware(getattr(self.factory, method)('/', **extra))
+            return self.read_alias
+
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        self.assertEqual(async_to_sync(request)('get'), 'replica_1')
+        async_to_sync(request)('post', HTTP_AUTHORIZATION='Token a')
+        self.assertEqual(
+            async_to_sync(request)('get', HTTP_AUTHORIZATION='Token a'),
+            'default'
+        )
+
+
+@skipUnless(settings.DATABASE_REPLICAS, 'No read replica is configured')
+class ReplicaReadTests(TransactionTestCase):
+    """Test reading the lists of a client from replicas"""
+    databases = {'default', *settings.DATABASE_REPLICAS}
+
+    def setUp(self):
+        caches[settings.DATABASE_REPLICA_CACHE].clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@email.com',
+            password='testpass',
+        )
+        Transaction.objects.create(
+            user=self.user,
+            transaction_type=Transaction.CHARGE,
+            amount=10,
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user)}'
+        )
+
+    def list_transactions(self):
+        """Return the listed transactions and the replica queries"""
+        with ExitStack() as stack:
+            primary, *replicas = [
+                stack.enter_context(CaptureQueriesContext(connections[alias]))
+                for alias in ('default', *settings.DATABASE_REPLICAS)
+            ]
+            res = self.client.get(TRANSACTION_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data['results'], primary, sum(map(len, replicas))
+
+    def test_read_your_writes(self):
+        """Test that lists are read from a replica until the client
+        writes"""
+        results, primary, replica_queries = self.list_transactions()
+
+        self.assertEqual(len(results), 1)
+        self.assertGreater(replica_queries, 0)
+
+        res = self.client.post(TRANSACTION_URL, {
+            'user': self.user.id, 'transaction_type': 1, 'amount': 5
+        })
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        results, primary, replica_queries = self.list_transactions()
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(replica_queries, 0)
+        self.assertGreater(len(primary), 0)
+
+    def test_login_sticks(self):
+        """Test that the first reads with a new token are made on the
+        primary"""
+        res = APIClient().post(
+            TOKEN_URL, {'email': 'test@email.com', 'password': 'testpass'}
+        )
+        token = res.data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+        results, primary, replica_queries = self.list_transactions()
+
+        self.assertEqual(replica_queries, 0)
+        self.assertGreater(len(primary), 0)
@@ -1,3 +1,23 @@
-from django.shortcuts import render
+import ipaddress
 
-# Create your views here.
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from core.metrics import metrics
+
+
+def metrics_view(request):
+    """Expose the metrics of all the workers to allowed addresses"""
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR'))
+    except ValueError:
+        return HttpResponseForbidden()
+    if not any(
+        address in ipaddress.ip_network(network)
+        for network in settings.METRICS_ALLOWED_NETWORKS
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.collect().render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -0,0 +1,103 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    BaseAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+from core.routers import read_from_primary
+from user.tokens import read_access_token
+
+
+def get_token_cache():
+    """Return the cache holding authenticated tokens"""
+    return caches[settings.USER_TOKEN_CACHE]
+
+
+def make_token_cache_key(key):
+    """Return the cache key of a token, never the token itself"""
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f'user:token:{digest}'
+
+
+def make_user_cache_key(user_id):
+    """Return the cache key of the user authenticated by signed tokens"""
+    return f'user:id:{user_id}'
+
+
+def invalidate_tokens(keys):
+    """Drop the given tokens from the token cache"""
+    get_token_cache().delete_many(
+        [make_token_cache_key(key) for key in keys]
+    )
+
+
+def invalidate_user(user_id):
+    """Drop the cached user of signed tokens"""
+    get_token_cache().delete(make_user_cache_key(user_id))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication keeping token to user mappings in a cache
+    instead of joining the token and user tables on every request"""
+
+    def authenticate_credentials(self, key):
+        cache = get_token_cache()
+        cache_key = make_token_cache_key(key)
+        credentials = cache.get(cache_key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            cache.set(cache_key, credentials)
+        return credentials
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Authenticate signed access tokens without a token lookup.
+
+    Clients should authenticate by passing the access token in the
+    "Authorization" HTTP header, prepended with the string "Bearer ".
+    The user named by the token is kept in the token cache like the
+    users of cached tokens, until it changes."""
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid token header.')
+            )
+        payload = read_access_token(auth[1].decode(errors='replace'))
+        if payload is None:
+            raise exceptions.AuthenticationFailed(
+                _('Invalid or expired token.')
+            )
+        return self.get_user(payload['uid']), payload
+
+    def get_user(self, user_id):
+        cache = get_token_cache()
+        cache_key = make_user_cache_key(user_id)
+        user = cache.get(cache_key)
+        if user is None:
+            # A replica may not have the row of a user who just signed up
+            with read_from_primary():
+                user = get_user_model().objects.filter(pk=user_id).first()
+            if user is None:
+                raise exceptions.AuthenticationFailed(
+                    _('User inactive or deleted.')
+                )
+            cache.set(cache_key, user)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        return user
+
+    def authenticate_header(self, request):
+        return self.keyword
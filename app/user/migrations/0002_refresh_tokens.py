@@ -0,0 +1,26 @@
+# Generated by Django 3.2.19 on 2026-10-18 11:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefreshToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_hash', models.CharField(max_length=64, unique=True, verbose_name='key hash')),
+                ('revoked', models.BooleanField(default=False, verbose_name='revoked')),
+                ('created_time', models.DateTimeField(auto_now_add=True, verbose_name='created time')),
+                ('expires_time', models.DateTimeField(verbose_name='expires time')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='refresh_tokens', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+        ),
+    ]
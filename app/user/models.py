@@ -1,5 +1,11 @@
-from django.db import models
+import hashlib
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from user.managers import UserManager
 
@@ -16,3 +22,70 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
+
+
+class RefreshToken(models.Model):
+    """Long lived token exchanged for new signed access tokens.
+    Only a hash of the token is stored."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='refresh_tokens',
+        verbose_name=_('user')
+    )
+    key_hash = models.CharField(
+        max_length=64, unique=True, verbose_name=_('key hash')
+    )
+    revoked = models.BooleanField(default=False, verbose_name=_('revoked'))
+    created_time = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('created time')
+    )
+    expires_time = models.DateTimeField(verbose_name=_('expires time'))
+
+    def __str__(self):
+        return f'{self.user} - {self.expires_time}'
+
+    @staticmethod
+    def hash_key(key):
+        """Return the stored hash of a refresh token"""
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @classmethod
+    def issue(cls, user):
+        """Create a refresh token for the user and return its key"""
+        key = secrets.token_urlsafe(32)
+        cls.objects.create(
+            user=user,
+            key_hash=cls.hash_key(key),
+            expires_time=timezone.now() + timedelta(
+                seconds=settings.USER_REFRESH_TOKEN_LIFETIME
+            )
+        )
+        return key
+
+    @classmethod
+    def rotate(cls, key):
+        """Revoke a valid refresh token and return its user and a new
+        refresh token key, or None if the token can not be used"""
+        with transaction.atomic():
+            token = cls.objects.select_for_update().select_related(
+                'user'
+            ).filter(
+                key_hash=cls.hash_key(key),
+                revoked=False,
+                expires_time__gt=timezone.now(),
+                user__is_active=True,
+            ).first()
+            if token is None:
+                return None
+            token.revoked = True
+            token.save(update_fields=['revoked'])
+            return token.user, cls.issue(token.user)
+
+    @classmethod
+    def revoke(cls, key):
+        """Revoke a refresh token"""
+        return cls.objects.filter(key_hash=cls.hash_key(key)).update(
+            revoked=True
+        )
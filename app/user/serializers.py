@@ -53,3 +53,8 @@ class AuthTokenSerializer(serializers.Serializer):
             raise serializers.ValidationError(msg, code='authentication')
         attrs['user'] = user
         return attrs
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    """Serializer for a refresh token"""
+    refresh = serializers.CharField(trim_whitespace=False)
@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from user.authentication import invalidate_tokens, invalidate_user
+from user.models import RefreshToken
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Stop accepting a deleted token"""
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Drop cached tokens of a changed user, so deactivation and
+    password changes take effect on the next request"""
+    if created:
+        return
+    invalidate_user(instance.pk)
+    invalidate_tokens(
+        Token.objects.filter(user=instance).values_list('key', flat=True)
+    )
+
+
+@receiver(post_delete, sender=get_user_model())
+def invalidate_deleted_user(sender, instance, **kwargs):
+    """Stop accepting signed tokens of a deleted user"""
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=get_user_model())
+def revoke_refresh_tokens(sender, instance, created, **kwargs):
+    """Revoke refresh tokens of a deactivated user or of a user whose
+    password changed, their access tokens then expire on their own"""
+    if created:
+        return
+    if not instance.is_active or instance._password is not None:
+        RefreshToken.objects.filter(user=instance, revoked=False).update(
+            revoked=True
+        )
@@ -0,0 +1,99 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from user.authentication import make_token_cache_key
+
+
+ME_URL = reverse('user:me')
+TRANSACTION_URL = reverse('wallet:transactions-list')
+USER_BALANCE_URL = reverse('wallet:userbalance-list')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test the cached token authentication"""
+
+    def setUp(self):
+        caches['tokens'].clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@email.com',
+            password='testpass',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def count_queries(self, url):
+        """Return the number of queries made to serve a request"""
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries)
+
+    def test_token_lookup_cached(self):
+        """Test that the token is only looked up on the first request"""
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_invalid_token_rejected(self):
+        """Test that unknown tokens are not authenticated"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_rejected(self):
+        """Test that a deleted token stops working at once"""
+        self.client.get(ME_URL)
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test that a deactivated user is rejected at once"""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_refreshes_user(self):
+        """Test that updating the user through the API drops the cached
+        user, so the next request sees the change at once"""
+        cache_key = make_token_cache_key(self.token.key)
+        self.client.get(ME_URL)
+        self.assertIsNotNone(caches['tokens'].get(cache_key))
+
+        self.client.patch(ME_URL, {
+            'email': 'new@email.com', 'password': 'newpassword'
+        })
+
+        self.assertIsNone(caches['tokens'].get(cache_key))
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], 'new@email.com')
+        self.assertTrue(res.wsgi_request.user.check_password('newpassword'))
+
+    def test_queries_saved_per_request(self):
+        """Test that the token cache saves the token lookup query of
+        every endpoint"""
+        saved = {}
+        for url in (ME_URL, TRANSACTION_URL, USER_BALANCE_URL):
+            caches['tokens'].clear()
+            uncached = self.count_queries(url)
+            cached = self.count_queries(url)
+            saved[url] = uncached - cached
+
+        self.assertEqual(saved, dict.fromkeys(saved, 1))
@@ -0,0 +1,183 @@
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from core.routers import read_from_replica
+from user.authentication import SignedTokenAuthentication
+from user.models import RefreshToken
+from user.tokens import create_access_token, read_access_token
+
+
+TOKEN_URL = reverse('user:token')
+REFRESH_URL = reverse('user:token-refresh')
+REVOKE_URL = reverse('user:token-revoke')
+ME_URL = reverse('user:me')
+TRANSACTION_URL = reverse('wallet:transactions-list')
+BALANCE_REPORT_URL = reverse('wallet:balance-report')
+
+
+@override_settings(USER_TOKEN_MODE='signed')
+class SignedTokenTests(TestCase):
+    """Test signed access tokens and the refresh flow"""
+
+    def setUp(self):
+        caches['tokens'].clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@email.com',
+            password='testpass',
+        )
+        self.client = APIClient()
+
+    def login(self):
+        res = self.client.post(
+            TOKEN_URL, {'email': 'test@email.com', 'password': 'testpass'}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_login_returns_token_pair(self):
+        """Test that signed mode returns an access and a refresh token"""
+        tokens = self.login()
+
+        self.assertIn('access', tokens)
+        self.assertIn('refresh', tokens)
+        self.assertEqual(
+            read_access_token(tokens['access'])['uid'], self.user.id
+        )
+
+    @override_settings(USER_TOKEN_MODE='db')
+    def test_login_db_mode(self):
+        """Test that database mode keeps returning an opaque token"""
+        res = self.client.post(
+            TOKEN_URL, {'email': 'test@email.com', 'password': 'testpass'}
+        )
+
+        self.assertIn('token', res.data)
+        self.assertNotIn('access', res.data)
+
+    def test_access_token_without_auth_queries(self):
+        """Test that the user of an access token is loaded once, then
+        read from the token cache"""
+        access = create_access_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.client.get(TRANSACTION_URL)
+
+        # Only the paginated transaction query itself is made
+        with self.assertNumQueries(1):
+            res = self.client.get(TRANSACTION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.wsgi_request.user, self.user)
+
+    @override_settings(DATABASE_REPLICAS=['replica_1'])
+    def test_user_read_from_primary(self):
+        """Test that the user of an access token is read from the
+        primary, replicas may not have it yet"""
+        with read_from_replica():
+            user = SignedTokenAuthentication().get_user(self.user.pk)
+
+        self.assertEqual(user, self.user)
+
+    def test_staff_access_token(self):
+        """Test that staff permissions hold for signed token users"""
+        self.user.is_staff = True
+        self.user.save()
+        access = create_access_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        res = self.client.get(BALANCE_REPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_deactivated_user_rejected(self):
+        """Test that access tokens of a deactivated user are rejected
+        before they expire"""
+        access = create_access_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.client.get(TRANSACTION_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(TRANSACTION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_update_with_access_token(self):
+        """Test that updating the profile keeps the other fields"""
+        access = create_access_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        res = self.client.patch(ME_URL, {'email': 'new@email.com'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.email, 'new@email.com')
+        self.assertTrue(self.user.check_password('testpass'))
+
+    def test_me_with_access_token(self):
+        """Test that the profile is loaded for signed token users"""
+        access = create_access_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_expired_access_token_rejected(self):
+        """Test that an expired access token is rejected"""
+        access = create_access_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        with patch('user.tokens.time.time', return_value=time.time() + 301):
+            res = self.client.get(TRANSACTION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_tampered_access_token_rejected(self):
+        """Test that a tampered access token is rejected"""
+        access = create_access_token(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}x')
+
+        res = self.client.get(TRANSACTION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_rotates_token(self):
+        """Test that a refresh token can only be used once"""
+        tokens = self.login()
+
+        res = self.client.post(REFRESH_URL, {'refresh': tokens['refresh']})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res.data['refresh'], tokens['refresh'])
+        res = self.client.post(REFRESH_URL, {'refresh': tokens['refresh']})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoked_refresh_token_rejected(self):
+        """Test that a revoked refresh token is rejected"""
+        tokens = self.login()
+
+        res = self.client.post(REVOKE_URL, {'refresh': tokens['refresh']})
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+        res = self.client.post(REFRESH_URL, {'refresh': tokens['refresh']})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_revokes_refresh_tokens(self):
+        """Test that changing the password revokes refresh tokens"""
+        tokens = self.login()
+
+        self.user.set_password('newpass123')
+        self.user.save()
+
+        res = self.client.post(REFRESH_URL, {'refresh': tokens['refresh']})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertFalse(
+            RefreshToken.objects.filter(revoked=False).exists()
+        )
@@ -0,0 +1,40 @@
+"""
+Stateless access tokens signed with the project SECRET_KEY.
+"""
+import time
+
+from django.conf import settings
+from django.core import signing
+from user.models import RefreshToken
+
+
+ACCESS_TOKEN_SALT = 'user.access-token'
+
+
+def create_access_token(user):
+    """Return a signed access token carrying the user id and expiry"""
+    payload = {
+        'uid': user.pk,
+        'exp': int(time.time()) + settings.USER_ACCESS_TOKEN_LIFETIME,
+    }
+    return signing.dumps(payload, salt=ACCESS_TOKEN_SALT)
+
+
+def read_access_token(token):
+    """Return the payload of a valid access token, None otherwise"""
+    try:
+        payload = signing.loads(token, salt=ACCESS_TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+    if payload.get('exp', 0) <= time.time():
+        return None
+    return payload
+
+
+def create_token_pair(user, refresh=None):
+    """Return a new access token with a refresh token for the user"""
+    return {
+        'access': create_access_token(user),
+        'refresh': refresh or RefreshToken.issue(user),
+        'expires_in': settings.USER_ACCESS_TOKEN_LIFETIME,
+    }
@@ -7,5 +7,11 @@ app_name = 'user'
 urlpatterns = [
     path('register/', views.CreateUserView.as_view(), name='register'),
     path('token/', views.CreateTokenView.as_view(), name='token'),
+    path('token/refresh/',
+         views.RefreshTokenView.as_view(),
+         name='token-refresh'),
+    path('token/revoke/',
+         views.RevokeTokenView.as_view(),
+         name='token-revoke'),
     path('me/', views.ManageUserView.as_view(), name='me'),
 ]
@@ -1,7 +1,17 @@
-from rest_framework import generics, authentication, permissions
+from django.conf import settings
+from rest_framework import generics, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
-from user.serializers import UserSerializer, AuthTokenSerializer
+from rest_framework.views import APIView
+from core.middleware import stick_to_primary
+from user.models import RefreshToken
+from user.serializers import (
+    UserSerializer,
+    AuthTokenSerializer,
+    RefreshTokenSerializer,
+)
+from user.tokens import create_token_pair
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -14,11 +24,53 @@ class CreateTokenView(ObtainAuthToken):
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        """Return a signed token pair in signed token mode"""
+        if settings.USER_TOKEN_MODE != 'signed':
+            response = super().post(request, *args, **kwargs)
+            return stick_to_primary(response, response.data['token'])
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tokens = create_token_pair(serializer.validated_data['user'])
+        return stick_to_primary(Response(tokens), tokens['access'])
+
+
+class RefreshTokenView(APIView):
+    """Exchange a refresh token for a new signed token pair"""
+    authentication_classes = ()
+    permission_classes = ()
+    serializer_class = RefreshTokenSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        rotated = RefreshToken.rotate(serializer.validated_data['refresh'])
+        if rotated is None:
+            return Response(
+                data={'error': 'Invalid or expired refresh token'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+        user, refresh = rotated
+        tokens = create_token_pair(user, refresh=refresh)
+        return stick_to_primary(Response(tokens), tokens['access'])
+
+
+class RevokeTokenView(APIView):
+    """Revoke a refresh token"""
+    authentication_classes = ()
+    permission_classes = ()
+    serializer_class = RefreshTokenSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        RefreshToken.revoke(serializer.validated_data['refresh'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
@@ -1,19 +1,44 @@
 from django.contrib import admin
+from core.admin import LargeTableAdmin
 from wallet import models
 
 
 @admin.register(models.Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(LargeTableAdmin):
     list_display = ('user', 'transaction_type', 'amount', 'created_time')
     list_filter = ('transaction_type',)
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('user__email__exact',)
+    date_hierarchy = 'created_time'
+    ordering = ('-created_time', '-id')
 
 
 @admin.register(models.UserBalance)
-class UserBalanceAdmin(admin.ModelAdmin):
-    list_display = ('user', 'balance', 'created_time')
-    list_filter = ('user__email',)
+class UserBalanceAdmin(LargeTableAdmin):
+    list_display = ('user', 'balance', 'record_type', 'created_time')
+    list_filter = ('record_type',)
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('user__email__exact',)
+    ordering = ('-id',)
 
 
 @admin.register(models.TransferTransaction)
-class TransferTransaction(admin.ModelAdmin):
-    list_display = ('sender_transaction', 'receiver_transaction')
+class TransferTransaction(LargeTableAdmin):
+    list_display = (
+        'sender_transaction', 'receiver_transaction', 'created_time'
+    )
+    list_select_related = ('sender_transaction', 'receiver_transaction')
+    raw_id_fields = ('sender_transaction', 'receiver_transaction')
+    date_hierarchy = 'created_time'
+    ordering = ('-created_time', '-id')
+
+
+@admin.register(models.Wallet)
+class WalletAdmin(LargeTableAdmin):
+    list_display = ('user', 'balance', 'version', 'updated_time')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('user__email__exact',)
+    readonly_fields = ('balance', 'version', 'updated_time')
@@ -0,0 +1,92 @@
+"""
+Async variants of the balance and transaction history reads, meant to
+be served by an ASGI server.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from wallet.models import Transaction
+from wallet.pagination import TimelineCursorPagination
+from wallet.serializers import TransactionSerializer, ValuesSerializer
+
+
+def database_sync_to_async(func):
+    """Run a blocking database function in the thread pool.
+
+    Unlike the thread sensitive default, concurrent requests do not
+    queue up on a single thread. A thread is only held while the
+    database is read and keeps its own connection, recycled following
+    CONN_MAX_AGE like the connection of a request."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper, thread_sensitive=False)
+
+
+def get_authenticators():
+    return [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+
+
+def authenticate(request):
+    """Return a DRF request of the authenticated user"""
+    drf_request = Request(request, authenticators=get_authenticators())
+    if not drf_request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    return drf_request
+
+
+@database_sync_to_async
+def read_balance(request):
+    drf_request = authenticate(request)
+    return {'user balance': Transaction.get_user_balance(drf_request.user)}
+
+
+@database_sync_to_async
+def read_transactions(request):
+    drf_request = authenticate(request)
+    serializer = ValuesSerializer.for_serializer(TransactionSerializer)
+    rows = Transaction.objects.filter(
+        user=drf_request.user
+    ).order_by('-created_time', '-id').values(*serializer.lookups)
+    paginator = TimelineCursorPagination()
+    page = paginator.paginate_queryset(rows, drf_request)
+    return paginator.get_paginated_response(
+        serializer.serialize(page)
+    ).data
+
+
+async def serve(request, read):
+    """Return the JSON response of a read, or its API error"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        data = await read(request)
+    except exceptions.APIException as exc:
+        response = JsonResponse({'detail': exc.detail}, status=exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated,
+                            exceptions.AuthenticationFailed)):
+            response.status_code = 401
+            response['WWW-Authenticate'] = (
+                get_authenticators()[0].authenticate_header(request)
+            )
+        return response
+    return JsonResponse(data)
+
+
+async def balance(request):
+    """Retrieve balance for current user"""
+    return await serve(request, read_balance)
+
+
+async def transaction_list(request):
+    """List transactions of the current user"""
+    return await serve(request, read_transactions)
@@ -0,0 +1,99 @@
+"""
+Read-through cache of user balances.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from core.routers import read_from_primary
+
+
+class BalanceCache:
+    """Cache user balances in a Django cache backend.
+
+    Entries hold the wallet version with the balance. Misses for the
+    same user are coalesced: concurrent readers in the process wait for
+    the first one to load the balance instead of all querying the
+    database, and fill the cache with add(), which never replaces an
+    entry. Ledger writes drop the cached balance right away and store
+    the new one once their transaction commits, unless a later version
+    is cached already, so neither a reader racing with a write nor the
+    late commit callback of an earlier write keep a stale value."""
+    key_prefix = 'wallet:balance:'
+    lock_count = 64
+
+    def __init__(self):
+        self._locks = [threading.Lock() for _ in range(self.lock_count)]
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def backend(self):
+        return caches[settings.WALLET_BALANCE_CACHE]
+
+    def make_key(self, user_id):
+        return f'{self.key_prefix}{user_id}'
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def get(self, user_id, loader):
+        """Return the cached balance of a user, calling loader once
+        to fill the cache on a miss. loader returns the version and the
+        balance of the wallet."""
+        key = self.make_key(user_id)
+        entry = self.backend.get(key)
+        if entry is not None:
+            self._count('hits')
+            return entry[1]
+        with self._locks[hash(user_id) % self.lock_count]:
+            entry = self.backend.get(key)
+            if entry is not None:
+                self._count('coalesced')
+                return entry[1]
+            self._count('misses')
+            # A lagging replica would fill the shared cache with a stale
+            # balance
+            with read_from_primary():
+                entry = loader()
+            self.backend.add(
+                key, entry, settings.WALLET_BALANCE_CACHE_TIMEOUT
+            )
+        return entry[1]
+
+    def store(self, entries):
+        """Cache committed (version, balance) entries by user id, except
+        over entries of a later version"""
+        for user_id, entry in entries.items():
+            key = self.make_key(user_id)
+            with self._locks[hash(user_id) % self.lock_count]:
+                cached = self.backend.get(key)
+                if cached is None or cached[0] < entry[0]:
+                    self.backend.set(
+                        key, entry, settings.WALLET_BALANCE_CACHE_TIMEOUT
+                    )
+
+    def update(self, wallets):
+        """Replace the cached balances of the given wallets"""
+        entries = {
+            wallet.user_id: (wallet.version, wallet.balance)
+            for wallet in wallets
+        }
+        if not entries:
+            return
+        self.backend.delete_many([self.make_key(pk) for pk in entries])
+        transaction.on_commit(lambda: self.store(entries))
+
+    def stats(self):
+        """Return the hit, miss and coalesced miss counters"""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0}
+
+
+balance_cache = BalanceCache()
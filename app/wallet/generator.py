@@ -0,0 +1,220 @@
+"""
+Deterministic synthetic ledger for scale testing.
+"""
+import bisect
+import io
+import itertools
+import random
+from datetime import datetime, timedelta
+
+from django.db import connection
+
+from wallet import partitions
+from wallet.models import Transaction, UserBalance
+
+
+TRANSACTION_COLUMNS = (
+    'id', 'user_id', 'transaction_type', 'amount', 'created_time'
+)
+TRANSFER_COLUMNS = (
+    'sender_transaction_id', 'receiver_transaction_id', 'created_time'
+)
+BALANCE_COLUMNS = ('user_id', 'balance', 'record_type', 'created_time')
+
+
+class LedgerGenerator:
+    """Generate ledger rows for a seed.
+
+    User activity follows a Pareto distribution, so a few users make
+    most of the transactions. Events arrive as a Poisson process over
+    the time span and amounts are log-normal. Purchases and transfers
+    a user can not afford become charges, keeping every balance
+    positive. A snapshot of the users active during a day is taken at
+    the end of the day."""
+
+    def __init__(self, user_ids, transactions, start, end, seed=0,
+                 transfer_share=0.3, purchase_share=0.45,
+                 activity_alpha=1.2):
+        self.user_ids = user_ids
+        self.transactions = transactions
+        self.start = start
+        self.end = end
+        self.transfer_share = transfer_share
+        self.purchase_share = purchase_share
+        self.rand = random.Random(seed)
+        self.cum_weights = list(itertools.accumulate(
+            self.rand.paretovariate(activity_alpha) for _ in user_ids
+        ))
+
+    def pick_user(self, exclude=None):
+        rand = self.rand.random() * self.cum_weights[-1]
+        index = bisect.bisect(self.cum_weights, rand)
+        index = min(index, len(self.user_ids) - 1)
+        if self.user_ids[index] == exclude:
+            index = (index + 1) % len(self.user_ids)
+        return self.user_ids[index]
+
+    def amount(self, median):
+        return max(1, int(self.rand.lognormvariate(0, 1) * median))
+
+    def batches(self, first_id, batch_size):
+        """Yield (transactions, transfers, snapshots) row lists holding
+        about batch_size transactions, ids counting from first_id"""
+        rand = self.rand
+        span = (self.end - self.start).total_seconds()
+        events = self.transactions / (1 + self.transfer_share)
+        mean_gap = span / max(events, 1)
+        can_transfer = len(self.user_ids) > 1
+
+        balances = dict.fromkeys(self.user_ids, 0)
+        active = set()
+        day_end = self.start.replace(
+            hour=0, minute=0, second=0, microsecond=0
+        ) + timedelta(days=1)
+        offset = 0.0
+        next_id = first_id
+        last_id = first_id + self.transactions
+        transactions, transfers, snapshots = [], [], []
+
+        while next_id < last_id:
+            if len(transactions) >= batch_size:
+                yield transactions, transfers, snapshots
+                transactions, transfers, snapshots = [], [], []
+            offset += rand.expovariate(1 / mean_gap) if mean_gap else 0
+            time = min(self.start + timedelta(seconds=offset), self.end)
+            while time >= day_end:
+                snapshots += [
+                    (user_id, balances[user_id], UserBalance.SNAPSHOT,
+                     day_end)
+                    for user_id in sorted(active)
+                ]
+                active.clear()
+                day_end += timedelta(days=1)
+
+            user_id = self.pick_user()
+            active.add(user_id)
+            kind = rand.random()
+            if (kind < self.transfer_share and can_transfer
+                    and last_id - next_id >= 2):
+                amount = self.amount(40)
+                if amount <= balances[user_id]:
+                    receiver_id = self.pick_user(exclude=user_id)
+                    active.add(receiver_id)
+                    balances[user_id] -= amount
+                    balances[receiver_id] += amount
+                    transactions += [
+                        (next_id, user_id, Transaction.TRANSFER_SENT,
+                         amount, time),
+                        (next_id + 1, receiver_id,
+                         Transaction.TRANSFER_RECEIVED, amount, time),
+                    ]
+                    transfers.append((next_id, next_id + 1, time))
+                    next_id += 2
+                    continue
+            elif kind < self.transfer_share + self.purchase_share:
+                amount = self.amount(25)
+                if amount <= balances[user_id]:
+                    balances[user_id] -= amount
+                    transactions.append((
+                        next_id, user_id, Transaction.PURCHASE, amount, time
+                    ))
+                    next_id += 1
+                    continue
+            amount = self.amount(200)
+            balances[user_id] += amount
+            transactions.append((
+                next_id, user_id, Transaction.CHARGE, amount, time
+            ))
+            next_id += 1
+        if transactions or transfers or snapshots:
+            yield transactions, transfers, snapshots
+
+
+def reserve_transaction_ids(count):
+    """Return the first of count consecutive transaction ids nobody
+    else will be given"""
+    table = Transaction._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'SELECT pg_get_serial_sequence(%s, %s)', [table, 'id']
+            )
+            sequence = cursor.fetchone()[0]
+            cursor.execute(
+                'SELECT setval(%s, nextval(%s) + %s - 1)',
+                [sequence, sequence, count]
+            )
+            return cursor.fetchone()[0] - count + 1
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) FROM {table}')
+        return cursor.fetchone()[0] + 1
+
+
+def write_rows(table, columns, rows):
+    """Insert rows with COPY on PostgreSQL, batched INSERT statements
+    elsewhere"""
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    names = ', '.join(quote(column) for column in columns)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            buffer = io.StringIO()
+            for row in rows:
+                buffer.write('\t'.join(map(str, row)))
+                buffer.write('\n')
+            buffer.seek(0)
+            cursor.copy_expert(
+                f'COPY {quote(table)} ({names}) FROM STDIN', buffer
+            )
+        else:
+            adapt = connection.ops.adapt_datetimefield_value
+            placeholders = ', '.join(['%s'] * len(columns))
+            cursor.executemany(
+                f'INSERT INTO {quote(table)} ({names}) '
+                f'VALUES ({placeholders})',
+                [
+                    [adapt(value) if isinstance(value, datetime) else value
+                     for value in row]
+                    for row in rows
+                ]
+            )
+
+
+class TransactionLoader:
+    """Write time ordered transaction rows.
+
+    On a partitioned table, months without a partition are loaded into
+    a new table attached by finish(), so its indexes and foreign key
+    are built in bulk rather than row by row."""
+
+    def __init__(self):
+        self.table = Transaction._meta.db_table
+        self.partitioned = partitions.is_partitioned()
+        self.existing = set()
+        if self.partitioned:
+            self.existing = set(dict(partitions.list_partitions()))
+        self.detached = []
+
+    def write(self, rows):
+        if not self.partitioned:
+            write_rows(self.table, TRANSACTION_COLUMNS, rows)
+            return
+        for month, group in itertools.groupby(
+            rows, key=lambda row: partitions.month_start(row[4])
+        ):
+            name = partitions.partition_name(month)
+            if name in self.existing:
+                name = self.table
+            elif month not in self.detached:
+                partitions.create_detached_partition(month)
+                self.detached.append(month)
+            write_rows(name, TRANSACTION_COLUMNS, list(group))
+
+    def finish(self):
+        """Attach the partitions loaded detached"""
+        for month in self.detached:
+            partitions.attach_partition(month)
+        self.existing.update(
+            partitions.partition_name(month) for month in self.detached
+        )
+        self.detached = []
@@ -0,0 +1,130 @@
+"""
+Django command to compare the sync and async read endpoints under
+concurrent clients.
+"""
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Paths of each endpoint on the WSGI and on the ASGI deployment
+ENDPOINTS = {
+    'balance': (
+        '/api/wallet/transactions/0/get_user_balance/',
+        '/api/wallet/async/balance/',
+    ),
+    'transactions': (
+        '/api/wallet/transactions/',
+        '/api/wallet/async/transactions/',
+    ),
+}
+
+
+async def fetch(url, headers):
+    """GET a URL on a new connection, return the response status"""
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(
+        parts.hostname, parts.port or 80
+    )
+    target = parts.path + (f'?{parts.query}' if parts.query else '')
+    lines = [f'GET {target} HTTP/1.1', f'Host: {parts.netloc}',
+             'Connection: close']
+    lines += [f'{name}: {value}' for name, value in headers.items()]
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin1'))
+    await writer.drain()
+    status_line = await reader.readline()
+    await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return int(status_line.split()[1])
+
+
+async def run_clients(url, headers, clients, total):
+    """Make total requests from concurrent clients, return the
+    latencies of successful requests, the error count and the time"""
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def client():
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                status = await fetch(url, headers)
+            except OSError:
+                status = None
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return latencies, errors, time.perf_counter() - start
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the WSGI and ASGI deployments."""
+    help = ('Compare the throughput of the sync endpoints served by the '
+            'WSGI deployment with their async variants served by the '
+            'ASGI one.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--wsgi-url',
+            default='http://127.0.0.1:8000',
+            help='Base URL of the WSGI deployment.',
+        )
+        parser.add_argument(
+            '--asgi-url',
+            default='http://127.0.0.1:8001',
+            help='Base URL of the ASGI deployment.',
+        )
+        parser.add_argument(
+            '--endpoint',
+            choices=sorted(ENDPOINTS),
+            default='transactions',
+        )
+        parser.add_argument(
+            '--token',
+            required=True,
+            help='Authorization header value, e.g. "Token <key>".',
+        )
+        parser.add_argument('--clients', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['clients'] < 1 or options['requests'] < 1:
+            raise CommandError('--clients and --requests must be positive.')
+        headers = {'Authorization': options['token']}
+        sync_path, async_path = ENDPOINTS[options['endpoint']]
+        targets = (
+            ('wsgi', options['wsgi_url'].rstrip('/') + sync_path),
+            ('asgi', options['asgi_url'].rstrip('/') + async_path),
+        )
+
+        self.stdout.write(
+            f'{options["requests"]} requests from {options["clients"]} '
+            f'clients per deployment'
+        )
+        for name, url in targets:
+            latencies, errors, elapsed = asyncio.run(run_clients(
+                url, headers, options['clients'], options['requests']
+            ))
+            if not latencies:
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: all {errors} requests to {url} failed'
+                ))
+                continue
+            latencies.sort()
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            self.stdout.write(
+                f'{name}: {len(latencies) / elapsed:.1f} req/s, '
+                f'p50 {statistics.median(latencies) * 1000:.1f}ms, '
+                f'p95 {p95 * 1000:.1f}ms, {errors} errors'
+            )
@@ -0,0 +1,106 @@
+"""
+Django command to compare the model serializer read path with the
+values() read path of the list endpoints.
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import FastJSONRenderer
+from wallet.models import Transaction, TransferTransaction, UserBalance
+from wallet.serializers import (
+    TransactionSerializer,
+    TransferTransactionSerializer,
+    UserBalanceSerializer,
+    ValuesSerializer,
+)
+
+
+ENDPOINTS = {
+    'transactions': (Transaction, TransactionSerializer),
+    'balances': (UserBalance, UserBalanceSerializer),
+    'transfers': (TransferTransaction, TransferTransactionSerializer),
+}
+
+
+def model_path(queryset, serializer_class):
+    """Serialize model instances, return the data and the renderer"""
+    # all() reads the rows again rather than the cached results
+    data = serializer_class(list(queryset.all()), many=True).data
+    return data, JSONRenderer()
+
+
+def values_path(queryset, serializer_class):
+    """Serialize values() rows, return the data and the renderer"""
+    serializer = ValuesSerializer.for_serializer(serializer_class)
+    rows = list(queryset.values(*serializer.lookups))
+    return serializer.serialize(rows), FastJSONRenderer()
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the list read paths."""
+    help = ('Read a page of a list endpoint with model instances and the '
+            'default renderer, then with values() rows and the fast '
+            'renderer, and report rows/sec of each step.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--endpoint',
+            choices=sorted(ENDPOINTS),
+            default='transactions',
+        )
+        parser.add_argument(
+            '--email',
+            help='User whose rows are read, the most active by default.',
+        )
+        parser.add_argument('--rows', type=int, default=500)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError('--rows and --repeat must be positive.')
+        model, serializer_class = ENDPOINTS[options['endpoint']]
+        queryset = model.objects.order_by('-created_time', '-id')
+        if model is TransferTransaction:
+            queryset = queryset.select_related(
+                'sender_transaction', 'receiver_transaction'
+            )
+        else:
+            if options['email']:
+                user = get_user_model().objects.filter(
+                    email=options['email']
+                ).first()
+                if user is None:
+                    raise CommandError('No user with this email.')
+                user_id = user.id
+            else:
+                busiest = model.objects.values('user').annotate(
+                    rows=Count('id')
+                ).order_by('-rows').first()
+                if busiest is None:
+                    raise CommandError('There are no rows to read.')
+                user_id = busiest['user']
+            queryset = queryset.filter(user_id=user_id)
+        queryset = queryset[:options['rows']]
+
+        for name, path in (('model', model_path), ('values', values_path)):
+            read = render = 0
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                data, renderer = path(queryset, serializer_class)
+                middle = time.perf_counter()
+                renderer.render({'results': data})
+                read += middle - start
+                render += time.perf_counter() - middle
+            rows = len(data) * options['repeat']
+            if not rows:
+                raise CommandError('There are no rows to read.')
+            self.stdout.write(
+                f'{name}: read and serialize {rows / read:.0f} rows/sec, '
+                f'render {rows / render:.0f} rows/sec, '
+                f'total {rows / (read + render):.0f} rows/sec'
+            )
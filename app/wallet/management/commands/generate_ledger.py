@@ -0,0 +1,144 @@
+"""
+Django command to generate a synthetic ledger for scale testing.
+"""
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from wallet.generator import (
+    BALANCE_COLUMNS,
+    TRANSFER_COLUMNS,
+    LedgerGenerator,
+    TransactionLoader,
+    reserve_transaction_ids,
+    write_rows,
+)
+from wallet.models import (
+    DailyRollup,
+    Transaction,
+    TransferTransaction,
+    UserBalance,
+    Wallet,
+)
+
+
+class Command(BaseCommand):
+    """Django command to generate users, transactions and transfers."""
+    help = ('Generate users with a realistic ledger, deterministic for a '
+            'seed and an end time, then rebuild their wallets.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument(
+            '--transactions',
+            type=int,
+            default=100000,
+            help='Number of transactions, counting both legs of transfers.',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='Number of days the transactions are spread over.',
+        )
+        parser.add_argument(
+            '--end',
+            help='ISO 8601 datetime of the last transaction, now by '
+                 'default. Needed for a reproducible ledger, the '
+                 'transaction times follow it.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50000,
+            help='Number of transactions written per COPY or INSERT.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['users'] < 1:
+            raise CommandError('--users must be positive.')
+        if options['transactions'] < 0:
+            raise CommandError('--transactions must not be negative.')
+        if options['days'] < 1:
+            raise CommandError('--days must be positive.')
+        end = timezone.now()
+        if options['end']:
+            end = parse_datetime(options['end'])
+            if end is None:
+                raise CommandError('--end must be an ISO 8601 datetime.')
+            if timezone.is_naive(end):
+                end = timezone.make_aware(end)
+            # Wallet checkpoints are recorded now, they must follow every
+            # generated transaction
+            if end > timezone.now():
+                raise CommandError('--end can not be in the future.')
+        start = end - timedelta(days=options['days'])
+
+        prefix = f'ledger-{options["seed"]}-'
+        users = get_user_model().objects.filter(email__startswith=prefix)
+        if users.exists():
+            raise CommandError(
+                f'Users of seed {options["seed"]} exist, use another seed.'
+            )
+
+        started = time.monotonic()
+        password = make_password(None)
+        get_user_model().objects.bulk_create(
+            [
+                get_user_model()(
+                    email=f'{prefix}{index}@example.com', password=password
+                )
+                for index in range(options['users'])
+            ],
+            batch_size=options['batch_size']
+        )
+        user_ids = list(users.order_by('id').values_list('id', flat=True))
+        self.stdout.write(f'Created {len(user_ids)} users')
+
+        generator = LedgerGenerator(
+            user_ids, options['transactions'], start, end,
+            seed=options['seed']
+        )
+        first_id = reserve_transaction_ids(options['transactions'])
+        loader = TransactionLoader()
+        rows = 0
+        for transactions, transfers, snapshots in generator.batches(
+            first_id, options['batch_size']
+        ):
+            with transaction.atomic():
+                loader.write(transactions)
+                write_rows(
+                    TransferTransaction._meta.db_table,
+                    TRANSFER_COLUMNS, transfers
+                )
+                write_rows(
+                    UserBalance._meta.db_table, BALANCE_COLUMNS, snapshots
+                )
+            rows += len(transactions) + len(transfers) + len(snapshots)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'Wrote {rows} rows, {rows / elapsed:.0f} rows/sec'
+            )
+
+        loader.finish()
+        self.stdout.write('Rebuilding wallets...')
+        Wallet.rebuild(checkpoint=True, users=users)
+        self.stdout.write('Rebuilding rollups...')
+        DailyRollup.rebuild(users=users, since=DailyRollup.day_of(start))
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for model in (Transaction, TransferTransaction, UserBalance,
+                              Wallet, DailyRollup):
+                    cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {rows} rows in {time.monotonic() - started:.1f}s!'
+        ))
@@ -0,0 +1,87 @@
+"""
+Django command to maintain the monthly transaction partitions.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet import partitions
+
+
+class Command(BaseCommand):
+    """Django command to create and detach transaction partitions."""
+    help = ('Create the transaction partitions of the coming months and '
+            'detach the ones older than a month.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=3,
+            help='Number of months to create partitions for after the '
+                 'current one.',
+        )
+        parser.add_argument(
+            '--detach-before',
+            metavar='YYYY-MM',
+            help='Detach the partitions of the months before this one.',
+        )
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            help='Drop detached partitions and their transfers instead of '
+                 'keeping them as archive tables.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if not partitions.is_partitioned():
+            raise CommandError('The transaction table is not partitioned.')
+
+        before = None
+        if options['detach_before']:
+            try:
+                before = datetime.strptime(
+                    options['detach_before'], '%Y-%m'
+                ).replace(tzinfo=dt_timezone.utc)
+            except ValueError:
+                raise CommandError('--detach-before must be YYYY-MM.')
+
+        for name in partitions.create_partitions(ahead=options['ahead']):
+            self.stdout.write(f'Created {name}')
+
+        if before is None:
+            self.stdout.write(self.style.SUCCESS('Partitions are ready!'))
+            return
+
+        old = [
+            (name, month) for name, month in partitions.list_partitions()
+            if month < before
+        ]
+        # The ledger must start at the oldest attached month, without
+        # older transactions left behind in the default partition.
+        if old and partitions.default_rows_before(
+            partitions.next_month(old[-1][1])
+        ):
+            raise CommandError(
+                'The default partition holds transactions of the months '
+                'to detach or older ones. Create their partitions first.'
+            )
+        # Balances are read from the latest checkpoint onwards, so a
+        # month can only go once every user in it has a later one.
+        for name, month in old:
+            users = partitions.uncovered_users(name, month)
+            if users:
+                raise CommandError(
+                    f'{name} holds transactions of users without a later '
+                    f'balance checkpoint: {users}. Record their balances '
+                    f'first.'
+                )
+        for name, month in old:
+            partitions.detach_partition(name, drop=options['drop'])
+            action = 'Dropped' if options['drop'] else 'Detached'
+            self.stdout.write(f'{action} {name}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(old)} partitions detached!'
+        ))
@@ -0,0 +1,25 @@
+"""
+Django command to delete expired idempotency keys.
+"""
+from django.core.management.base import BaseCommand
+
+from wallet.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    """Django command to purge idempotency keys."""
+    help = 'Delete the idempotency keys whose replay window is over.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=10000,
+            help='Number of keys deleted per query.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        self.stdout.write('Purging idempotency keys...')
+        purged = IdempotencyKey.purge(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} keys!'))
@@ -0,0 +1,42 @@
+"""
+Django command to rebuild the daily transaction rollups from the ledger.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from wallet.models import DailyRollup
+
+
+class Command(BaseCommand):
+    """Django command to rebuild daily rollups."""
+    help = ('Recompute the daily transaction count and sum of every user '
+            'and type from the transactions, catching up after writes '
+            'made outside the models such as bulk loads.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='ISO 8601 date of the first day rebuilt, all by default. '
+                 'Days of detached partitions are always kept.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of users rebuilt per database transaction.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError('--since must be an ISO 8601 date.')
+        self.stdout.write('Rebuilding rollups...')
+        rebuilt = DailyRollup.rebuild(
+            chunk_size=options['chunk_size'], since=since
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt the rollups of {rebuilt} users!'
+        ))
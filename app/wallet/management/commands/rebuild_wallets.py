@@ -0,0 +1,25 @@
+"""
+Django command to rebuild materialized wallet balances from the ledger.
+"""
+from django.core.management.base import BaseCommand
+
+from wallet.models import Wallet
+
+
+class Command(BaseCommand):
+    """Django command to rebuild wallets."""
+    help = 'Recompute every user wallet balance from the transactions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of users rebuilt per database transaction.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        self.stdout.write('Rebuilding wallets...')
+        rebuilt = Wallet.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} wallets!'))
@@ -0,0 +1,72 @@
+"""
+Django command to record a balance snapshot for every user.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from wallet.models import UserBalance
+
+
+class Command(BaseCommand):
+    """Django command to snapshot user balances."""
+    help = 'Record the balance of every user, a chunk of users at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only snapshot users with transactions since this '
+                 'ISO 8601 datetime.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=10000,
+            help='Number of users aggregated and inserted per query.',
+        )
+        parser.add_argument(
+            '--after-user',
+            type=int,
+            default=0,
+            help='Resume after this user id.',
+        )
+        parser.add_argument(
+            '--time-budget',
+            type=float,
+            help='Stop after the chunk exceeding this many seconds.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        since = None
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError('--since must be an ISO 8601 datetime.')
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+
+        self.stdout.write('Recording balance snapshots...')
+        start = time.monotonic()
+        total = 0
+        last_user = options['after_user']
+        chunks = UserBalance.snapshot_balances(
+            since=since,
+            chunk_size=options['chunk_size'],
+            after_user=last_user,
+        )
+        for last_user, created in chunks:
+            total += created
+            budget = options['time_budget']
+            if budget is not None and time.monotonic() - start > budget:
+                self.stdout.write(self.style.WARNING(
+                    f'Time budget exhausted, resume with '
+                    f'--after-user {last_user}'
+                ))
+                break
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Recorded {total} snapshots up to user {last_user}!'
+        ))
@@ -0,0 +1,47 @@
+# Generated by Django 3.2.19 on 2026-10-18 11:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_wallets(apps, schema_editor):
+    """Create a wallet for every user holding the ledger balance"""
+    Transaction = apps.get_model('wallet', 'Transaction')
+    Wallet = apps.get_model('wallet', 'Wallet')
+    rows = Transaction.objects.values('user_id').annotate(
+        balance=Coalesce(
+            Sum('amount', filter=Q(transaction_type__in=[1, 3])), 0
+        ) - Coalesce(
+            Sum('amount', filter=Q(transaction_type__in=[2, 4])), 0
+        ),
+        version=Count('id'),
+    ).order_by('user_id')
+    Wallet.objects.bulk_create(
+        (Wallet(**row) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('wallet', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Wallet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.BigIntegerField(default=0, verbose_name='balance')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='version')),
+                ('updated_time', models.DateTimeField(auto_now=True, verbose_name='updated time')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.RESTRICT, related_name='wallet', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+        ),
+        migrations.RunPython(populate_wallets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.19 on 2026-10-18 11:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0002_wallet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userbalance',
+            name='record_type',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Manual'), (2, 'Checkpoint')], default=1, verbose_name='record type'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'created_time'], name='transaction_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userbalance',
+            index=models.Index(fields=['user', 'created_time'], name='userbalance_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userbalance',
+            index=models.Index(condition=models.Q(('record_type', 2)), fields=['user', 'created_time'], name='userbalance_checkpoint_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.19 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0003_balance_checkpoints'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_user_time_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='userbalance',
+            name='userbalance_user_time_idx',
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'created_time', 'id'], name='transaction_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transfertransaction',
+            index=models.Index(fields=['created_time', 'id'], name='transfer_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userbalance',
+            index=models.Index(fields=['user', 'created_time', 'id'], name='userbalance_user_time_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0005_ledger_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userbalance',
+            name='record_type',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Manual'), (2, 'Checkpoint'), (3, 'Snapshot')], default=1, verbose_name='record type'),
+        ),
+    ]
@@ -0,0 +1,113 @@
+# Generated by Django 3.2.19 on 2026-10-18 11:19
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+TABLE = 'wallet_transaction'
+MONTHS_AHEAD = 3
+
+
+def next_month(month):
+    if month.month == 12:
+        return month.replace(year=month.year + 1, month=1)
+    return month.replace(month=month.month + 1)
+
+
+def copy_table(cursor, partitioned):
+    """Copy the transaction table into a new table, partitioned by
+    created_time month or not, and swap the new one in. Indexes,
+    foreign keys and the id sequence are carried over."""
+    cursor.execute(
+        "SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i "
+        "WHERE i.indrelid = %s::regclass AND NOT i.indisprimary",
+        [TABLE]
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [TABLE]
+    )
+    foreign_keys = cursor.fetchall()
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+    sequence = cursor.fetchone()[0]
+
+    partition_by = ' PARTITION BY RANGE (created_time)' if partitioned else ''
+    cursor.execute(
+        f'CREATE TABLE {TABLE}_new (LIKE {TABLE} '
+        f'INCLUDING DEFAULTS INCLUDING CONSTRAINTS){partition_by}'
+    )
+    if partitioned:
+        cursor.execute(
+            f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE}_new DEFAULT'
+        )
+        cursor.execute(f'SELECT min(created_time) FROM {TABLE}')
+        now = datetime.now(timezone.utc)
+        first = cursor.fetchone()[0] or now
+        month = datetime(first.year, first.month, 1, tzinfo=timezone.utc)
+        last = datetime(now.year, now.month, 1, tzinfo=timezone.utc)
+        for _ in range(MONTHS_AHEAD):
+            last = next_month(last)
+        while month <= last:
+            cursor.execute(
+                f'CREATE TABLE {TABLE}_p{month.year:04d}_{month.month:02d} '
+                f'PARTITION OF {TABLE}_new FOR VALUES FROM (%s) TO (%s)',
+                [month, next_month(month)]
+            )
+            month = next_month(month)
+    cursor.execute(f'INSERT INTO {TABLE}_new SELECT * FROM {TABLE}')
+    cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {TABLE}_new.id')
+    cursor.execute(f'DROP TABLE {TABLE}')
+    cursor.execute(f'ALTER TABLE {TABLE}_new RENAME TO {TABLE}')
+    # The primary key of a partitioned table must hold the partition key
+    primary_key = '(id, created_time)' if partitioned else '(id)'
+    cursor.execute(
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey '
+        f'PRIMARY KEY {primary_key}'
+    )
+    for index in indexes:
+        cursor.execute(index.replace(' ON ONLY ', ' ON ', 1))
+    for name, definition in foreign_keys:
+        cursor.execute(
+            f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}'
+        )
+
+
+def partition_transactions(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        copy_table(cursor, partitioned=True)
+
+
+def unpartition_transactions(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        copy_table(cursor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0006_balance_snapshots'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transfertransaction',
+            name='receiver_transaction',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.RESTRICT, related_name='received_transfers', to='wallet.transaction', verbose_name='receiver transaction'),
+        ),
+        migrations.AlterField(
+            model_name='transfertransaction',
+            name='sender_transaction',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.RESTRICT, related_name='sent_transfers', to='wallet.transaction', verbose_name='sender transaction'),
+        ),
+        migrations.RunPython(
+            partition_transactions, unpartition_transactions
+        ),
+    ]
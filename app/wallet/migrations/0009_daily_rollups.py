@@ -0,0 +1,60 @@
+# Generated by Django 3.2.19 on 2026-10-18 11:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def populate_rollups(apps, schema_editor):
+    """Roll up the existing ledger by user, day and type"""
+    Transaction = apps.get_model('wallet', 'Transaction')
+    DailyRollup = apps.get_model('wallet', 'DailyRollup')
+    rows = Transaction.objects.annotate(
+        day=TruncDate('created_time', tzinfo=timezone.get_default_timezone())
+    ).values('user_id', 'day', 'transaction_type').annotate(
+        rows=Count('id'),
+        amount_total=Sum('amount'),
+    ).order_by()
+    DailyRollup.objects.bulk_create(
+        (
+            DailyRollup(
+                user_id=row['user_id'],
+                day=row['day'],
+                transaction_type=row['transaction_type'],
+                count=row['rows'],
+                total=row['amount_total'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('wallet', '0008_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='day')),
+                ('transaction_type', models.PositiveSmallIntegerField(choices=[(1, 'Charge'), (2, 'Purchase'), (3, 'Transfer Received'), (4, 'Transfer Sent')], verbose_name='transaction type')),
+                ('count', models.BigIntegerField(default=0, verbose_name='count')),
+                ('total', models.BigIntegerField(default=0, verbose_name='total')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.RESTRICT, related_name='daily_rollups', to=settings.AUTH_USER_MODEL, verbose_name='user')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(fields=('user', 'day', 'transaction_type'), name='rollup_user_day_type_uniq'),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.19 on 2026-10-18 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0009_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='wallet',
+            index=models.Index(fields=['balance', 'user'], name='wallet_balance_idx'),
+        ),
+    ]
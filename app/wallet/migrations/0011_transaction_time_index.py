@@ -0,0 +1,17 @@
+# Generated by Django 3.2.19 on 2026-10-18 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0010_wallet_balance_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['created_time', 'id'], name='transaction_time_idx'),
+        ),
+    ]
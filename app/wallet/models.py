@@ -1,10 +1,48 @@
-from django.db import models
+import random
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from django.db import models, OperationalError
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
 from django.conf import settings
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from django.db import transaction
-from django.db.models import Count, Sum, Q
-from django.db.models.functions import Coalesce
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Trunc, TruncDate
+from wallet.cache import balance_cache
+
+# SQLSTATE codes of errors which are safe to retry as a whole:
+# serialization_failure and deadlock_detected
+RETRYABLE_ERROR_CODES = ('40001', '40P01')
+
+
+class TransferError(Exception):
+    """Raised when a transfer can not be made"""
+
+
+class InsufficientBalance(TransferError):
+    """Raised when the sender balance does not cover a transfer"""
+
+
+def run_with_retry(func, retries=None, delay=None):
+    """Call func, retrying serialization and deadlock errors
+    with a bounded exponential backoff"""
+    if retries is None:
+        retries = settings.WALLET_TRANSFER_RETRIES
+    if delay is None:
+        delay = settings.WALLET_TRANSFER_RETRY_DELAY
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except OperationalError as error:
+            pgcode = getattr(error.__cause__, 'pgcode', None)
+            if pgcode not in RETRYABLE_ERROR_CODES or attempt == retries:
+                raise
+            time.sleep(delay * 2 ** attempt * random.uniform(0.5, 1.5))
 
 
 class Transaction(models.Model):
@@ -20,11 +58,14 @@ class Transaction(models.Model):
         (TRANSFER_RECEIVED, 'Transfer Received'),
         (TRANSFER_SENT, 'Transfer Sent'),
     )
+    CREDIT_TYPES = (CHARGE, TRANSFER_RECEIVED)
+    DEBIT_TYPES = (PURCHASE, TRANSFER_SENT)
 
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.RESTRICT,
         related_name='transactions',
+        db_index=False,
         verbose_name=_('user')
     )
     transaction_type = models.PositiveSmallIntegerField(
@@ -41,77 +82,408 @@ class Transaction(models.Model):
     def __str__(self):
         return f'{self.get_transaction_type_display()}'
 
+    @property
+    def signed_amount(self):
+        """Amount as it affects the user balance"""
+        if self.transaction_type in self.DEBIT_TYPES:
+            return -self.amount
+        return self.amount
+
+    class Meta:
+        # The user foreign key is served by the composite indexes:
+        # history pages and checkpoint deltas range scan the first one,
+        # whole ledger aggregates per user are index-only scans of the
+        # second, the admin type filter uses the third one and the admin
+        # date hierarchy and ordering the last one.
+        indexes = (
+            models.Index(
+                fields=('user', 'created_time', 'id'),
+                include=('transaction_type', 'amount'),
+                name='transaction_user_time_idx'
+            ),
+            models.Index(
+                fields=('user', 'transaction_type'),
+                include=('amount',),
+                name='transaction_user_type_idx'
+            ),
+            models.Index(
+                fields=('transaction_type', 'id'),
+                name='transaction_type_idx'
+            ),
+            models.Index(
+                fields=('created_time', 'id'),
+                name='transaction_time_idx'
+            ),
+        )
+
+    def save(self, *args, **kwargs):
+        """Save the transaction and keep the user wallet in step"""
+        with transaction.atomic():
+            deltas = Counter()
+            adding = self._state.adding
+            previous = None
+            if not adding:
+                previous = Transaction.objects.filter(pk=self.pk).first()
+                if previous is not None:
+                    deltas[previous.user_id] -= previous.signed_amount
+            deltas[self.user_id] += self.signed_amount
+            wallets = Wallet.apply_deltas(deltas)
+            super().save(*args, **kwargs)
+            if previous is not None:
+                DailyRollup.add([previous], sign=-1)
+            DailyRollup.add([self])
+            # Rewriting history invalidates the checkpoints made after it
+            UserBalance.record_checkpoints(
+                wallets.values(), force=not adding
+            )
+
+    def delete(self, *args, **kwargs):
+        """Delete the transaction and take it out of the user wallet"""
+        with transaction.atomic():
+            wallets = Wallet.apply_deltas({self.user_id: -self.signed_amount})
+            DailyRollup.add([self], sign=-1)
+            result = super().delete(*args, **kwargs)
+            UserBalance.record_checkpoints(wallets.values(), force=True)
+            return result
+
     @classmethod
-    def get_report(cls):
-        """Show all users and their balance"""
+    def bulk_record(cls, transactions, wallets=None, batch_size=None):
+        """Insert transactions in batches and apply them to the user
+        wallets in one pass. Must be called inside a database
+        transaction."""
+        deltas = Counter()
+        counts = Counter()
+        for instance in transactions:
+            deltas[instance.user_id] += instance.signed_amount
+            counts[instance.user_id] += 1
+        wallets = Wallet.apply_deltas(deltas, counts, wallets=wallets)
+        if connection.features.can_return_rows_from_bulk_insert:
+            transactions = cls.objects.bulk_create(
+                transactions, batch_size=batch_size
+            )
+        else:
+            # Without RETURNING the ids are only known row by row, the
+            # base save skips the wallet update already applied above
+            for instance in transactions:
+                models.Model.save(instance, force_insert=True)
+        DailyRollup.add(transactions)
+        UserBalance.record_checkpoints(
+            [wallets[user_id] for user_id in counts], counts
+        )
+        return transactions
+
+    @classmethod
+    def balance_expression(cls, prefix=''):
+        """Aggregate expression computing a balance from the ledger"""
         positive_transactions = Sum(
-            'transaction__amount',
-            filter=Q(transactions__transaction_type__in=[1, 3])
+            f'{prefix}amount',
+            filter=Q(**{f'{prefix}transaction_type__in': cls.CREDIT_TYPES})
         )
         negative_transactions = Sum(
-            'transaction__amount',
-            filter=Q(transactions__transaction_type_in=[2, 4])
+            f'{prefix}amount',
+            filter=Q(**{f'{prefix}transaction_type__in': cls.DEBIT_TYPES})
         )
-        users = get_user_model().objects.all().annotate(
-            transactions_count=Count('transactions__id'),
-            balance=Sum(Coalesce(positive_transactions, 0) -
-                        Coalesce(negative_transactions, 0))
+        return (Coalesce(positive_transactions, 0) -
+                Coalesce(negative_transactions, 0))
+
+    @classmethod
+    def get_report(cls):
+        """Show all users with their transaction count and balance,
+        read from the daily rollups"""
+        return get_user_model().objects.annotate(
+            transactions_count=Coalesce(Sum('daily_rollups__count'), 0),
+            balance=DailyRollup.balance_expression('daily_rollups__')
         )
-        return users
 
     @classmethod
     def get_total_balance(cls):
         """Retrieve balance for all users"""
-        queryset = cls.get_report()
-        return queryset.aggregate(Sum('balance'))
+        return DailyRollup.objects.aggregate(
+            balance__sum=DailyRollup.balance_expression()
+        )
 
     @classmethod
     def get_user_balance(cls, user):
         """Retrieve balance for current user"""
-        positive_transactions = Sum(
-            'amount',
-            filter=Q(transaction_type__in=[1, 3])
-        )
-        negative_transactions = Sum(
-            'amount',
-            filter=Q(transaction_type__in=[2, 4])
+        def load():
+            entry = Wallet.get_versioned_balance(user)
+            if entry is None:
+                return 0, cls.get_ledger_balance(user)
+            return entry
+
+        return balance_cache.get(user.pk, load)
+
+    @classmethod
+    def get_ledger_balance(cls, user):
+        """Compute balance for current user from the latest checkpoint
+        and the transactions made after it"""
+        transactions = user.transactions.all()
+        checkpoint = UserBalance.get_latest_checkpoint(user)
+        if checkpoint is not None:
+            transactions = transactions.filter(
+                created_time__gt=checkpoint.created_time
+            )
+        user_balance = transactions.aggregate(
+            balance=cls.balance_expression()
         )
-        user_balance = user.transactions.all().aggregate(
-            balance=Coalesce(positive_transactions, 0) -
-            Coalesce(negative_transactions, 0)
+        balance = user_balance.get('balance', 0)
+        if checkpoint is not None:
+            balance += checkpoint.balance
+        return balance
+
+    @classmethod
+    def get_ledger_start(cls):
+        """Return the start of the oldest attached transaction partition,
+        older transactions may be detached. None if the table is not
+        partitioned."""
+        # The partitions module is built on the models
+        from wallet import partitions
+        return partitions.ledger_start()
+
+    @classmethod
+    def get_ledger_balances(cls, user_ids):
+        """Compute the balances of the given users from the ledger,
+        by user id. Users without any transaction are left out.
+
+        On a partitioned table, the balance of a user starts from their
+        first checkpoint recorded on the attached partitions, which
+        covers the detached transactions, and adds the transactions made
+        after it."""
+        transactions = cls.objects.filter(user_id__in=user_ids)
+        baselines = {}
+        start = cls.get_ledger_start()
+        if start is not None:
+            baselines = UserBalance.get_first_checkpoints(user_ids, start)
+            baseline_time = UserBalance.objects.filter(
+                user_id=OuterRef('user_id'),
+                record_type=UserBalance.CHECKPOINT,
+                created_time__gte=start
+            ).order_by('created_time', 'id').values('created_time')[:1]
+            transactions = transactions.annotate(
+                baseline_time=Subquery(baseline_time)
+            ).filter(
+                Q(baseline_time__isnull=True) |
+                Q(created_time__gt=F('baseline_time'))
+            )
+        balances = dict(
+            transactions.values('user_id').annotate(
+                balance=cls.balance_expression()
+            ).order_by().values_list('user_id', 'balance')
         )
-        return user_balance.get('balance', 0)
+        for user_id, balance in baselines.items():
+            balances[user_id] = balances.get(user_id, 0) + balance
+        return balances
 
 
 class UserBalance(models.Model):
     """User balance model"""
+    MANUAL = 1
+    CHECKPOINT = 2
+    SNAPSHOT = 3
+
+    RECORD_TYPE_CHOICES = (
+        (MANUAL, 'Manual'),
+        (CHECKPOINT, 'Checkpoint'),
+        (SNAPSHOT, 'Snapshot'),
+    )
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.RESTRICT,
         related_name='balance_records',
+        db_index=False,
         verbose_name=_('user')
     )
     balance = models.BigIntegerField(verbose_name=_('balance'))
+    record_type = models.PositiveSmallIntegerField(
+        choices=RECORD_TYPE_CHOICES,
+        default=MANUAL,
+        verbose_name=_('record type')
+    )
     created_time = models.DateTimeField(
         auto_now_add=True,
         verbose_name=_('created time')
     )
 
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('user', 'created_time', 'id'),
+                name='userbalance_user_time_idx'
+            ),
+            models.Index(
+                fields=('user', 'created_time'),
+                name='userbalance_checkpoint_idx',
+                condition=Q(record_type=2)
+            ),
+        )
+
     def __str__(self):
         return str(self.balance)
 
+    @classmethod
+    def get_latest_checkpoint(cls, user):
+        """Retrieve the latest checkpoint for current user"""
+        return cls.objects.filter(
+            user=user,
+            record_type=cls.CHECKPOINT
+        ).order_by('-created_time').first()
+
+    @classmethod
+    def get_first_checkpoints(cls, user_ids, since):
+        """Return the balance of the first checkpoint recorded since a
+        time of every given user having one, by user id"""
+        checkpoints = cls.objects.filter(
+            user_id__in=user_ids,
+            record_type=cls.CHECKPOINT,
+            created_time__gte=since
+        ).order_by('user_id', 'created_time', 'id')
+        if connection.features.can_distinct_on_fields:
+            return dict(
+                checkpoints.distinct('user_id').values_list(
+                    'user_id', 'balance'
+                )
+            )
+        first = {}
+        for user_id, balance in checkpoints.values_list('user_id', 'balance'):
+            first.setdefault(user_id, balance)
+        return first
+
+    @classmethod
+    def get_balance_series(cls, user, interval, start, end):
+        """Return the opening balance of the user at start and the
+        (bucket start, balance) pairs of the interval buckets between
+        start and end that hold a record. The balance of a bucket is
+        its last record plus the transactions made after it in the
+        bucket, records being sparse.
+
+        Manual records hold balances sent by clients, only checkpoints
+        and snapshots are used."""
+        records = cls.objects.filter(user=user).exclude(
+            record_type=cls.MANUAL
+        )
+        opening = records.filter(created_time__lt=start).order_by(
+            '-created_time', '-id'
+        ).values_list('created_time', 'balance').first()
+        if opening is not None:
+            opening_time, opening = opening
+            opening += Transaction.objects.filter(
+                user=user,
+                created_time__gt=opening_time,
+                created_time__lt=start
+            ).aggregate(
+                balance=Transaction.balance_expression()
+            )['balance']
+        rows = records.filter(
+            created_time__gte=start,
+            created_time__lt=end
+        ).annotate(
+            bucket=Trunc('created_time', interval)
+        ).order_by('bucket', '-created_time', '-id').values_list(
+            'bucket', 'created_time', 'balance'
+        )
+        if connection.features.can_distinct_on_fields:
+            last = list(rows.distinct('bucket'))
+        else:
+            last = {}
+            for bucket, created_time, balance in rows:
+                last.setdefault(bucket, (bucket, created_time, balance))
+            last = list(last.values())
+        if not last:
+            return opening, []
+        after_records = Q()
+        for bucket, created_time, balance in last:
+            after_records |= Q(bucket=bucket, created_time__gt=created_time)
+        deltas = dict(
+            Transaction.objects.filter(
+                user=user,
+                created_time__lt=end
+            ).annotate(
+                bucket=Trunc('created_time', interval)
+            ).filter(after_records).order_by().values('bucket').annotate(
+                delta=Transaction.balance_expression()
+            ).values_list('bucket', 'delta')
+        )
+        series = [
+            (bucket, balance + deltas.get(bucket, 0))
+            for bucket, created_time, balance in last
+        ]
+        return opening, series
+
+    @classmethod
+    def record_checkpoints(cls, wallets, counts=None, force=False):
+        """Record a checkpoint for every wallet which passed a multiple
+        of WALLET_CHECKPOINT_INTERVAL writes. Must be called with the
+        wallets locked, after the transactions they include are saved."""
+        interval = settings.WALLET_CHECKPOINT_INTERVAL
+        checkpoints = []
+        for wallet in wallets:
+            count = counts[wallet.user_id] if counts else 1
+            due = wallet.version // interval > (
+                wallet.version - count
+            ) // interval
+            if force or due:
+                checkpoints.append(cls(
+                    user_id=wallet.user_id,
+                    balance=wallet.balance,
+                    record_type=cls.CHECKPOINT,
+                ))
+        return cls.objects.bulk_create(checkpoints)
+
     @classmethod
     def record_user_balance(cls, user):
         """Record balance for current user"""
-        balance = Transaction.get_user_balance(user)
-        instance = cls.objects.create(user=user, balance=balance)
-        return instance
+        with transaction.atomic():
+            wallet = Wallet.lock([user.pk])[user.pk]
+            return cls.objects.create(
+                user_id=user.pk,
+                balance=wallet.balance,
+                record_type=cls.CHECKPOINT
+            )
 
     @classmethod
     def record_all_user_balance(cls):
         """Record balance for all users"""
-        for user in get_user_model().objects.all():
-            return cls.record_user_balance(user)
+        return sum(created for _, created in cls.snapshot_balances())
+
+    @classmethod
+    def snapshot_balances(cls, since=None, chunk_size=10000, after_user=0):
+        """Record a snapshot of every user balance, computed with one
+        GROUP BY and one multi-row INSERT per chunk of users, see
+        Transaction.get_ledger_balances. With since, only users with
+        transactions made since then are recorded.
+        Yields the last user id and the snapshot count of every chunk.
+
+        Snapshots are not taken under the wallet locks, so they are kept
+        for history and reports and never used as checkpoints."""
+        user_ids = get_user_model().objects.order_by('id').values_list(
+            'id', flat=True
+        )
+        while True:
+            chunk = list(user_ids.filter(id__gt=after_user)[:chunk_size])
+            if not chunk:
+                return
+            users = chunk
+            if since is not None:
+                users = Transaction.objects.filter(
+                    user_id__gte=chunk[0],
+                    user_id__lte=chunk[-1],
+                    created_time__gte=since
+                ).values('user_id')
+            rows = Transaction.get_ledger_balances(users).items()
+            snapshots = cls.objects.bulk_create(
+                [
+                    cls(
+                        user_id=user_id,
+                        balance=balance,
+                        record_type=cls.SNAPSHOT
+                    )
+                    for user_id, balance in rows
+                ],
+                batch_size=settings.WALLET_BULK_BATCH_SIZE
+            )
+            after_user = chunk[-1]
+            yield after_user, len(snapshots)
 
 
 class TransferTransaction(models.Model):
@@ -120,12 +492,14 @@ class TransferTransaction(models.Model):
         Transaction,
         on_delete=models.RESTRICT,
         related_name='sent_transfers',
+        db_constraint=False,
         verbose_name=_('sender transaction')
     )
     receiver_transaction = models.OneToOneField(
         Transaction,
         on_delete=models.RESTRICT,
         related_name='received_transfers',
+        db_constraint=False,
         verbose_name=_('receiver transaction')
     )
     created_time = models.DateTimeField(
@@ -133,29 +507,516 @@ class TransferTransaction(models.Model):
         verbose_name=_('created time')
     )
 
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('created_time', 'id'),
+                name='transfer_time_idx'
+            ),
+        )
+
     def __str__(self):
         return f'{self.sender_transaction} - {self.receiver_transaction}'
 
     @classmethod
     def transfer(cls, sender, receiver, amount):
         """Transfer amount between two users"""
-        if Transaction.get_user_balance(sender) < amount:
-            return 'Transaction not allowed, insufficient balance!'
+        return cls._make_transfers(sender.pk, [(receiver.pk, amount)])[0]
 
-        with transaction.atomic():
-            sender_transaction = Transaction.objects.create(
-                user=sender,
-                amount=amount,
-                transaction_type=Transaction.TRANSFER_SENT,
+    @classmethod
+    def batch_transfer(cls, sender, payouts):
+        """Transfer amounts from one user to many receivers in a single
+        database transaction. payouts is a list of
+        (receiver id, amount) pairs."""
+        if not payouts:
+            raise TransferError('At least one transfer is required!')
+        receiver_ids = {receiver_id for receiver_id, _ in payouts}
+        found = get_user_model().objects.filter(
+            id__in=receiver_ids
+        ).count()
+        if found != len(receiver_ids):
+            raise TransferError('Receiver does not exist!')
+        return cls._make_transfers(sender.pk, payouts)
+
+    @classmethod
+    def _make_transfers(cls, sender_id, payouts):
+        """Lock all participants, check the sender funds once and write
+        every leg and link with multi-row inserts"""
+        total = 0
+        for receiver_id, amount in payouts:
+            if amount <= 0:
+                raise TransferError('Transfer amount must be positive!')
+            if receiver_id == sender_id:
+                raise TransferError(
+                    'Transfer to the same user is not allowed!'
+                )
+            total += amount
+
+        def _transfer():
+            with transaction.atomic():
+                wallets = Wallet.lock(
+                    [sender_id] + [pk for pk, _ in payouts]
+                )
+                if wallets[sender_id].balance < total:
+                    raise InsufficientBalance(
+                        'Transaction not allowed, insufficient balance!'
+                    )
+                legs = []
+                for receiver_id, amount in payouts:
+                    legs.append(Transaction(
+                        user_id=sender_id,
+                        amount=amount,
+                        transaction_type=Transaction.TRANSFER_SENT,
+                    ))
+                    legs.append(Transaction(
+                        user_id=receiver_id,
+                        amount=amount,
+                        transaction_type=Transaction.TRANSFER_RECEIVED,
+                    ))
+                legs = Transaction.bulk_record(
+                    legs,
+                    wallets=wallets,
+                    batch_size=settings.WALLET_BULK_BATCH_SIZE
+                )
+                return cls.objects.bulk_create(
+                    [
+                        cls(
+                            sender_transaction=legs[index],
+                            receiver_transaction=legs[index + 1]
+                        )
+                        for index in range(0, len(legs), 2)
+                    ],
+                    batch_size=settings.WALLET_BULK_BATCH_SIZE
+                )
+
+        return run_with_retry(_transfer)
+
+
+class Wallet(models.Model):
+    """Materialized user balance, updated with every ledger write"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.RESTRICT,
+        related_name='wallet',
+        verbose_name=_('user')
+    )
+    balance = models.BigIntegerField(default=0, verbose_name=_('balance'))
+    version = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name=_('version')
+    )
+    updated_time = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_('updated time')
+    )
+
+    totals_cache_key = 'wallet:report:totals'
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('balance', 'user'),
+                name='wallet_balance_idx'
+            ),
+        )
+
+    def __str__(self):
+        return str(self.balance)
+
+    @classmethod
+    def get_totals(cls):
+        """Return the number of wallets, the sum of their balances and
+        the number of transactions, cached for
+        WALLET_REPORT_TOTALS_TIMEOUT seconds"""
+        cache = caches[settings.WALLET_BALANCE_CACHE]
+        totals = cache.get(cls.totals_cache_key)
+        if totals is None:
+            totals = cls.objects.aggregate(
+                users=Count('id'),
+                balance=Coalesce(Sum('balance'), 0)
             )
-            receiver_transaction = Transaction.objects.create(
-                user=receiver,
-                amount=amount,
-                transaction_type=Transaction.TRANSFER_RECEIVED,
+            totals.update(DailyRollup.objects.aggregate(
+                transactions=Coalesce(Sum('count'), 0)
+            ))
+            cache.set(
+                cls.totals_cache_key, totals,
+                settings.WALLET_REPORT_TOTALS_TIMEOUT
             )
+        return totals
+
+    @classmethod
+    def get_balance(cls, user):
+        """Retrieve materialized balance for current user,
+        None if the user has no wallet"""
+        return cls.objects.filter(user=user).values_list(
+            'balance', flat=True
+        ).first()
+
+    @classmethod
+    def get_versioned_balance(cls, user):
+        """Retrieve the version and materialized balance of the wallet
+        of current user, None if the user has no wallet"""
+        return cls.objects.filter(user=user).values_list(
+            'version', 'balance'
+        ).first()
 
-            instance = cls.objects.create(
-                sender_transaction=sender_transaction,
-                receiver_transaction=receiver_transaction
+    @classmethod
+    def lock(cls, user_ids):
+        """Lock wallets of the given users in user id order,
+        creating the missing ones"""
+        user_ids = sorted(set(user_ids))
+        queryset = cls.objects.select_for_update().filter(
+            user_id__in=user_ids
+        ).order_by('user_id')
+        wallets = {wallet.user_id: wallet for wallet in queryset}
+        missing = [pk for pk in user_ids if pk not in wallets]
+        if missing:
+            cls.objects.bulk_create(
+                [cls(user_id=pk) for pk in missing],
+                ignore_conflicts=True
             )
-        return instance
+            wallets = {wallet.user_id: wallet for wallet in queryset.all()}
+        return wallets
+
+    @classmethod
+    def apply_deltas(cls, deltas, counts=None, wallets=None):
+        """Add balance deltas to the wallets of the given users.
+        Must be called inside a database transaction."""
+        if wallets is None:
+            wallets = cls.lock(deltas)
+        now = timezone.now()
+        for user_id, delta in deltas.items():
+            wallet = wallets[user_id]
+            wallet.balance += delta
+            wallet.version += counts[user_id] if counts else 1
+            wallet.updated_time = now
+        updated = [wallets[user_id] for user_id in deltas]
+        cls.objects.bulk_update(
+            updated, ['balance', 'version', 'updated_time']
+        )
+        balance_cache.update(updated)
+        return wallets
+
+    @classmethod
+    def rebuild(cls, chunk_size=1000, checkpoint=False, users=None):
+        """Recompute the wallets of all users, or of a queryset of
+        users, from the ledger, see Transaction.get_ledger_balances,
+        recording a balance checkpoint of every wallet if checkpoint is
+        set"""
+        if users is None:
+            users = get_user_model().objects.all()
+        user_ids = users.order_by('id').values_list('id', flat=True)
+        rebuilt = 0
+        last_id = 0
+        while True:
+            chunk = list(user_ids.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                return rebuilt
+            with transaction.atomic():
+                wallets = cls.lock(chunk)
+                balances = Transaction.get_ledger_balances(chunk)
+                now = timezone.now()
+                for user_id, wallet in wallets.items():
+                    wallet.balance = balances.get(user_id, 0)
+                    wallet.version += 1
+                    wallet.updated_time = now
+                cls.objects.bulk_update(
+                    wallets.values(), ['balance', 'version', 'updated_time']
+                )
+                balance_cache.update(wallets.values())
+                if checkpoint:
+                    UserBalance.record_checkpoints(
+                        wallets.values(), force=True
+                    )
+            rebuilt += len(chunk)
+            last_id = chunk[-1]
+
+
+class DailyRollup(models.Model):
+    """Number and sum of the transactions of a user, day and type.
+    Kept in step by every ledger write under the wallet lock of the
+    user, or recomputed from the ledger by rebuild."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.RESTRICT,
+        related_name='daily_rollups',
+        db_index=False,
+        verbose_name=_('user')
+    )
+    day = models.DateField(verbose_name=_('day'))
+    transaction_type = models.PositiveSmallIntegerField(
+        choices=Transaction.TRANSACTION_TYPE_CHOICES,
+        verbose_name=_('transaction type')
+    )
+    count = models.BigIntegerField(default=0, verbose_name=_('count'))
+    total = models.BigIntegerField(default=0, verbose_name=_('total'))
+
+    class Meta:
+        # The unique index also serves the user foreign key
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'day', 'transaction_type'),
+                name='rollup_user_day_type_uniq'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} - {self.day}'
+
+    @classmethod
+    def day_of(cls, value):
+        """Return the day of a datetime in the default timezone"""
+        return timezone.localtime(
+            value, timezone.get_default_timezone()
+        ).date()
+
+    @classmethod
+    def balance_expression(cls, prefix=''):
+        """Aggregate expression computing a balance from rollups"""
+        credits = Sum(
+            f'{prefix}total',
+            filter=Q(**{
+                f'{prefix}transaction_type__in': Transaction.CREDIT_TYPES
+            })
+        )
+        debits = Sum(
+            f'{prefix}total',
+            filter=Q(**{
+                f'{prefix}transaction_type__in': Transaction.DEBIT_TYPES
+            })
+        )
+        return Coalesce(credits, 0) - Coalesce(debits, 0)
+
+    @classmethod
+    def add(cls, transactions, sign=1):
+        """Add saved transactions to their rollups, or take them out
+        with a negative sign. Must be called with the wallets of their
+        users locked."""
+        changes = defaultdict(lambda: [0, 0])
+        for instance in transactions:
+            change = changes[(
+                instance.user_id,
+                cls.day_of(instance.created_time),
+                instance.transaction_type,
+            )]
+            change[0] += sign
+            change[1] += sign * instance.amount
+        rows = [
+            (user_id, connection.ops.adapt_datefield_value(day),
+             transaction_type, count, total)
+            for (user_id, day, transaction_type), (count, total)
+            in sorted(changes.items())
+        ]
+        quote = connection.ops.quote_name
+        table = quote(cls._meta.db_table)
+        columns = ', '.join(quote(column) for column in (
+            'user_id', 'day', 'transaction_type', 'count', 'total'
+        ))
+        batch_size = settings.WALLET_BULK_BATCH_SIZE
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(batch))
+                cursor.execute(
+                    f'INSERT INTO {table} ({columns}) VALUES {values} '
+                    f'ON CONFLICT (user_id, day, transaction_type) '
+                    f'DO UPDATE SET count = {table}.count + EXCLUDED.count, '
+                    f'total = {table}.total + EXCLUDED.total',
+                    [value for row in batch for value in row]
+                )
+
+    @classmethod
+    def get_transaction_counts(cls, user_ids):
+        """Return the number of transactions of the given users"""
+        return dict(
+            cls.objects.filter(user_id__in=user_ids).values(
+                'user_id'
+            ).annotate(
+                transactions=Sum('count')
+            ).values_list('user_id', 'transactions').order_by()
+        )
+
+    @classmethod
+    def start_of(cls, day):
+        """Return the first instant of a day in the default timezone"""
+        return timezone.make_aware(
+            datetime.combine(day, datetime.min.time()),
+            timezone.get_default_timezone()
+        )
+
+    @classmethod
+    def rebuild(cls, chunk_size=1000, since=None, users=None):
+        """Recompute the rollups of all users, or of a queryset of
+        users, from the ledger, only the days from since on if it is
+        given. Return the number of users.
+
+        Days before the first whole day of the attached partitions are
+        never recomputed, their transactions may be detached."""
+        start = Transaction.get_ledger_start()
+        if start is not None:
+            first_day = cls.day_of(start)
+            if cls.start_of(first_day) < start:
+                first_day += timedelta(days=1)
+            if since is None or since < first_day:
+                since = first_day
+        if users is None:
+            users = get_user_model().objects.all()
+        user_ids = users.order_by('id').values_list('id', flat=True)
+        rebuilt = 0
+        last_id = 0
+        while True:
+            chunk = list(user_ids.filter(id__gt=last_id)[:chunk_size])
+            if not chunk:
+                return rebuilt
+            rollups = cls.objects.filter(user_id__in=chunk)
+            transactions = Transaction.objects.filter(user_id__in=chunk)
+            if since is not None:
+                rollups = rollups.filter(day__gte=since)
+                transactions = transactions.filter(
+                    created_time__gte=cls.start_of(since)
+                )
+            rows = transactions.annotate(
+                day=TruncDate(
+                    'created_time', tzinfo=timezone.get_default_timezone()
+                )
+            ).values('user_id', 'day', 'transaction_type').annotate(
+                rows=Count('id'),
+                amount_total=Sum('amount')
+            ).order_by()
+            with transaction.atomic():
+                Wallet.lock(chunk)
+                rollups.delete()
+                cls.objects.bulk_create(
+                    [
+                        cls(
+                            user_id=row['user_id'],
+                            day=row['day'],
+                            transaction_type=row['transaction_type'],
+                            count=row['rows'],
+                            total=row['amount_total'],
+                        )
+                        for row in rows
+                    ],
+                    batch_size=settings.WALLET_BULK_BATCH_SIZE
+                )
+            rebuilt += len(chunk)
+            last_id = chunk[-1]
+
+
+class IdempotencyKey(models.Model):
+    """Response of a write request stored under its Idempotency-Key,
+    replayed when the request is retried"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys',
+        db_index=False,
+        verbose_name=_('user')
+    )
+    key = models.CharField(max_length=255, verbose_name=_('key'))
+    fingerprint = models.CharField(
+        max_length=64,
+        verbose_name=_('fingerprint')
+    )
+    status_code = models.PositiveSmallIntegerField(
+        null=True,
+        verbose_name=_('status code')
+    )
+    response = models.JSONField(
+        null=True,
+        encoder=DjangoJSONEncoder,
+        verbose_name=_('response')
+    )
+    expires_time = models.DateTimeField(verbose_name=_('expires time'))
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'key'),
+                name='idempotency_user_key_uniq'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('expires_time',),
+                name='idempotency_expires_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} - {self.key}'
+
+    @classmethod
+    def claim(cls, user, key, fingerprint):
+        """Return the record of a key and whether the request should be
+        handled. A handled key is held in a pending state, without a
+        status code, until its response is stored or it is released.
+        Runs on its own, outside the transaction of the request: a retry
+        racing with it finds the pending record."""
+        now = timezone.now()
+        expires_time = now + timedelta(
+            seconds=settings.WALLET_IDEMPOTENCY_PENDING_TIMEOUT
+        )
+        record, created = cls.objects.get_or_create(
+            user=user,
+            key=key,
+            defaults={
+                'fingerprint': fingerprint,
+                'expires_time': expires_time,
+            },
+        )
+        if created:
+            return record, True
+        if record.expires_time > now:
+            return record, False
+        # Only one of the requests racing for an expired key takes it
+        claimed = cls.objects.filter(
+            pk=record.pk,
+            expires_time=record.expires_time
+        ).update(
+            fingerprint=fingerprint,
+            status_code=None,
+            response=None,
+            expires_time=expires_time
+        )
+        if not claimed:
+            return cls.claim(user, key, fingerprint)
+        record.fingerprint = fingerprint
+        record.status_code = None
+        record.response = None
+        record.expires_time = expires_time
+        return record, True
+
+    @property
+    def is_pending(self):
+        return self.status_code is None
+
+    def store(self, status_code, response):
+        """Store the response of the handled request, replayed for
+        WALLET_IDEMPOTENCY_KEY_TTL seconds"""
+        self.status_code = status_code
+        self.response = response
+        self.expires_time = timezone.now() + timedelta(
+            seconds=settings.WALLET_IDEMPOTENCY_KEY_TTL
+        )
+        self.save()
+
+    def release(self):
+        """Delete the pending record of a request which was not
+        handled, so it can be retried"""
+        type(self).objects.filter(
+            pk=self.pk,
+            expires_time=self.expires_time
+        ).delete()
+
+    @classmethod
+    def purge(cls, chunk_size=10000):
+        """Delete expired keys a chunk at a time, return their number"""
+        purged = 0
+        while True:
+            chunk = list(cls.objects.filter(
+                expires_time__lte=timezone.now()
+            ).values_list('id', flat=True)[:chunk_size])
+            if not chunk:
+                return purged
+            purged += cls.objects.filter(id__in=chunk).delete()[0]
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import DateTimeField
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import Cursor, CursorPagination
+from core.db import RowComparison
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class KeysetCursorPagination(CursorPagination):
+    """Cursor pagination over an ordering whose last field is unique,
+    all fields sorted the same way.
+
+    The cursor holds the ordering values of the row a page starts
+    after, and the page is read with one row comparison matching the
+    composite index of the ordering, so it is an index range scan
+    however many rows share the first field. DRF cursors hold the first
+    field and an offset into the rows sharing it instead."""
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        ordering = self.get_ordering(request, queryset, view)
+        self.fields = [name.lstrip('-') for name in ordering]
+        self.model = queryset.model
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor.reverse
+        # Walking towards smaller keys on descending pages, or on
+        # previous pages of ascending ones
+        backwards = ordering[0].startswith('-') != reverse
+        queryset = queryset.order_by(*(
+            f'-{name}' if backwards else name for name in self.fields
+        ))
+        if cursor is not None:
+            queryset = queryset.filter(RowComparison(
+                self.fields, '<' if backwards else '>',
+                self.decode_position(cursor.position)
+            ))
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        return self.page
+
+    def encode_position(self, row):
+        """Return the position of a row, its ordering values as integers"""
+        values = []
+        for name in self.fields:
+            value = row[name] if isinstance(row, dict) else getattr(row, name)
+            if isinstance(value, datetime):
+                value = (value - EPOCH) // MICROSECOND
+            values.append(str(value))
+        return ':'.join(values)
+
+    def decode_position(self, position):
+        try:
+            values = [int(value) for value in position.split(':')]
+        except (AttributeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if len(values) != len(self.fields):
+            raise NotFound(self.invalid_cursor_message)
+        return [
+            EPOCH + value * MICROSECOND
+            if isinstance(self.model._meta.get_field(name), DateTimeField)
+            else value
+            for name, value in zip(self.fields, values)
+        ]
+
+    def get_next_link(self):
+        if not (self.has_next and self.page):
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False,
+            position=self.encode_position(self.page[-1])
+        ))
+
+    def get_previous_link(self):
+        if not (self.has_previous and self.page):
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=True,
+            position=self.encode_position(self.page[0])
+        ))
+
+
+class TimelineCursorPagination(KeysetCursorPagination):
+    """Keyset pagination over (created_time, id), newest first.
+    No count is run."""
+    ordering = ('-created_time', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class BalanceCursorPagination(KeysetCursorPagination):
+    """Keyset pagination of wallet rows over (balance, user id), largest
+    balances first unless ordering=balance."""
+    ordering_query_param = 'ordering'
+    orderings = {
+        '-balance': ('-balance', '-user_id'),
+        'balance': ('balance', 'user_id'),
+    }
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get(
+            self.ordering_query_param, '-balance'
+        )
+        if ordering not in self.orderings:
+            raise ValidationError({
+                self.ordering_query_param: [
+                    f'Must be one of {", ".join(self.orderings)}.'
+                ]
+            })
+        return self.orderings[ordering]
@@ -0,0 +1,31 @@
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """Parse newline delimited JSON into a list of objects"""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Return one item per non-blank line of the stream, at most
+        WALLET_BULK_MAX_ITEMS. Parsing stops at the first item over it."""
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        max_items = settings.WALLET_BULK_MAX_ITEMS
+        items = []
+        for number, line in enumerate(stream, start=1):
+            line = line.decode(encoding).strip()
+            if not line:
+                continue
+            if len(items) == max_items:
+                raise ParseError(f'At most {max_items} items are allowed.')
+            try:
+                items.append(json.loads(line))
+            except ValueError as exc:
+                raise ParseError(
+                    f'NDJSON parse error on line {number} - {exc}'
+                )
+        return items
@@ -0,0 +1,212 @@
+"""
+Monthly range partitions of the transaction table on PostgreSQL.
+"""
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from wallet.models import Transaction, TransferTransaction, UserBalance
+
+
+PARTITION_NAME_RE = re.compile(r'_p(\d{4})_(\d{2})$')
+
+
+def parent_table():
+    return Transaction._meta.db_table
+
+
+def month_start(value):
+    """Return the first instant of the UTC month of a datetime"""
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def next_month(month):
+    if month.month == 12:
+        return month.replace(year=month.year + 1, month=1)
+    return month.replace(month=month.month + 1)
+
+
+def partition_name(month):
+    return f'{parent_table()}_p{month.year:04d}_{month.month:02d}'
+
+
+def default_partition_name():
+    return f'{parent_table()}_default'
+
+
+def is_partitioned():
+    """Return whether the transaction table is partitioned"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table '
+            'WHERE partrelid = to_regclass(%s)',
+            [parent_table()]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """Return the monthly partitions as a sorted list of
+    (name, month start) pairs"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s)',
+            [parent_table()]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        match = PARTITION_NAME_RE.search(name)
+        if match:
+            month = datetime(
+                int(match[1]), int(match[2]), 1, tzinfo=dt_timezone.utc
+            )
+            partitions.append((name, month))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def default_rows_before(moment):
+    """Return whether the default partition holds transactions made
+    before a time"""
+    default = connection.ops.quote_name(default_partition_name())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {default} '
+            f'WHERE created_time < %s)',
+            [moment]
+        )
+        return cursor.fetchone()[0]
+
+
+def ledger_start():
+    """Return the start of the oldest month partition when no older
+    transaction is left in the default partition, the transactions of
+    earlier months may be detached. None if the table is not
+    partitioned or older transactions are attached."""
+    if not is_partitioned():
+        return None
+    attached = list_partitions()
+    if not attached or default_rows_before(attached[0][1]):
+        return None
+    return attached[0][1]
+
+
+def create_partition(month):
+    """Create the partition of a month, moving its rows out of the
+    default partition. Return False if it already exists."""
+    if partition_name(month) in dict(list_partitions()):
+        return False
+    with transaction.atomic():
+        create_detached_partition(month)
+        attach_partition(month)
+    return True
+
+
+def create_detached_partition(month):
+    """Create the table of a month partition without attaching it.
+    Rows loaded before attaching skip index and foreign key upkeep,
+    both are then built in bulk."""
+    parent = connection.ops.quote_name(parent_table())
+    name = partition_name(month)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TABLE {connection.ops.quote_name(name)} '
+            f'(LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        )
+    return name
+
+
+def attach_partition(month):
+    """Attach the table of a month partition, moving the rows of the
+    month out of the default partition first"""
+    parent = connection.ops.quote_name(parent_table())
+    quoted = connection.ops.quote_name(partition_name(month))
+    default = connection.ops.quote_name(default_partition_name())
+    bounds = [month, next_month(month)]
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Attaching a month still holding rows in the default partition
+        # fails, so they are moved before.
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {default} '
+            f'WHERE created_time >= %s AND created_time < %s RETURNING *) '
+            f'INSERT INTO {quoted} SELECT * FROM moved',
+            bounds
+        )
+        cursor.execute(
+            f'ALTER TABLE {parent} ATTACH PARTITION {quoted} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            bounds
+        )
+
+
+def create_partitions(ahead=3, now=None):
+    """Create the partitions of the current month and of the months
+    ahead, return the names of the created ones"""
+    month = month_start(now or datetime.now(dt_timezone.utc))
+    created = []
+    for _ in range(ahead + 1):
+        if create_partition(month):
+            created.append(partition_name(month))
+        month = next_month(month)
+    return created
+
+
+def uncovered_users(name, month, limit=10):
+    """Return users with transactions in a partition and no balance
+    checkpoint recorded after it, their balance still needs it"""
+    quoted = connection.ops.quote_name(name)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT DISTINCT t.user_id FROM {quoted} t '
+            f'WHERE NOT EXISTS ('
+            f'SELECT 1 FROM {UserBalance._meta.db_table} b '
+            f'WHERE b.user_id = t.user_id AND b.record_type = %s '
+            f'AND b.created_time >= %s'
+            f') ORDER BY t.user_id LIMIT %s',
+            [UserBalance.CHECKPOINT, next_month(month), limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def archive_table_name(name):
+    return f'{name}_transfers'
+
+
+def detach_partition(name, drop=False):
+    """Detach a partition, keeping it as an archive table unless
+    drop is set. Transfers with a leg in the partition are moved to an
+    archive table next to it, or deleted with it."""
+    parent = connection.ops.quote_name(parent_table())
+    quoted = connection.ops.quote_name(name)
+    transfers = connection.ops.quote_name(
+        TransferTransaction._meta.db_table
+    )
+    archive = connection.ops.quote_name(archive_table_name(name))
+    # Transfer legs have no foreign key constraint, so their rows are
+    # taken out of the ledger by hand.
+    moved = (
+        f'DELETE FROM {transfers} t USING {quoted} p '
+        f'WHERE p.id IN (t.sender_transaction_id, t.receiver_transaction_id) '
+        f'RETURNING t.*'
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        if drop:
+            cursor.execute(moved)
+        else:
+            cursor.execute(
+                f'CREATE TABLE {archive} '
+                f'(LIKE {transfers} INCLUDING DEFAULTS)'
+            )
+            cursor.execute(
+                f'WITH moved AS ({moved}) '
+                f'INSERT INTO {archive} SELECT * FROM moved'
+            )
+        cursor.execute(f'ALTER TABLE {parent} DETACH PARTITION {quoted}')
+        if drop:
+            cursor.execute(f'DROP TABLE {quoted}')
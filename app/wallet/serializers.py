@@ -1,27 +1,99 @@
-from rest_framework import serializers
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 from wallet.models import (
     Transaction, UserBalance, TransferTransaction
 )
 
 
+class TransactionListSerializer(serializers.ListSerializer):
+    """Serializer creating many transactions with bulk inserts"""
+
+    def create(self, validated_data):
+        """Create all transactions in one database transaction"""
+        transactions = [Transaction(**attrs) for attrs in validated_data]
+        with transaction.atomic():
+            return Transaction.bulk_record(
+                transactions,
+                batch_size=settings.WALLET_BULK_BATCH_SIZE
+            )
+
+
 class TransactionSerializer(serializers.ModelSerializer):
     """Serializer for transaction object"""
 
     class Meta:
         model = Transaction
+        list_serializer_class = TransactionListSerializer
         fields = (
             'id', 'user', 'transaction_type', 'amount', 'created_time'
         )
         read_only_fields = ('id',)
 
 
+class TransactionExportSerializer(serializers.Serializer):
+    """Serializer for transaction export query parameters"""
+    export_format = serializers.ChoiceField(
+        choices=('csv', 'ndjson'),
+        default='csv'
+    )
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    transaction_type = serializers.ChoiceField(
+        choices=Transaction.TRANSACTION_TYPE_CHOICES,
+        required=False
+    )
+
+
 class UserBalanceSerializer(serializers.ModelSerializer):
     """Serializer for user balance object"""
 
     class Meta:
         model = UserBalance
-        fields = ('id', 'user', 'balance', 'created_time')
-        read_only_fields = ('id',)
+        fields = ('id', 'user', 'balance', 'record_type', 'created_time')
+        read_only_fields = ('id', 'record_type')
+
+
+class BalanceSeriesSerializer(serializers.Serializer):
+    """Serializer for balance series query parameters"""
+    DEFAULT_SPANS = {
+        'hour': timedelta(days=2),
+        'day': timedelta(days=90),
+        'month': timedelta(days=730),
+    }
+    BUCKET_LENGTHS = {
+        'hour': timedelta(hours=1),
+        'day': timedelta(days=1),
+        'month': timedelta(days=28),
+    }
+
+    interval = serializers.ChoiceField(
+        choices=('hour', 'day', 'month'),
+        default='day'
+    )
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        """Default the range and bound its number of buckets"""
+        end = attrs.setdefault('end', timezone.now())
+        start = attrs.setdefault(
+            'start', end - self.DEFAULT_SPANS[attrs['interval']]
+        )
+        if start >= end:
+            raise serializers.ValidationError('start must be before end.')
+        max_buckets = settings.WALLET_BALANCE_SERIES_MAX_BUCKETS
+        buckets = (end - start) / self.BUCKET_LENGTHS[attrs['interval']]
+        if buckets > max_buckets:
+            raise serializers.ValidationError(
+                f'At most {max_buckets} buckets are allowed, use a '
+                f'shorter range or a longer interval.'
+            )
+        return attrs
 
 
 class TransferTransactionSerializer(serializers.ModelSerializer):
@@ -41,3 +113,116 @@ class TransferTransactionDetailSerializer(TransferTransactionSerializer):
     """Serialize a transfer transaction"""
     sender_transaction = TransactionSerializer(many=False, read_only=True)
     receiver_transaction = TransactionSerializer(many=False, read_only=True)
+
+
+class PayoutSerializer(serializers.Serializer):
+    """Serializer for a single payout of a batch transfer"""
+    receiver = serializers.IntegerField()
+    amount = serializers.IntegerField(min_value=1)
+
+
+class BatchTransferSerializer(serializers.Serializer):
+    """Serializer for a batch transfer from the authenticated user"""
+    transfers = PayoutSerializer(many=True, allow_empty=False)
+
+    def validate_transfers(self, value):
+        """Validate the number of payouts in the batch"""
+        max_items = settings.WALLET_BULK_MAX_ITEMS
+        if len(value) > max_items:
+            raise serializers.ValidationError(
+                f'At most {max_items} transfers are allowed.'
+            )
+        return value
+
+
+class ValuesSerializer:
+    """Read only serializer of values() rows.
+
+    The fields of a serializer are compiled once into a plan of
+    (name, lookup, converter) entries, nested serializers becoming
+    related lookups with a plan of their own. Rows are then serialized
+    without model instances or the field machinery, fields rendering
+    values as read being left unconverted and ISO 8601 datetimes
+    converted in the timezone looked up once per call."""
+    ISO_DATETIME = 'iso-datetime'
+    unconverted_fields = (
+        serializers.BooleanField,
+        serializers.CharField,
+        serializers.ChoiceField,
+        serializers.IntegerField,
+        serializers.PrimaryKeyRelatedField,
+    )
+    _plans = {}
+
+    def __init__(self, serializer_class):
+        self.plan = self.compile(serializer_class(), '')
+        self.lookups = list(self.get_lookups(self.plan))
+
+    @classmethod
+    def for_serializer(cls, serializer_class):
+        """Return the values serializer compiled for a serializer"""
+        if serializer_class not in cls._plans:
+            cls._plans[serializer_class] = cls(serializer_class)
+        return cls._plans[serializer_class]
+
+    def is_iso_datetime(self, field):
+        if not isinstance(field, serializers.DateTimeField):
+            return False
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        return (
+            settings.USE_TZ and not hasattr(field, 'timezone')
+            and isinstance(output_format, str)
+            and output_format.lower() == ISO_8601
+        )
+
+    def compile(self, serializer, prefix):
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            lookup = prefix + '__'.join(field.source_attrs)
+            if isinstance(field, serializers.BaseSerializer):
+                converter = self.compile(field, lookup + '__')
+            elif isinstance(field, self.unconverted_fields):
+                converter = None
+            elif self.is_iso_datetime(field):
+                converter = self.ISO_DATETIME
+            else:
+                converter = field.to_representation
+            plan.append((name, lookup, converter))
+        return plan
+
+    def get_lookups(self, plan):
+        for name, lookup, converter in plan:
+            if isinstance(converter, list):
+                yield from self.get_lookups(converter)
+            else:
+                yield lookup
+
+    def to_representation(self, row, plan, current_timezone):
+        data = {}
+        for name, lookup, converter in plan:
+            if isinstance(converter, list):
+                data[name] = self.to_representation(
+                    row, converter, current_timezone
+                )
+                continue
+            value = row[lookup]
+            if converter is None or value is None:
+                pass
+            elif converter is self.ISO_DATETIME:
+                value = value.astimezone(current_timezone).isoformat()
+                if value.endswith('+00:00'):
+                    value = value[:-6] + 'Z'
+            else:
+                value = converter(value)
+            data[name] = value
+        return data
+
+    def serialize(self, rows):
+        """Return the representation of values() rows"""
+        current_timezone = timezone.get_current_timezone()
+        return [
+            self.to_representation(row, self.plan, current_timezone)
+            for row in rows
+        ]
@@ -1,4 +1,6 @@
+from django.db import connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from wallet import models
@@ -154,3 +156,40 @@ class TransactionSiteTests(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+    def test_changelist_queries_do_not_grow(self):
+        """Test that list rows are fetched with their related rows"""
+        url = reverse('admin:wallet_transfertransaction_changelist')
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(url)
+        for _ in range(5):
+            models.TransferTransaction.transfer(
+                sender=self.user, receiver=self.admin_user, amount=1
+            )
+
+        with self.assertNumQueries(len(first)):
+            self.client.get(url)
+
+    def test_transaction_date_hierarchy(self):
+        """Test that the date hierarchy drills down to the days"""
+        url = reverse('admin:wallet_transaction_changelist')
+        today = self.transaction.created_time
+
+        res = self.client.get(url, {
+            'created_time__year': today.year,
+            'created_time__month': today.month,
+        })
+
+        self.assertEqual(res.status_code, 200)
+        self.assertContains(res, f'created_time__day={today.day}')
+
+    def test_transaction_search_by_email(self):
+        """Test that transactions are searched by exact user email"""
+        url = reverse('admin:wallet_transaction_changelist')
+
+        res = self.client.get(url, {'q': 'test@email.com'})
+        other = self.client.get(url, {'q': 'test@'})
+
+        self.assertEqual(res.context['cl'].result_count, 3)
+        self.assertEqual(other.context['cl'].result_count, 0)
@@ -0,0 +1,139 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import AsyncClient, Client, TransactionTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from wallet.models import Transaction
+from wallet.serializers import TransactionSerializer
+
+
+ASYNC_BALANCE_URL = reverse('wallet:async-balance')
+ASYNC_TRANSACTION_URL = reverse('wallet:async-transactions')
+
+# Seconds each balance read is held for in the concurrency test
+READ_DELAY = 0.5
+
+
+class AsyncApiTests(TransactionTestCase):
+    """Test the async balance and transaction history views.
+    Reads run on pool threads with their own connections, so the
+    test data has to be committed."""
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['tokens'].clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@email.com',
+            password='testpass',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+    def test_login_required(self):
+        """Test that the async views require authentication"""
+        for url in (ASYNC_BALANCE_URL, ASYNC_TRANSACTION_URL):
+            res = Client().get(url)
+
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_post_not_allowed(self):
+        """Test that the async views are read only"""
+        res = self.client.post(ASYNC_TRANSACTION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_balance(self):
+        """Test retrieving the balance of the user"""
+        Transaction.objects.create(
+            user=self.user,
+            transaction_type=Transaction.CHARGE,
+            amount=150,
+        )
+
+        res = self.client.get(ASYNC_BALANCE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json(), {'user balance': 150})
+
+    def test_transaction_list(self):
+        """Test that the history matches the sync endpoint"""
+        other = get_user_model().objects.create_user(
+            email='other@email.com',
+            password='testpass',
+        )
+        Transaction.objects.create(user=other, amount=5)
+        for amount in range(1, 4):
+            Transaction.objects.create(user=self.user, amount=amount)
+
+        res = self.client.get(ASYNC_TRANSACTION_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        transactions = Transaction.objects.filter(
+            user=self.user
+        ).order_by('-created_time', '-id')
+        self.assertEqual(
+            res.json()['results'],
+            TransactionSerializer(transactions[:2], many=True).data
+        )
+        self.assertIn(ASYNC_TRANSACTION_URL, res.json()['next'])
+        res = self.client.get(res.json()['next'])
+        self.assertEqual(
+            res.json()['results'],
+            TransactionSerializer(transactions[2:], many=True).data
+        )
+
+    def test_concurrent_requests(self):
+        """Test that concurrent requests are served side by side"""
+        Transaction.objects.create(user=self.user, amount=10)
+        client = AsyncClient()
+        # The async client takes headers by their ASGI name
+        auth = {'authorization': f'Token {self.token.key}'}
+
+        async def fetch_all():
+            return await asyncio.gather(*(
+                client.get(ASYNC_BALANCE_URL, **auth) for _ in range(10)
+            ))
+
+        responses = async_to_sync(fetch_all)()
+
+        for res in responses:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.json(), {'user balance': 10})
+
+    def test_concurrent_requests_overlap(self):
+        """Test that slow concurrent reads take about as long as one.
+        The async client goes through the ASGI handler and the full
+        settings.MIDDLEWARE, so sync only middleware queueing the
+        requests on one thread would fail it."""
+        Transaction.objects.create(user=self.user, amount=10)
+        client = AsyncClient()
+        auth = {'authorization': f'Token {self.token.key}'}
+        get_user_balance = Transaction.get_user_balance
+
+        def slow_balance(user):
+            time.sleep(READ_DELAY)
+            return get_user_balance(user)
+
+        async def fetch_all(count):
+            return await asyncio.gather(*(
+                client.get(ASYNC_BALANCE_URL, **auth) for _ in range(count)
+            ))
+
+        # Fewer requests than the threads of the smallest default pool
+        count = 4
+        with patch.object(Transaction, 'get_user_balance', slow_balance):
+            start = time.perf_counter()
+            responses = async_to_sync(fetch_all)(count)
+            elapsed = time.perf_counter() - start
+
+        for res in responses:
+            self.assertEqual(res.json(), {'user balance': 10})
+        self.assertLess(elapsed, 2 * READ_DELAY)
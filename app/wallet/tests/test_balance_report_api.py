@@ -0,0 +1,117 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from wallet.models import Transaction
+
+
+BALANCE_REPORT_URL = reverse('wallet:balance-report')
+
+
+class BalanceReportApiTests(TestCase):
+    """Test the staff balance report API"""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = get_user_model().objects.create_superuser(
+            email='admin@email.com',
+            password='testpass',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.users = []
+        for index, amounts in enumerate([[50], [20, 30], [10], [50], [5]]):
+            user = get_user_model().objects.create_user(
+                email=f'user{index}@email.com',
+                password='testpass',
+            )
+            for amount in amounts:
+                Transaction.objects.create(
+                    user=user,
+                    transaction_type=Transaction.CHARGE,
+                    amount=amount,
+                )
+            self.users.append(user)
+
+    def read_all(self, params):
+        rows = []
+        url = BALANCE_REPORT_URL
+        while url:
+            res = self.client.get(url, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            rows += res.data['results']
+            url, params = res.data['next'], None
+        return rows
+
+    def test_staff_only(self):
+        """Test that other users can not read the report"""
+        self.client.force_authenticate(user=self.users[0])
+
+        res = self.client.get(BALANCE_REPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_pages_sorted_by_balance(self):
+        """Test that pages walk every user once, equal balances included"""
+        rows = self.read_all({'page_size': 2})
+
+        self.assertEqual(
+            [(row['user'], row['balance']) for row in rows],
+            [
+                (self.users[3].id, 50),
+                (self.users[1].id, 50),
+                (self.users[0].id, 50),
+                (self.users[2].id, 10),
+                (self.users[4].id, 5),
+            ]
+        )
+        self.assertEqual(rows[1]['transactions_count'], 2)
+        self.assertEqual(rows[1]['email'], 'user1@email.com')
+
+    def test_previous_page(self):
+        """Test that previous links walk back over equal balances"""
+        first = self.client.get(BALANCE_REPORT_URL, {'page_size': 2})
+        second = self.client.get(first.data['next'])
+
+        res = self.client.get(second.data['previous'])
+
+        self.assertEqual(res.data['results'], first.data['results'])
+        self.assertIsNone(res.data['previous'])
+
+    def test_ascending_order(self):
+        """Test that the smallest balances can come first"""
+        rows = self.read_all({'page_size': 2, 'ordering': 'balance'})
+
+        self.assertEqual(
+            [row['user'] for row in rows],
+            [self.users[index].id for index in (4, 2, 0, 1, 3)]
+        )
+
+    def test_cached_totals(self):
+        """Test that the grand totals are served from the cache"""
+        res = self.client.get(BALANCE_REPORT_URL)
+        Transaction.objects.create(
+            user=self.users[0],
+            transaction_type=Transaction.CHARGE,
+            amount=1000,
+        )
+
+        totals = {'users': 5, 'balance': 165, 'transactions': 6}
+        self.assertEqual(res.data['total'], totals)
+        with self.assertNumQueries(2):
+            res = self.client.get(BALANCE_REPORT_URL)
+        self.assertEqual(res.data['total'], totals)
+
+    def test_invalid_ordering(self):
+        """Test that only balance orderings are accepted"""
+        res = self.client.get(BALANCE_REPORT_URL, {'ordering': 'email'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_cursor(self):
+        """Test that a forged cursor is rejected"""
+        res = self.client.get(BALANCE_REPORT_URL, {'cursor': 'cD14'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,158 @@
+import threading
+import time
+from unittest.mock import Mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from wallet.cache import balance_cache
+from wallet.models import Transaction, TransferTransaction
+
+
+CACHE_STATS_URL = reverse('wallet:balance-cache-stats')
+
+
+class BalanceCacheTests(TestCase):
+    """Test the user balance cache"""
+
+    def setUp(self):
+        cache.clear()
+        balance_cache.reset_stats()
+        self.user = get_user_model().objects.create_user(
+            email='test@email.com',
+            password='testpass',
+        )
+        Transaction.objects.create(
+            user=self.user,
+            transaction_type=Transaction.CHARGE,
+            amount=100,
+        )
+
+    def test_balance_read_through(self):
+        """Test that only the first balance read queries the database"""
+        with self.assertNumQueries(1):
+            Transaction.get_user_balance(self.user)
+        with self.assertNumQueries(0):
+            balance = Transaction.get_user_balance(self.user)
+
+        self.assertEqual(balance, 100)
+        self.assertEqual(
+            balance_cache.stats(), {'hits': 1, 'misses': 1, 'coalesced': 0}
+        )
+
+    def test_transaction_write_updates_balance(self):
+        """Test that transaction writes replace the cached balance"""
+        Transaction.get_user_balance(self.user)
+        Transaction.objects.create(
+            user=self.user,
+            transaction_type=Transaction.PURCHASE,
+            amount=30,
+        )
+
+        self.assertEqual(Transaction.get_user_balance(self.user), 70)
+
+    def test_transfer_updates_balances(self):
+        """Test that transfers replace both cached balances"""
+        user2 = get_user_model().objects.create_user(
+            email='other@email.com',
+            password='testpass',
+        )
+        Transaction.get_user_balance(self.user)
+        Transaction.get_user_balance(user2)
+        TransferTransaction.transfer(
+            sender=self.user, receiver=user2, amount=40
+        )
+
+        self.assertEqual(Transaction.get_user_balance(self.user), 60)
+        self.assertEqual(Transaction.get_user_balance(user2), 40)
+
+    def test_balance_stored_on_commit(self):
+        """Test that the new balance is cached once the write commits"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(
+                user=self.user,
+                transaction_type=Transaction.PURCHASE,
+                amount=30,
+            )
+
+        self.assertEqual(
+            cache.get(balance_cache.make_key(self.user.id)), (2, 70)
+        )
+
+    def test_late_commit_callback_ignored(self):
+        """Test that the balance of a write committed first and stored
+        last does not replace the balance of the later write"""
+        with self.captureOnCommitCallbacks() as first:
+            Transaction.objects.create(
+                user=self.user,
+                transaction_type=Transaction.CHARGE,
+                amount=50,
+            )
+        with self.captureOnCommitCallbacks() as second:
+            Transaction.objects.create(
+                user=self.user,
+                transaction_type=Transaction.CHARGE,
+                amount=20,
+            )
+        for callback in second + first:
+            callback()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(Transaction.get_user_balance(self.user), 170)
+
+    def test_stale_read_not_cached_over_write(self):
+        """Test that a balance read before a write commits is not cached
+        over the balance stored by the write"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            Transaction.objects.create(
+                user=self.user,
+                transaction_type=Transaction.CHARGE,
+                amount=50,
+            )
+        for callback in callbacks:
+            callback()
+
+        balance_cache.get(self.user.id, lambda: (1, 100))
+
+        self.assertEqual(Transaction.get_user_balance(self.user), 150)
+
+    def test_concurrent_misses_coalesced(self):
+        """Test that concurrent misses for a user load it only once"""
+        def load():
+            time.sleep(0.1)
+            return 0, 100
+        loader = Mock(side_effect=load)
+        threads = [
+            threading.Thread(target=balance_cache.get, args=(-1, loader))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(loader.call_count, 1)
+        stats = balance_cache.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'] + stats['coalesced'], 4)
+
+    def test_stats_limited_to_admin(self):
+        """Test that cache counters are only shown to staff users"""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        res = client.get(CACHE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = get_user_model().objects.create_superuser(
+            email='admin@email.com',
+            password='testpass',
+        )
+        client.force_authenticate(user=admin)
+        res = client.get(CACHE_STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(res.data), {'hits', 'misses', 'coalesced'})
@@ -0,0 +1,125 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from wallet.models import Transaction, UserBalance, Wallet
+
+
+class CommandTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@email.com',
+            password='testpass',
+        )
+        self.user2 = get_user_model().objects.create_user(
+            email='other@email.com',
+            password='testpass',
+        )
+
+    def test_rebuild_wallets(self):
+        """Test that wallets are recomputed from the ledger"""
+        Transaction.objects.create(
+            user=self.user,
+            transaction_type=Transaction.CHARGE,
+            amount=100,
+        )
+        Transaction.objects.create(
+            user=self.user,
+            transaction_type=Transaction.PURCHASE,
+            amount=25,
+        )
+        Wallet.objects.filter(user=self.user).update(balance=0)
+
+        call_command('rebuild_wallets', chunk_size=1, stdout=StringIO())
+
+        self.assertEqual(Wallet.objects.get(user=self.user).balance, 75)
+        self.assertEqual(Wallet.objects.get(user=self.user2).balance, 0)
+
+    def test_snapshot_balances(self):
+        """Test that every user with transactions gets a snapshot"""
+        Transaction.objects.create(
+            user=self.user,
+            transaction_type=Transaction.CHARGE,
+            amount=100,
+        )
+        Transaction.objects.create(
+            user=self.user2,
+            transaction_type=Transaction.CHARGE,
+            amount=50,
+        )
+        Transaction.objects.create(
+            user=self.user2,
+            transaction_type=Transaction.PURCHASE,
+            amount=20,
+        )
+
+        call_command('snapshot_balances', chunk_size=1, stdout=StringIO())
+        snapshots = UserBalance.objects.filter(
+            record_type=UserBalance.SNAPSHOT
+        )
+
+        self.assertEqual(
+            dict(snapshots.values_list('user_id', 'balance')),
+            {self.user.id: 100, self.user2.id: 30}
+        )
+
+    def test_snapshot_balances_since(self):
+        """Test that only recently active users are snapshotted"""
+        old = Transaction.objects.create(
+            user=self.user,
+            transaction_type=Transaction.CHARGE,
+            amount=100,
+        )
+        Transaction.objects.filter(pk=old.pk).update(
+            created_time=timezone.now() - timedelta(days=2)
+        )
+        Transaction.objects.create(
+            user=self.user2,
+            transaction_type=Transaction.CHARGE,
+            amount=50,
+        )
+        since = timezone.now() - timedelta(days=1)
+
+        call_command(
+            'snapshot_balances', since=since.isoformat(), stdout=StringIO()
+        )
+        snapshots = UserBalance.objects.filter(
+            record_type=UserBalance.SNAPSHOT
+        )
+
+        self.assertEqual(
+            list(snapshots.values_list('user_id', 'balance')),
+            [(self.user2.id, 50)]
+        )
+
+    def test_snapshot_balances_time_budget(self):
+        """Test that the snapshot stops when the time budget is spent"""
+        for user in (self.user, self.user2):
+            Transaction.objects.create(
+                user=user,
+                transaction_type=Transaction.CHARGE,
+                amount=10,
+            )
+        out = StringIO()
+
+        call_command(
+            'snapshot_balances', chunk_size=1, time_budget=0, stdout=out
+        )
+
+        self.assertIn(f'--after-user {self.user.id}', out.getvalue())
+        self.assertEqual(UserBalance.objects.count(), 1)
+
+    def test_record_all_user_balance(self):
+        """Test that all users are recorded, not only the first one"""
+        for user in (self.user, self.user2):
+            Transaction.objects.create(
+                user=user,
+                transaction_type=Transaction.CHARGE,
+                amount=10,
+            )
+
+        self.assertEqual(UserBalance.record_all_user_balance(), 2)
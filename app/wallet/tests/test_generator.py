@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Case, F, Sum, When
+from django.test import TestCase
+from django.utils import timezone
+from wallet.generator import LedgerGenerator
+from wallet.models import (
+    DailyRollup,
+    Transaction,
+    TransferTransaction,
+    UserBalance,
+    Wallet,
+)
+
+
+END = datetime(2026, 10, 1, 12, tzinfo=dt_timezone.utc)
+
+
+class LedgerGeneratorTests(TestCase):
+    """Test the synthetic ledger generator"""
+
+    def generate(self, seed=0):
+        generator = LedgerGenerator(
+            [1, 2, 3], 500, END.replace(month=9), END, seed=seed
+        )
+        return list(generator.batches(1, 100))
+
+    def test_deterministic(self):
+        """Test that a seed always generates the same ledger"""
+        self.assertEqual(self.generate(seed=3), self.generate(seed=3))
+        self.assertNotEqual(self.generate(seed=3), self.generate(seed=4))
+
+    def test_batches(self):
+        """Test that ids are consecutive and times ordered"""
+        batches = self.generate()
+        rows = [row for batch in batches for row in batch[0]]
+
+        self.assertEqual([row[0] for row in rows], list(range(1, 501)))
+        times = [row[4] for row in rows]
+        self.assertEqual(times, sorted(times))
+        self.assertTrue(all(len(batch[0]) <= 101 for batch in batches))
+
+
+class GenerateLedgerCommandTests(TestCase):
+    """Test the generate_ledger command"""
+
+    def call(self, end=END, **options):
+        call_command(
+            'generate_ledger', users=5, transactions=300, days=45,
+            end=end.isoformat(), seed=1, batch_size=50, stdout=StringIO(),
+            **options
+        )
+
+    def test_generate_ledger(self):
+        """Test that the generated ledger is consistent"""
+        self.call()
+        signed = Case(
+            When(
+                transaction_type__in=[
+                    Transaction.CHARGE, Transaction.TRANSFER_RECEIVED
+                ],
+                then=F('amount')
+            ),
+            default=-F('amount'),
+        )
+        ledger = dict(
+            Transaction.objects.values('user_id')
+            .annotate(total=Sum(signed))
+            .values_list('user_id', 'total')
+        )
+        transfer = TransferTransaction.objects.select_related(
+            'sender_transaction', 'receiver_transaction'
+        ).first()
+
+        self.assertEqual(Transaction.objects.count(), 300)
+        self.assertEqual(
+            dict(Wallet.objects.values_list('user_id', 'balance')), ledger
+        )
+        self.assertTrue(all(balance >= 0 for balance in ledger.values()))
+        self.assertEqual(
+            transfer.sender_transaction.amount,
+            transfer.receiver_transaction.amount
+        )
+        self.assertTrue(UserBalance.objects.filter(
+            record_type=UserBalance.SNAPSHOT
+        ).exists())
+        self.assertEqual(UserBalance.objects.filter(
+            record_type=UserBalance.CHECKPOINT
+        ).count(), 5)
+
+    def test_other_users_not_rebuilt(self):
+        """Test that only the wallets of generated users are rebuilt"""
+        user = get_user_model().objects.create_user(
+            email='test@email.com',
+            password='testpass',
+        )
+        Transaction.objects.create(user=user, amount=100)
+
+        self.call()
+
+        self.assertEqual(Wallet.objects.get(user=user).version, 1)
+        self.assertFalse(UserBalance.objects.filter(
+            user=user, record_type=UserBalance.CHECKPOINT
+        ).exists())
+
+    def test_other_rollups_not_rebuilt(self):
+        """Test that only the rollups of generated users are rebuilt"""
+        user = get_user_model().objects.create_user(
+            email='test@email.com',
+            password='testpass',
+        )
+        Transaction.objects.create(user=user, amount=100)
+        DailyRollup.objects.filter(user=user).update(count=5)
+
+        self.call()
+
+        self.assertEqual(DailyRollup.objects.get(user=user).count, 5)
+
+    def test_future_end_rejected(self):
+        """Test that the ledger can not end after the checkpoints"""
+        end = timezone.now() + timedelta(days=1)
+
+        with self.assertRaises(CommandError):
+            self.call(end=end)
+
+    def test_invalid_counts(self):
+        """Test that every count is validated with its own message"""
+        for options, message in (
+            ({'users': 0}, '--users must be positive.'),
+            ({'transactions': -1}, '--transactions must not be negative.'),
+            ({'days': 0}, '--days must be positive.'),
+        ):
+            with self.assertRaisesMessage(CommandError, message):
+                call_command('generate_ledger', stdout=StringIO(), **options)
+
+    def test_seed_used(self):
+        """Test that a seed can not be generated twice"""
+        self.call()
+
+        with self.assertRaises(CommandError):
+            self.call()
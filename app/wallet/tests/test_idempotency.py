@@ -0,0 +1,238 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from wallet.models import (
+    Transaction, UserBalance, TransferTransaction, IdempotencyKey, Wallet
+)
+from wallet.views import IdempotentMixin
+
+
+TRANSACTION_URL = reverse('wallet:transactions-list')
+BULK_TRANSACTION_URL = reverse('wallet:transactions-bulk-create')
+TRANSFER_TRANSACTION_URL = reverse('wallet:transfer-transaction-list')
+
+
+class IdempotencyTests(TestCase):
+    """Test replaying write requests retried with an Idempotency-Key"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@email.com',
+            password='testpass',
+        )
+        self.user2 = get_user_model().objects.create_user(
+            email='other@email.com',
+            password='testpass',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def post(self, url, payload, key='retry-1'):
+        return self.client.post(
+            url, payload, format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def charge(self, amount):
+        return {
+            'user': self.user.id,
+            'transaction_type': Transaction.CHARGE,
+            'amount': amount,
+        }
+
+    def transfer_payload(self, amount):
+        return {
+            'sender_transaction': {
+                'user': self.user.id,
+                'transaction_type': Transaction.TRANSFER_SENT,
+                'amount': amount,
+            },
+            'receiver_transaction': {
+                'user': self.user2.id,
+                'transaction_type': Transaction.TRANSFER_RECEIVED,
+                'amount': amount,
+            },
+        }
+
+    def test_retried_transaction_replayed(self):
+        """Test that a retried create returns the first response"""
+        payload = self.charge(50)
+        res = self.post(TRANSACTION_URL, payload)
+
+        # Only the key lookup runs
+        with self.assertNumQueries(1):
+            retry = self.post(TRANSACTION_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, res.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(Wallet.get_balance(self.user), 50)
+
+    def idempotent(self, handler, key='retry-1'):
+        """Run handler through the mixin for a request with a key"""
+        request = Request(
+            RequestFactory().post(
+                '/', {}, content_type='application/json',
+                HTTP_IDEMPOTENCY_KEY=key
+            ),
+            parsers=[JSONParser()]
+        )
+        request.user = self.user
+        return IdempotentMixin().idempotent(request, handler)
+
+    def test_handler_runs_outside_key_transaction(self):
+        """Test that the handler runs with the key pending and outside
+        any transaction of the key, so its own can be retried"""
+        depth = len(connection.savepoint_ids)
+        seen = {}
+
+        def handler():
+            seen['depth'] = len(connection.savepoint_ids)
+            seen['pending'] = IdempotencyKey.objects.get().is_pending
+            return Response(status=status.HTTP_201_CREATED)
+
+        self.idempotent(handler)
+
+        self.assertEqual(seen, {'depth': depth, 'pending': True})
+        self.assertFalse(IdempotencyKey.objects.get().is_pending)
+
+    def test_pending_key_conflict(self):
+        """Test that a retry racing with the first request is refused"""
+        payload = self.charge(50)
+        self.post(TRANSACTION_URL, payload)
+        IdempotencyKey.objects.update(status_code=None, response=None)
+
+        res = self.post(TRANSACTION_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_abandoned_key_handled_again(self):
+        """Test that a key left pending by a failed process is handled
+        again after the pending timeout"""
+        IdempotencyKey.claim(self.user, 'retry-1', 'fingerprint')
+        IdempotencyKey.objects.update(
+            expires_time=timezone.now() - timedelta(seconds=1)
+        )
+
+        res = self.post(TRANSACTION_URL, self.charge(50))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_failing_handler_releases_key(self):
+        """Test that a key is released when its handler raises"""
+        def handler():
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            self.idempotent(handler)
+
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_requests_without_key_not_replayed(self):
+        """Test that requests without a key are all handled"""
+        payload = self.charge(50)
+        self.client.post(TRANSACTION_URL, payload, format='json')
+        self.client.post(TRANSACTION_URL, payload, format='json')
+
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_key_reused_for_other_request(self):
+        """Test that a key can not be reused with another payload"""
+        self.post(TRANSACTION_URL, self.charge(50))
+
+        res = self.post(TRANSACTION_URL, self.charge(60))
+
+        self.assertEqual(res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_keys_scoped_to_user(self):
+        """Test that users do not share keys"""
+        self.post(TRANSACTION_URL, self.charge(50))
+        self.client.force_authenticate(user=self.user2)
+
+        res = self.post(TRANSACTION_URL, self.charge(50))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Wallet.get_balance(self.user2), 50)
+
+    def test_bulk_create_replayed(self):
+        """Test that a retried bulk create writes nothing"""
+        payload = [self.charge(10), self.charge(20)]
+        self.post(BULK_TRANSACTION_URL, payload)
+
+        res = self.post(BULK_TRANSACTION_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 2)
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_retried_transfer_replayed(self):
+        """Test that a retried transfer moves money and records the
+        sender balance once"""
+        Transaction.objects.create(user=self.user, amount=100)
+        self.post(TRANSFER_TRANSACTION_URL, self.transfer_payload(30))
+        records = UserBalance.objects.count()
+
+        res = self.post(TRANSFER_TRANSACTION_URL, self.transfer_payload(30))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(TransferTransaction.objects.count(), 1)
+        self.assertEqual(UserBalance.objects.count(), records)
+        self.assertEqual(Wallet.get_balance(self.user), 70)
+        self.assertEqual(Wallet.get_balance(self.user2), 30)
+
+    def test_failed_transfer_not_stored(self):
+        """Test that a failed transfer can be retried with its key"""
+        res = self.post(TRANSFER_TRANSACTION_URL, self.transfer_payload(30))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        Transaction.objects.create(user=self.user, amount=100)
+
+        res = self.post(TRANSFER_TRANSACTION_URL, self.transfer_payload(30))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Wallet.get_balance(self.user2), 30)
+
+    def test_expired_key_handled_again(self):
+        """Test that a key is handled again once expired"""
+        self.post(TRANSACTION_URL, self.charge(50))
+        IdempotencyKey.objects.update(
+            expires_time=timezone.now() - timedelta(seconds=1)
+        )
+
+        res = self.post(TRANSACTION_URL, self.charge(50))
+
+        self.assertNotIn('Idempotent-Replayed', res)
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertGreater(
+            IdempotencyKey.objects.get().expires_time, timezone.now()
+        )
+
+    def test_purge_idempotency_keys(self):
+        """Test that only expired keys are purged"""
+        self.post(TRANSACTION_URL, self.charge(50), key='old')
+        IdempotencyKey.objects.update(expires_time=timezone.now())
+        self.post(TRANSACTION_URL, self.charge(50), key='new')
+
+        call_command(
+            'purge_idempotency_keys', chunk_size=1, stdout=StringIO()
+        )
+
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list('key', flat=True)),
+            ['new']
+        )
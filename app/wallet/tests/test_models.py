@@ -1,11 +1,18 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest.mock import Mock, patch
+
+from django.db import OperationalError, connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 from wallet import models
+from wallet.cache import balance_cache
 
 
 class ModelTests(TestCase):
 
     def setUp(self):
+        balance_cache.backend.clear()
         self.user = get_user_model().objects.create_user(
             email='test@email.com',
             password='testpass',
@@ -58,3 +65,340 @@ class ModelTests(TestCase):
             str(transfer_transaction),
             f'{transfer_transaction.sender_transaction} - {transfer_transaction.receiver_transaction}'
         )
+
+    def test_wallet_str(self):
+        """Test the wallet string representation"""
+        wallet = models.Wallet.objects.create(user=self.user, balance=100)
+
+        self.assertEqual(str(wallet), str(wallet.balance))
+
+    def test_wallet_follows_transactions(self):
+        """Test that the wallet is updated with every transaction write"""
+        models.Transaction.objects.create(
+            user=self.user,
+            transaction_type=models.Transaction.CHARGE,
+            amount=100,
+        )
+        purchase = models.Transaction.objects.create(
+            user=self.user,
+            transaction_type=models.Transaction.PURCHASE,
+            amount=30,
+        )
+        wallet = models.Wallet.objects.get(user=self.user)
+        self.assertEqual(wallet.balance, 70)
+        self.assertEqual(wallet.version, 2)
+
+        purchase.amount = 50
+        purchase.save()
+        wallet.refresh_from_db()
+        self.assertEqual(wallet.balance, 50)
+
+        purchase.delete()
+        wallet.refresh_from_db()
+        self.assertEqual(wallet.balance, 100)
+        self.assertEqual(wallet.version, 4)
+
+    def test_get_user_balance(self):
+        """Test that the user balance is read from the wallet"""
+        models.Transaction.objects.create(
+            user=self.user,
+            transaction_type=models.Transaction.CHARGE,
+            amount=100,
+        )
+        models.Transaction.objects.create(
+            user=self.user,
+            transaction_type=models.Transaction.PURCHASE,
+            amount=40,
+        )
+
+        with self.assertNumQueries(1):
+            balance = models.Transaction.get_user_balance(self.user)
+        self.assertEqual(balance, 60)
+        self.assertEqual(
+            balance, models.Transaction.get_ledger_balance(self.user)
+        )
+
+    def test_get_user_balance_without_wallet(self):
+        """Test that a user without transactions has no balance"""
+        self.assertEqual(models.Transaction.get_user_balance(self.user), 0)
+
+    def test_transfer(self):
+        """Test transferring amount between two users"""
+        user2 = get_user_model().objects.create_user(
+            email='other@email.com',
+            password='testpass',
+        )
+        models.Transaction.objects.create(
+            user=self.user,
+            transaction_type=models.Transaction.CHARGE,
+            amount=100,
+        )
+        transfer = models.TransferTransaction.transfer(
+            sender=self.user, receiver=user2, amount=60
+        )
+
+        self.assertEqual(transfer.sender_transaction.user, self.user)
+        self.assertEqual(transfer.receiver_transaction.user, user2)
+        self.assertEqual(models.Wallet.get_balance(self.user), 40)
+        self.assertEqual(models.Wallet.get_balance(user2), 60)
+
+    def test_transfer_insufficient_balance(self):
+        """Test that a transfer is not made without enough balance"""
+        user2 = get_user_model().objects.create_user(
+            email='other@email.com',
+            password='testpass',
+        )
+
+        with self.assertRaises(models.InsufficientBalance):
+            models.TransferTransaction.transfer(
+                sender=self.user, receiver=user2, amount=1
+            )
+        self.assertFalse(models.TransferTransaction.objects.exists())
+
+    def test_transfer_invalid_amount(self):
+        """Test that only positive amounts can be transferred"""
+        user2 = get_user_model().objects.create_user(
+            email='other@email.com',
+            password='testpass',
+        )
+
+        with self.assertRaises(models.TransferError):
+            models.TransferTransaction.transfer(
+                sender=self.user, receiver=user2, amount=-10
+            )
+
+    @patch('wallet.models.time.sleep')
+    def test_run_with_retry(self, sleep):
+        """Test that deadlocks are retried with a bounded backoff"""
+        cause = Exception('deadlock detected')
+        cause.pgcode = '40P01'
+        deadlock = OperationalError('deadlock detected')
+        deadlock.__cause__ = cause
+        func = Mock(side_effect=[deadlock, deadlock, 'done'])
+
+        self.assertEqual(models.run_with_retry(func, retries=2), 'done')
+        self.assertEqual(sleep.call_count, 2)
+
+        func = Mock(side_effect=deadlock)
+        with self.assertRaises(OperationalError):
+            models.run_with_retry(func, retries=2)
+        self.assertEqual(func.call_count, 3)
+
+    @override_settings(WALLET_CHECKPOINT_INTERVAL=3)
+    def test_checkpoint_recorded_every_interval(self):
+        """Test that a checkpoint is recorded after every N transactions"""
+        for _ in range(7):
+            models.Transaction.objects.create(
+                user=self.user,
+                transaction_type=models.Transaction.CHARGE,
+                amount=10,
+            )
+        checkpoints = models.UserBalance.objects.filter(
+            user=self.user,
+            record_type=models.UserBalance.CHECKPOINT,
+        ).order_by('created_time')
+
+        self.assertEqual(
+            [checkpoint.balance for checkpoint in checkpoints], [30, 60]
+        )
+
+    def test_ledger_balance_starts_from_checkpoint(self):
+        """Test that the ledger balance only sums transactions made
+        after the latest checkpoint"""
+        models.Transaction.objects.create(
+            user=self.user,
+            transaction_type=models.Transaction.CHARGE,
+            amount=100,
+        )
+        checkpoint = models.UserBalance.record_user_balance(self.user)
+        models.Transaction.objects.create(
+            user=self.user,
+            transaction_type=models.Transaction.PURCHASE,
+            amount=30,
+        )
+        models.UserBalance.objects.create(user=self.user, balance=1000)
+
+        self.assertEqual(checkpoint.record_type, checkpoint.CHECKPOINT)
+        self.assertEqual(checkpoint.balance, 100)
+        self.assertEqual(models.Transaction.get_ledger_balance(self.user), 70)
+
+        models.UserBalance.objects.filter(pk=checkpoint.pk).update(
+            balance=500
+        )
+        self.assertEqual(
+            models.Transaction.get_ledger_balance(self.user), 470
+        )
+
+    def test_rewriting_history_records_checkpoint(self):
+        """Test that editing an old transaction keeps the ledger
+        balance correct"""
+        charge = models.Transaction.objects.create(
+            user=self.user,
+            transaction_type=models.Transaction.CHARGE,
+            amount=100,
+        )
+        models.UserBalance.record_user_balance(self.user)
+        charge.amount = 80
+        charge.save()
+
+        self.assertEqual(models.Transaction.get_ledger_balance(self.user), 80)
+
+    def batch_transfer_queries(self, payouts):
+        """Return the number of queries of a batch transfer, the legs
+        are inserted one by one on databases without RETURNING"""
+        if connection.features.can_return_rows_from_bulk_insert:
+            return 10
+        return 9 + 2 * payouts
+
+    def test_batch_transfer(self):
+        """Test paying many receivers in a constant number of queries"""
+        models.Transaction.objects.create(
+            user=self.user,
+            transaction_type=models.Transaction.CHARGE,
+            amount=1000,
+        )
+        receivers = [
+            get_user_model().objects.create_user(
+                email=f'receiver{index}@email.com',
+                password='testpass',
+            )
+            for index in range(10)
+        ]
+
+        with self.assertNumQueries(self.batch_transfer_queries(2)):
+            models.TransferTransaction.batch_transfer(
+                sender=self.user,
+                payouts=[(receivers[0].id, 10), (receivers[1].id, 20)],
+            )
+        with self.assertNumQueries(self.batch_transfer_queries(10)):
+            transfers = models.TransferTransaction.batch_transfer(
+                sender=self.user,
+                payouts=[(receiver.id, 50) for receiver in receivers],
+            )
+
+        self.assertEqual(len(transfers), 10)
+        self.assertEqual(models.Wallet.get_balance(self.user), 470)
+        self.assertEqual(models.Wallet.get_balance(receivers[0]), 60)
+        self.assertEqual(models.Wallet.get_balance(receivers[9]), 50)
+
+    def test_batch_transfer_checks_total(self):
+        """Test that the sender funds must cover the whole batch"""
+        models.Transaction.objects.create(
+            user=self.user,
+            transaction_type=models.Transaction.CHARGE,
+            amount=100,
+        )
+        user2 = get_user_model().objects.create_user(
+            email='other@email.com',
+            password='testpass',
+        )
+
+        with self.assertRaises(models.InsufficientBalance):
+            models.TransferTransaction.batch_transfer(
+                sender=self.user,
+                payouts=[(user2.id, 60), (user2.id, 60)],
+            )
+        self.assertEqual(models.Wallet.get_balance(self.user), 100)
+        self.assertFalse(models.TransferTransaction.objects.exists())
+
+    def test_batch_transfer_unknown_receiver(self):
+        """Test that every receiver must exist"""
+        with self.assertRaises(models.TransferError):
+            models.TransferTransaction.batch_transfer(
+                sender=self.user,
+                payouts=[(self.user.id + 1000, 10)],
+            )
+
+    def rollups(self):
+        return list(models.DailyRollup.objects.order_by(
+            'user_id', 'day', 'transaction_type'
+        ).values_list('user_id', 'transaction_type', 'count', 'total'))
+
+    def test_rollups_follow_transactions(self):
+        """Test that daily rollups are updated with every write"""
+        user2 = get_user_model().objects.create_user(
+            email='other@email.com',
+            password='testpass',
+        )
+        models.Transaction.objects.create(
+            user=self.user,
+            transaction_type=models.Transaction.CHARGE,
+            amount=100,
+        )
+        purchase = models.Transaction.objects.create(
+            user=self.user,
+            transaction_type=models.Transaction.PURCHASE,
+            amount=30,
+        )
+        models.TransferTransaction.batch_transfer(
+            sender=self.user,
+            payouts=[(user2.id, 10), (user2.id, 5)],
+        )
+        purchase.amount = 50
+        purchase.save()
+
+        self.assertEqual(self.rollups(), [
+            (self.user.id, models.Transaction.CHARGE, 1, 100),
+            (self.user.id, models.Transaction.PURCHASE, 1, 50),
+            (self.user.id, models.Transaction.TRANSFER_SENT, 2, 15),
+            (user2.id, models.Transaction.TRANSFER_RECEIVED, 2, 15),
+        ])
+
+        purchase.delete()
+        self.assertEqual(self.rollups()[1][2:], (0, 0))
+
+    def test_rebuild_rollups(self):
+        """Test that rollups are recomputed from the ledger"""
+        charge = models.Transaction.objects.create(
+            user=self.user,
+            transaction_type=models.Transaction.CHARGE,
+            amount=100,
+        )
+        models.Transaction.objects.create(
+            user=self.user,
+            transaction_type=models.Transaction.CHARGE,
+            amount=20,
+        )
+        models.Transaction.objects.filter(pk=charge.pk).update(
+            created_time=charge.created_time - timedelta(days=3)
+        )
+        models.DailyRollup.objects.all().delete()
+
+        models.DailyRollup.rebuild(chunk_size=1)
+
+        self.assertEqual(self.rollups(), [
+            (self.user.id, models.Transaction.CHARGE, 1, 100),
+            (self.user.id, models.Transaction.CHARGE, 1, 20),
+        ])
+        models.DailyRollup.objects.filter(total=20).update(total=0)
+
+        models.DailyRollup.rebuild(since=timezone.localdate())
+
+        self.assertEqual(
+            sorted(row[3] for row in self.rollups()), [20, 100]
+        )
+
+    def test_report(self):
+        """Test that the report reads balances from the rollups"""
+        user2 = get_user_model().objects.create_user(
+            email='other@email.com',
+            password='testpass',
+        )
+        models.Transaction.objects.create(
+            user=self.user,
+            transaction_type=models.Transaction.CHARGE,
+            amount=100,
+        )
+        models.TransferTransaction.transfer(
+            sender=self.user, receiver=user2, amount=40
+        )
+
+        report = models.Transaction.get_report().order_by('id')
+
+        self.assertEqual(
+            [(user.transactions_count, user.balance) for user in report],
+            [(2, 60), (1, 40)]
+        )
+        self.assertEqual(
+            models.Transaction.get_total_balance(), {'balance__sum': 100}
+        )
@@ -0,0 +1,248 @@
+import json
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from wallet import partitions
+from wallet.models import (
+    DailyRollup,
+    Transaction,
+    TransferTransaction,
+    UserBalance,
+    Wallet,
+)
+
+
+OLD_MONTH = datetime(2001, 5, 1, tzinfo=dt_timezone.utc)
+TRANSFER_TRANSACTION_URL = reverse('wallet:transfer-transaction-list')
+
+
+def transfer_detail_url(transfer_id):
+    return reverse('wallet:transfer-transaction-detail', args=[transfer_id])
+
+
+def scanned_relations(queryset):
+    """Return the relations read by the plan of a queryset"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    relations = set()
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if 'Relation Name' in node:
+            relations.add(node['Relation Name'])
+        nodes.extend(node.get('Plans', ()))
+    return relations
+
+
+class PartitionTests(TestCase):
+    """Test the monthly partitions of the transaction table"""
+
+    def setUp(self):
+        if not partitions.is_partitioned():
+            self.skipTest('Transactions are partitioned on PostgreSQL')
+        self.user = get_user_model().objects.create_user(
+            email='test@email.com',
+            password='testpass',
+        )
+
+    def create_old_transaction(self, amount=100):
+        """Create a transaction dated in an old month"""
+        charge = Transaction.objects.create(
+            user=self.user,
+            transaction_type=Transaction.CHARGE,
+            amount=amount,
+        )
+        Transaction.objects.filter(pk=charge.pk).update(
+            created_time=OLD_MONTH.replace(day=15)
+        )
+        return charge
+
+    def test_create_partitions_ahead(self):
+        """Test that partitions of the coming months are created"""
+        now = datetime(2040, 11, 20, tzinfo=dt_timezone.utc)
+
+        created = partitions.create_partitions(ahead=2, now=now)
+
+        self.assertEqual(created, [
+            'wallet_transaction_p2040_11',
+            'wallet_transaction_p2040_12',
+            'wallet_transaction_p2041_01',
+        ])
+        self.assertEqual(partitions.create_partitions(ahead=2, now=now), [])
+
+    def test_create_partition_moves_default_rows(self):
+        """Test that a new partition takes its rows from the default one"""
+        charge = self.create_old_transaction()
+
+        partitions.create_partition(OLD_MONTH)
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT id FROM wallet_transaction_p2001_05')
+            self.assertEqual(cursor.fetchall(), [(charge.id,)])
+            cursor.execute('SELECT count(*) FROM wallet_transaction_default')
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_recent_queries_prune_old_partitions(self):
+        """Test that time bounded queries skip older partitions"""
+        self.create_old_transaction()
+        partitions.create_partition(OLD_MONTH)
+        since = timezone.now()
+
+        relations = scanned_relations(
+            Transaction.objects.filter(user=self.user, created_time__gt=since)
+        )
+
+        self.assertNotIn('wallet_transaction_p2001_05', relations)
+        self.assertIn(partitions.partition_name(
+            partitions.month_start(since)
+        ), relations)
+
+    def test_detach_requires_checkpoint(self):
+        """Test that a month is only detached once balances are
+        checkpointed after it"""
+        self.create_old_transaction()
+        partitions.create_partition(OLD_MONTH)
+
+        with self.assertRaises(CommandError):
+            call_command(
+                'manage_partitions', detach_before='2001-06',
+                stdout=StringIO()
+            )
+
+        UserBalance.record_user_balance(self.user)
+        call_command(
+            'manage_partitions', detach_before='2001-06', stdout=StringIO()
+        )
+
+        self.assertNotIn(
+            'wallet_transaction_p2001_05',
+            dict(partitions.list_partitions())
+        )
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(Transaction.get_ledger_balance(self.user), 100)
+        self.assertEqual(Wallet.get_balance(self.user), 100)
+
+    def test_detach_requires_partitioned_rows(self):
+        """Test that months are not detached while older transactions
+        are left in the default partition"""
+        self.create_old_transaction()
+        partitions.create_partition(OLD_MONTH.replace(month=6))
+        UserBalance.record_user_balance(self.user)
+
+        with self.assertRaises(CommandError):
+            call_command(
+                'manage_partitions', detach_before='2001-07',
+                stdout=StringIO()
+            )
+
+        self.assertIn(
+            'wallet_transaction_p2001_06', dict(partitions.list_partitions())
+        )
+
+    def detach_old_month(self, **options):
+        """Partition the old month, checkpoint every balance and detach
+        it"""
+        partitions.create_partition(OLD_MONTH)
+        for user in get_user_model().objects.all():
+            UserBalance.record_user_balance(user)
+        call_command(
+            'manage_partitions', detach_before='2001-06', stdout=StringIO(),
+            **options
+        )
+
+    def test_rebuild_after_detach(self):
+        """Test that wallets and snapshots rebuilt after a detach still
+        count the detached transactions"""
+        self.create_old_transaction(100)
+        self.detach_old_month()
+        Transaction.objects.create(
+            user=self.user,
+            transaction_type=Transaction.PURCHASE,
+            amount=30,
+        )
+
+        Wallet.rebuild()
+        list(UserBalance.snapshot_balances())
+
+        self.assertEqual(Wallet.get_balance(self.user), 70)
+        snapshot = UserBalance.objects.filter(
+            record_type=UserBalance.SNAPSHOT
+        ).get()
+        self.assertEqual(snapshot.balance, 70)
+
+    def test_rollup_rebuild_keeps_detached_days(self):
+        """Test that rebuilding rollups keeps the days of detached
+        months, which can not be recounted"""
+        self.create_old_transaction(100)
+        DailyRollup.rebuild()
+        self.detach_old_month()
+
+        DailyRollup.rebuild()
+
+        old = DailyRollup.objects.get(day=OLD_MONTH.replace(day=15).date())
+        self.assertEqual((old.count, old.total), (1, 100))
+        self.assertEqual(Transaction.get_total_balance(), {
+            'balance__sum': 100
+        })
+
+    def create_old_transfer(self):
+        """Create a transfer from the user to another one, with both
+        legs dated in an old month"""
+        receiver = get_user_model().objects.create_user(
+            email='other@email.com',
+            password='testpass',
+        )
+        self.create_old_transaction(100)
+        transfer = TransferTransaction.transfer(self.user, receiver, 40)
+        Transaction.objects.filter(pk__in=[
+            transfer.sender_transaction_id, transfer.receiver_transaction_id
+        ]).update(created_time=OLD_MONTH.replace(day=20))
+        return transfer
+
+    def test_detach_archives_transfers(self):
+        """Test that transfers with detached legs are moved to an
+        archive table, out of the transfer API"""
+        transfer = self.create_old_transfer()
+
+        self.detach_old_month()
+
+        self.assertFalse(TransferTransaction.objects.exists())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT id FROM wallet_transaction_p2001_05_transfers'
+            )
+            self.assertEqual(cursor.fetchall(), [(transfer.id,)])
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        res = client.get(transfer_detail_url(transfer.id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        res = client.get(TRANSFER_TRANSACTION_URL)
+        self.assertEqual(res.data['results'], [])
+
+    def test_drop_deletes_transfers(self):
+        """Test that dropping a month deletes its transfers"""
+        self.create_old_transfer()
+
+        self.detach_old_month(drop=True)
+
+        self.assertFalse(TransferTransaction.objects.exists())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT to_regclass('wallet_transaction_p2001_05_transfers')"
+            )
+            self.assertIsNone(cursor.fetchone()[0])
+        Wallet.rebuild()
+        self.assertEqual(Wallet.get_balance(self.user), 60)
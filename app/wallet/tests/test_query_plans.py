@@ -0,0 +1,129 @@
+import random
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from wallet.models import (
+    Transaction, UserBalance, TransferTransaction, Wallet
+)
+from wallet.tests.utils import find_full_scans
+
+
+LEDGER_TABLES = (
+    'wallet_transaction',
+    'wallet_userbalance',
+    'wallet_transfertransaction',
+    'wallet_wallet',
+)
+
+
+@skipUnless(
+    connection.vendor == 'postgresql', 'Query plans are read on PostgreSQL'
+)
+class QueryPlanTests(TestCase):
+    """Test that the hot wallet queries are served by indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        rand = random.Random(0)
+        cls.users = [
+            get_user_model().objects.create_user(
+                email=f'user{index}@email.com',
+                password='testpass',
+            )
+            for index in range(20)
+        ]
+        transactions = Transaction.objects.bulk_create([
+            Transaction(
+                user=rand.choice(cls.users),
+                transaction_type=rand.choice((1, 2, 3, 4)),
+                amount=rand.randint(1, 1000),
+            )
+            for _ in range(4000)
+        ])
+        TransferTransaction.objects.bulk_create([
+            TransferTransaction(
+                sender_transaction=transactions[index],
+                receiver_transaction=transactions[index + 1],
+            )
+            for index in range(0, 400, 2)
+        ])
+        UserBalance.objects.bulk_create([
+            UserBalance(user=user, balance=rand.randint(0, 1000))
+            for user in cls.users
+            for _ in range(50)
+        ])
+        Wallet.rebuild()
+        for user in cls.users:
+            UserBalance.record_user_balance(user)
+        with connection.cursor() as cursor:
+            for table in LEDGER_TABLES:
+                cursor.execute(f'ANALYZE {table}')
+
+    def setUp(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('Query plans are checked on PostgreSQL')
+        self.user = self.users[0]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def assertIndexed(self, func):
+        """Assert that no query made by func scans a ledger table"""
+        scans = find_full_scans(func, LEDGER_TABLES)
+        self.assertEqual(scans, [], 'Full scan of a ledger table')
+
+    def browse(self, url):
+        """Retrieve the first two pages of a list endpoint"""
+        res = self.client.get(url, {'page_size': 10})
+        self.client.get(res.data['next'])
+
+    def test_transaction_list_uses_index(self):
+        """Test that transaction history pages are index scans"""
+        self.assertIndexed(
+            lambda: self.browse(reverse('wallet:transactions-list'))
+        )
+
+    def test_user_balance_list_uses_index(self):
+        """Test that user balance pages are index scans"""
+        self.assertIndexed(
+            lambda: self.browse(reverse('wallet:userbalance-list'))
+        )
+
+    def test_transfer_list_uses_index(self):
+        """Test that transfer pages are index scans"""
+        self.assertIndexed(
+            lambda: self.browse(reverse('wallet:transfer-transaction-list'))
+        )
+
+    def test_export_uses_index(self):
+        """Test that the history export is an index scan"""
+        def export():
+            res = self.client.get(reverse('wallet:transactions-export'))
+            b''.join(res.streaming_content)
+
+        self.assertIndexed(export)
+
+    def test_balance_uses_index(self):
+        """Test that balance reads are index scans"""
+        self.assertIndexed(lambda: Transaction.get_user_balance(self.user))
+        self.assertIndexed(lambda: Transaction.get_ledger_balance(self.user))
+
+    def test_type_filter_uses_index(self):
+        """Test that filtering the ledger by type is an index scan"""
+        self.assertIndexed(lambda: list(
+            Transaction.objects.filter(
+                transaction_type=Transaction.PURCHASE
+            ).order_by('-id')[:100]
+        ))
+
+    def test_find_full_scans_reports_unindexed_query(self):
+        """Test that the plan check catches a full scan"""
+        scans = find_full_scans(
+            lambda: list(Transaction.objects.filter(amount=10)),
+            LEDGER_TABLES
+        )
+
+        self.assertEqual(scans[0][0], 'wallet_transaction')
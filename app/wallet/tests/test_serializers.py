@@ -0,0 +1,65 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from wallet.models import Transaction, TransferTransaction, UserBalance
+from wallet.serializers import (
+    TransactionSerializer,
+    TransferTransactionSerializer,
+    UserBalanceSerializer,
+    ValuesSerializer,
+)
+
+
+class ValuesSerializerTests(TestCase):
+    """Test serializing values() rows with a compiled field plan"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@email.com',
+            password='testpass',
+        )
+        self.user2 = get_user_model().objects.create_user(
+            email='other@email.com',
+            password='testpass',
+        )
+        Transaction.objects.create(
+            user=self.user,
+            transaction_type=Transaction.CHARGE,
+            amount=100,
+        )
+        TransferTransaction.transfer(
+            sender=self.user, receiver=self.user2, amount=40
+        )
+        UserBalance.record_user_balance(user=self.user)
+
+    def assertSameRepresentation(self, serializer_class, queryset):
+        serializer = ValuesSerializer.for_serializer(serializer_class)
+
+        data = serializer.serialize(queryset.values(*serializer.lookups))
+
+        self.assertEqual(
+            data, serializer_class(queryset, many=True).data
+        )
+
+    def test_transactions(self):
+        """Test that transactions are serialized like the serializer"""
+        self.assertSameRepresentation(
+            TransactionSerializer, Transaction.objects.order_by('id')
+        )
+
+    def test_user_balances(self):
+        """Test that balances are serialized like the serializer"""
+        self.assertSameRepresentation(
+            UserBalanceSerializer, UserBalance.objects.order_by('id')
+        )
+
+    def test_nested_transfers(self):
+        """Test that nested serializers become related lookups"""
+        serializer = ValuesSerializer.for_serializer(
+            TransferTransactionSerializer
+        )
+
+        self.assertIn('sender_transaction__amount', serializer.lookups)
+        self.assertSameRepresentation(
+            TransferTransactionSerializer,
+            TransferTransaction.objects.order_by('id')
+        )
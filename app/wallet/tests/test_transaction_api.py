@@ -1,13 +1,26 @@
-from django.test import TestCase
+import json
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
-from wallet.models import Transaction
+from wallet.models import Transaction, Wallet
 from wallet.serializers import TransactionSerializer
 
 
 TRANSACTION_URL = reverse('wallet:transactions-list')
+BULK_TRANSACTION_URL = reverse('wallet:transactions-bulk-create')
+EXPORT_TRANSACTION_URL = reverse('wallet:transactions-export')
+
+
+def balance_url(transaction_id):
+    """Return user balance URL"""
+    return reverse('wallet:transactions-get-user-balance',
+                   args=[transaction_id])
 
 
 class PublicTransactionApiTests(TestCase):
@@ -47,11 +60,13 @@ class PrivateTransactionApiTests(TestCase):
             amount=10
         )
         res = self.client.get(TRANSACTION_URL)
-        transactions = Transaction.objects.all().order_by('-created_time')
+        transactions = Transaction.objects.all().order_by(
+            '-created_time', '-id'
+        )
         serializer = TransactionSerializer(transactions, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_transaction_limited_to_user(self):
         """Test that transactions returned are for the authenticated user"""
@@ -72,8 +87,8 @@ class PrivateTransactionApiTests(TestCase):
         res = self.client.get(TRANSACTION_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['amount'], transaction.amount)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['amount'], transaction.amount)
 
     def test_create_transaction_successful(self):
         """Test creating a new transaction"""
@@ -102,3 +117,278 @@ class PrivateTransactionApiTests(TestCase):
         res = self.client.post(TRANSACTION_URL, payload)
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_user_balance(self):
+        """Test retrieving the balance of the authenticated user"""
+        transaction = Transaction.objects.create(
+            user=self.user,
+            transaction_type=1,
+            amount=100
+        )
+        Transaction.objects.create(
+            user=self.user,
+            transaction_type=2,
+            amount=30
+        )
+        res = self.client.get(balance_url(transaction.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'user balance': 70})
+
+    def test_bulk_create_transactions(self):
+        """Test creating many transactions from a JSON list"""
+        payload = [
+            {'user': self.user.id, 'transaction_type': 1, 'amount': 100},
+            {'user': self.user.id, 'transaction_type': 2, 'amount': 30},
+            {'user': self.user.id, 'transaction_type': 2, 'amount': 20},
+        ]
+        with override_settings(WALLET_BULK_BATCH_SIZE=2):
+            res = self.client.post(
+                BULK_TRANSACTION_URL, payload, format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(
+            [item['amount'] for item in res.data], [100, 30, 20]
+        )
+        self.assertTrue(all(item['id'] for item in res.data))
+        self.assertEqual(Transaction.objects.count(), 3)
+        wallet = Wallet.objects.get(user=self.user)
+        self.assertEqual(wallet.balance, 50)
+        self.assertEqual(wallet.version, 3)
+
+    def test_bulk_create_transactions_ndjson(self):
+        """Test creating many transactions from an NDJSON body"""
+        lines = [
+            {'user': self.user.id, 'transaction_type': 1, 'amount': 100},
+            {'user': self.user.id, 'transaction_type': 2, 'amount': 40},
+        ]
+        body = '\n'.join(json.dumps(line) for line in lines) + '\n'
+        res = self.client.post(
+            BULK_TRANSACTION_URL,
+            body,
+            content_type='application/x-ndjson'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Transaction.get_user_balance(self.user), 60)
+
+    def test_bulk_create_transactions_invalid(self):
+        """Test that a batch with an invalid item is rejected as a whole"""
+        payload = [
+            {'user': self.user.id, 'transaction_type': 1, 'amount': 100},
+            {'user': self.user.id, 'transaction_type': 1, 'amount': ''},
+        ]
+        res = self.client.post(BULK_TRANSACTION_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('amount', res.data[1])
+        self.assertFalse(Transaction.objects.exists())
+
+    @override_settings(WALLET_BULK_MAX_ITEMS=1)
+    def test_bulk_create_transactions_too_many(self):
+        """Test that batches larger than the limit are rejected"""
+        payload = [
+            {'user': self.user.id, 'transaction_type': 1, 'amount': 100},
+            {'user': self.user.id, 'transaction_type': 1, 'amount': 100},
+        ]
+        res = self.client.post(BULK_TRANSACTION_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Transaction.objects.exists())
+
+    @override_settings(WALLET_BULK_MAX_ITEMS=1)
+    def test_bulk_create_transactions_ndjson_too_many(self):
+        """Test that NDJSON bodies stop being parsed over the limit"""
+        line = json.dumps(
+            {'user': self.user.id, 'transaction_type': 1, 'amount': 100}
+        )
+        body = f'{line}\n{line}\nnot json\n'
+        res = self.client.post(
+            BULK_TRANSACTION_URL,
+            body,
+            content_type='application/x-ndjson'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data['detail'], 'At most 1 items are allowed.'
+        )
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_transactions_paginated_by_cursor(self):
+        """Test that transactions are listed page by page, newest first"""
+        transactions = [
+            Transaction.objects.create(
+                user=self.user,
+                transaction_type=1,
+                amount=amount
+            )
+            for amount in range(1, 6)
+        ]
+        res = self.client.get(TRANSACTION_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', res.data)
+        self.assertEqual(
+            [item['id'] for item in res.data['results']],
+            [transactions[4].id, transactions[3].id]
+        )
+
+        seen = []
+        url = TRANSACTION_URL + '?page_size=2'
+        while url:
+            res = self.client.get(url)
+            seen.extend(item['id'] for item in res.data['results'])
+            url = res.data['next']
+        self.assertEqual(
+            seen, [transaction.id for transaction in reversed(transactions)]
+        )
+
+    def test_transactions_sharing_time_paginated_by_key(self):
+        """Test that pages of transactions sharing their created time
+        are read after the key of the last row, not at an offset"""
+        transactions = [
+            Transaction.objects.create(
+                user=self.user,
+                transaction_type=1,
+                amount=amount
+            )
+            for amount in range(1, 6)
+        ]
+        Transaction.objects.update(created_time=timezone.now())
+        newest_first = [transaction.id for transaction in transactions][::-1]
+
+        pages = []
+        url = TRANSACTION_URL + '?page_size=2'
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                res = self.client.get(url)
+            self.assertFalse(any(
+                'OFFSET' in query['sql']
+                for query in context.captured_queries
+            ))
+            pages.append([item['id'] for item in res.data['results']])
+            url = res.data['next']
+        self.assertEqual(pages, [
+            newest_first[:2], newest_first[2:4], newest_first[4:]
+        ])
+
+        res = self.client.get(res.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in res.data['results']], newest_first[2:4]
+        )
+        res = self.client.get(res.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in res.data['results']], newest_first[:2]
+        )
+        self.assertIsNone(res.data['previous'])
+
+    def test_transactions_invalid_cursor(self):
+        """Test that a forged cursor is rejected"""
+        res = self.client.get(TRANSACTION_URL, {'cursor': 'cD14'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(WALLET_LIST_PAGINATION='page')
+    def test_transactions_paginated_by_page(self):
+        """Test that numbered pages tell whether the count is exact"""
+        for amount in range(1, 6):
+            Transaction.objects.create(
+                user=self.user,
+                transaction_type=1,
+                amount=amount
+            )
+        res = self.client.get(TRANSACTION_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 5)
+        self.assertFalse(res.data['count_is_estimate'])
+        self.assertEqual(
+            [item['amount'] for item in res.data['results']], [5, 4]
+        )
+
+        with override_settings(ESTIMATED_COUNT_THRESHOLD=0):
+            res = self.client.get(TRANSACTION_URL, {
+                'page_size': 2, 'page': 3
+            })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['amount'] for item in res.data['results']], [1]
+        )
+        self.assertIsNone(res.data['next'])
+        self.assertEqual(
+            res.data['count_is_estimate'],
+            connection.vendor == 'postgresql'
+        )
+
+    def test_export_transactions_csv(self):
+        """Test streaming the transaction history as CSV"""
+        charge = Transaction.objects.create(
+            user=self.user,
+            transaction_type=1,
+            amount=100
+        )
+        purchase = Transaction.objects.create(
+            user=self.user,
+            transaction_type=2,
+            amount=30
+        )
+        res = self.client.get(EXPORT_TRANSACTION_URL)
+        lines = b''.join(res.streaming_content).decode().splitlines()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        self.assertEqual(lines[0], 'id,transaction_type,amount,created_time')
+        self.assertEqual(
+            lines[1:],
+            [
+                f'{item.id},{item.transaction_type},{item.amount},'
+                f'{item.created_time.isoformat()}'
+                for item in (charge, purchase)
+            ]
+        )
+
+    def test_export_transactions_ndjson_filtered(self):
+        """Test streaming filtered transactions as NDJSON"""
+        user2 = get_user_model().objects.create_user(
+            email='other@email.com',
+            password='testpass',
+        )
+        Transaction.objects.create(user=user2, transaction_type=2, amount=5)
+        Transaction.objects.create(
+            user=self.user,
+            transaction_type=1,
+            amount=100
+        )
+        purchase = Transaction.objects.create(
+            user=self.user,
+            transaction_type=2,
+            amount=30
+        )
+        res = self.client.get(EXPORT_TRANSACTION_URL, {
+            'export_format': 'ndjson',
+            'transaction_type': 2,
+            'start': purchase.created_time.isoformat(),
+        })
+        rows = [
+            json.loads(line)
+            for line in b''.join(res.streaming_content).splitlines()
+        ]
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(rows, [{
+            'id': purchase.id,
+            'transaction_type': 2,
+            'amount': 30,
+            'created_time': purchase.created_time.isoformat(),
+        }])
+
+    def test_export_transactions_invalid_format(self):
+        """Test that unknown export formats are rejected"""
+        res = self.client.get(EXPORT_TRANSACTION_URL, {'export_format': 'x'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
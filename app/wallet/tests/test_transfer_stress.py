@@ -0,0 +1,106 @@
+import logging
+import multiprocessing
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test import TransactionTestCase, tag
+from wallet.models import (
+    Transaction, TransferTransaction, Wallet, InsufficientBalance
+)
+
+
+PROCESSES = 4
+TRANSFERS_PER_PROCESS = 50
+USERS = 5
+INITIAL_BALANCE = 1000
+
+# Reports the throughput at the INFO level, silent unless a handler is
+# configured for it in LOGGING
+logger = logging.getLogger(__name__)
+
+
+def run_transfers(user_ids, seed, results):
+    """Make random transfers between users from a child process"""
+    connections.close_all()
+    rand = random.Random(seed)
+    users = list(get_user_model().objects.filter(id__in=user_ids))
+    made = rejected = 0
+    for _ in range(TRANSFERS_PER_PROCESS):
+        sender, receiver = rand.sample(users, 2)
+        try:
+            TransferTransaction.transfer(
+                sender=sender,
+                receiver=receiver,
+                amount=rand.randint(1, INITIAL_BALANCE // 2),
+            )
+            made += 1
+        except InsufficientBalance:
+            rejected += 1
+    connections.close_all()
+    results.put((made, rejected))
+
+
+@tag('stress')
+class TransferStressTests(TransactionTestCase):
+    """Run concurrent transfers from several processes"""
+
+    def setUp(self):
+        self.users = [
+            get_user_model().objects.create_user(
+                email=f'user{index}@email.com',
+                password='testpass',
+            )
+            for index in range(USERS)
+        ]
+        for user in self.users:
+            Transaction.objects.create(
+                user=user,
+                transaction_type=Transaction.CHARGE,
+                amount=INITIAL_BALANCE,
+            )
+
+    def test_concurrent_transfers_conserve_balance(self):
+        """Test that concurrent transfers neither create nor lose money"""
+        if connection.vendor != 'postgresql':
+            self.skipTest('Row locks require PostgreSQL')
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        user_ids = [user.id for user in self.users]
+        connections.close_all()
+
+        start = time.perf_counter()
+        processes = [
+            context.Process(
+                target=run_transfers, args=(user_ids, seed, results)
+            )
+            for seed in range(PROCESSES)
+        ]
+        for process in processes:
+            process.start()
+        outcomes = [results.get(timeout=120) for _ in processes]
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        made = sum(outcome[0] for outcome in outcomes)
+        rejected = sum(outcome[1] for outcome in outcomes)
+        logger.info(
+            '%d transfers (%d rejected) from %d processes in %.2fs: '
+            '%.1f transfers/sec',
+            made, rejected, PROCESSES, elapsed, made / elapsed
+        )
+
+        self.assertEqual(made + rejected, PROCESSES * TRANSFERS_PER_PROCESS)
+        self.assertGreater(made, 0)
+        self.assertEqual(TransferTransaction.objects.count(), made)
+        self.assertEqual(
+            Wallet.objects.aggregate(total=Sum('balance'))['total'],
+            USERS * INITIAL_BALANCE
+        )
+        for user in self.users:
+            balance = Wallet.get_balance(user)
+            self.assertGreaterEqual(balance, 0)
+            self.assertEqual(balance, Transaction.get_ledger_balance(user))
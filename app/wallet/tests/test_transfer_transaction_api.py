@@ -3,12 +3,13 @@ from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
-from wallet.models import Transaction
+from wallet.models import Transaction, Wallet
 
 
 TRANSFER_TRANSACTION_URL = reverse(
-    'wallet:transfer-list'
+    'wallet:transfer-transaction-list'
 )
+BATCH_TRANSFER_URL = reverse('wallet:transfer-transaction-batch')
 
 
 class PublicUserBalanceApiTests(TestCase):
@@ -37,6 +38,11 @@ class PrivateUserBalanceApiTests(TestCase):
             email='other@email.com',
             password='testpass',
         )
+        Transaction.objects.create(
+            user=self.user,
+            transaction_type=1,
+            amount=200,
+        )
         self.sender_transaction = Transaction.objects.create(
             user=self.user,
             transaction_type=4,
@@ -69,6 +75,30 @@ class PrivateUserBalanceApiTests(TestCase):
         )
 
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Wallet.get_balance(self.user), 90)
+        self.assertEqual(Wallet.get_balance(self.user2), 110)
+
+    def test_create_transfer_transaction_insufficient_balance(self):
+        """Test that a transfer larger than the balance is rejected"""
+        payload = {
+            "sender_transaction": {
+                "user": self.user.id,
+                "transaction_type": 4,
+                "amount": 101
+            },
+            "receiver_transaction": {
+                "user": self.user2.id,
+                "transaction_type": 3,
+                "amount": 101
+            }
+        }
+        res = self.client.post(
+            TRANSFER_TRANSACTION_URL, payload, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Wallet.get_balance(self.user), 100)
+        self.assertEqual(Wallet.get_balance(self.user2), 100)
 
     def test_create_transfer_transaction_invalid(self):
         """Test creating a new user balance with invalid payload"""
@@ -79,3 +109,43 @@ class PrivateUserBalanceApiTests(TestCase):
         res = self.client.post(TRANSFER_TRANSACTION_URL, payload)
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_transfer_successful(self):
+        """Test paying many receivers in one request"""
+        user3 = get_user_model().objects.create_user(
+            email='third@email.com',
+            password='testpass',
+        )
+        payload = {
+            'transfers': [
+                {'receiver': self.user2.id, 'amount': 30},
+                {'receiver': user3.id, 'amount': 20},
+            ]
+        }
+        res = self.client.post(BATCH_TRANSFER_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data['success']), 2)
+        self.assertEqual(Wallet.get_balance(self.user), 50)
+        self.assertEqual(Wallet.get_balance(self.user2), 130)
+        self.assertEqual(Wallet.get_balance(user3), 20)
+
+    def test_batch_transfer_insufficient_balance(self):
+        """Test that a batch larger than the balance is rejected"""
+        payload = {
+            'transfers': [
+                {'receiver': self.user2.id, 'amount': 60},
+                {'receiver': self.user2.id, 'amount': 60},
+            ]
+        }
+        res = self.client.post(BATCH_TRANSFER_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Wallet.get_balance(self.user), 100)
+
+    def test_batch_transfer_invalid(self):
+        """Test that a batch with invalid payouts is rejected"""
+        payload = {'transfers': [{'receiver': self.user2.id, 'amount': 0}]}
+        res = self.client.post(BATCH_TRANSFER_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,13 +1,20 @@
+from datetime import datetime, timezone
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
-from wallet.models import UserBalance
+from wallet.models import Transaction, UserBalance
 from wallet.serializers import UserBalanceSerializer
 
 
 USER_BALANCE_URL = reverse('wallet:userbalance-list')
+BALANCE_SERIES_URL = reverse('wallet:userbalance-series')
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
 
 
 class PublicUserBalanceApiTests(TestCase):
@@ -45,11 +52,13 @@ class PrivateUserBalanceApiTests(TestCase):
             balance=200,
         )
         res = self.client.get(USER_BALANCE_URL)
-        user_balance = UserBalance.objects.all().order_by('-created_time')
+        user_balance = UserBalance.objects.all().order_by(
+            '-created_time', '-id'
+        )
         serializer = UserBalanceSerializer(user_balance, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_user_balance_limited_to_user(self):
         """Test that user balance returned are for the authenticated user"""
@@ -68,8 +77,10 @@ class PrivateUserBalanceApiTests(TestCase):
         res = self.client.get(USER_BALANCE_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['balance'], user_balance.balance)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(
+            res.data['results'][0]['balance'], user_balance.balance
+        )
 
     def test_create_user_balance_successful(self):
         """Test creating a new user balance"""
@@ -87,3 +98,120 @@ class PrivateUserBalanceApiTests(TestCase):
         res = self.client.post(USER_BALANCE_URL, payload)
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BalanceSeriesApiTests(TestCase):
+    """Test the balance time series API"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='test@email.com',
+            password='testpass',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def record(self, balance, created_time, record_type=UserBalance.SNAPSHOT,
+               user=None):
+        record = UserBalance.objects.create(
+            user=user or self.user,
+            balance=balance,
+            record_type=record_type,
+        )
+        UserBalance.objects.filter(pk=record.pk).update(
+            created_time=created_time
+        )
+
+    def transact(self, transaction_type, amount, created_time):
+        record = Transaction.objects.create(
+            user=self.user,
+            transaction_type=transaction_type,
+            amount=amount,
+        )
+        Transaction.objects.filter(pk=record.pk).update(
+            created_time=created_time
+        )
+
+    def test_last_balance_per_bucket(self):
+        """Test that every bucket holds its last balance"""
+        self.record(50, utc(2023, 1, 31, 23))
+        self.record(100, utc(2023, 2, 1, 8))
+        self.record(80, utc(2023, 2, 1, 20), UserBalance.CHECKPOINT)
+        self.record(70, utc(2023, 2, 3, 9))
+        self.record(999, utc(2023, 2, 3, 10), UserBalance.MANUAL)
+
+        res = self.client.get(BALANCE_SERIES_URL, {
+            'interval': 'day',
+            'start': '2023-02-01T00:00:00Z',
+            'end': '2023-03-01T00:00:00Z',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['opening_balance'], 50)
+        self.assertEqual(res.data['results'], [
+            {'time': utc(2023, 2, 1), 'balance': 80},
+            {'time': utc(2023, 2, 3), 'balance': 70},
+        ])
+
+    def test_transactions_after_last_record(self):
+        """Test that the transactions made after the last record of a
+        bucket are added to its balance"""
+        self.record(50, utc(2023, 1, 31, 22))
+        self.transact(Transaction.CHARGE, 5, utc(2023, 1, 31, 23))
+        self.transact(Transaction.CHARGE, 10, utc(2023, 2, 1, 7))
+        self.record(100, utc(2023, 2, 1, 8))
+        self.transact(Transaction.CHARGE, 20, utc(2023, 2, 1, 12))
+        self.transact(Transaction.PURCHASE, 30, utc(2023, 2, 1, 20))
+        self.transact(Transaction.CHARGE, 40, utc(2023, 2, 2, 9))
+
+        res = self.client.get(BALANCE_SERIES_URL, {
+            'interval': 'day',
+            'start': '2023-02-01T00:00:00Z',
+            'end': '2023-03-01T00:00:00Z',
+        })
+
+        self.assertEqual(res.data['opening_balance'], 55)
+        self.assertEqual(res.data['results'], [
+            {'time': utc(2023, 2, 1), 'balance': 90},
+        ])
+
+    def test_monthly_buckets_limited_to_user(self):
+        """Test that only the balances of the user are returned"""
+        other = get_user_model().objects.create_user(
+            email='other@email.com',
+            password='testpass',
+        )
+        self.record(10, utc(2023, 1, 5))
+        self.record(20, utc(2023, 3, 5))
+        self.record(30, utc(2023, 3, 6), user=other)
+
+        res = self.client.get(BALANCE_SERIES_URL, {
+            'interval': 'month',
+            'start': '2023-01-01T00:00:00Z',
+            'end': '2023-06-01T00:00:00Z',
+        })
+
+        self.assertIsNone(res.data['opening_balance'])
+        self.assertEqual(res.data['results'], [
+            {'time': utc(2023, 1, 1), 'balance': 10},
+            {'time': utc(2023, 3, 1), 'balance': 20},
+        ])
+
+    def test_too_many_buckets(self):
+        """Test that ranges with too many buckets are rejected"""
+        res = self.client.get(BALANCE_SERIES_URL, {
+            'interval': 'hour',
+            'start': '2020-01-01T00:00:00Z',
+            'end': '2023-01-01T00:00:00Z',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_range(self):
+        """Test that start must be before end"""
+        res = self.client.get(BALANCE_SERIES_URL, {
+            'start': '2023-02-01T00:00:00Z',
+            'end': '2023-01-01T00:00:00Z',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
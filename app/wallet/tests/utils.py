@@ -0,0 +1,62 @@
+import json
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+# Scan nodes and the plan key holding the condition narrowing them
+SCAN_NODES = {
+    'Seq Scan': None,
+    'Index Scan': 'Index Cond',
+    'Index Only Scan': 'Index Cond',
+    'Bitmap Heap Scan': 'Recheck Cond',
+}
+
+# Suffix of the monthly and default partitions of a table
+PARTITION_RE = re.compile(r'_(p\d{4}_\d{2}|default)$')
+
+
+def iter_full_scans(plan, limited=False):
+    """Yield the nodes of an EXPLAIN (FORMAT JSON) plan reading a whole
+    relation: sequential scans, and index scans without an index
+    condition unless a LIMIT stops them early"""
+    node_type = plan['Node Type']
+    limited = limited or node_type == 'Limit'
+    if node_type == 'Seq Scan' or (
+        node_type in SCAN_NODES
+        and SCAN_NODES[node_type] not in plan
+        and not limited
+    ):
+        yield plan
+    for child in plan.get('Plans', ()):
+        yield from iter_full_scans(child, limited)
+
+
+def find_full_scans(func, tables):
+    """Run func, EXPLAIN every SELECT it made and return the
+    (table, query) pairs planned as a full scan of one of the given
+    tables. Sequential scans are disabled while planning, so a scan is
+    only reported when no index can narrow the query down."""
+    with CaptureQueriesContext(connection) as context:
+        func()
+    selects = [
+        query['sql'] for query in context.captured_queries
+        if query['sql'].startswith('SELECT')
+    ]
+    scans = []
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            for sql in selects:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                for node in iter_full_scans(plan[0]['Plan']):
+                    table = PARTITION_RE.sub('', node['Relation Name'])
+                    if table in tables:
+                        scans.append((table, sql))
+        finally:
+            cursor.execute('RESET enable_seqscan')
+    return scans
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from wallet import views
+from wallet import async_views, views
 
 
 router = DefaultRouter()
@@ -19,4 +19,16 @@ app_name = 'wallet'
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('report/balances/',
+         views.BalanceReportView.as_view(),
+         name='balance-report'),
+    path('balance-cache/stats/',
+         views.BalanceCacheStatsView.as_view(),
+         name='balance-cache-stats'),
+    path('async/balance/',
+         async_views.balance,
+         name='async-balance'),
+    path('async/transactions/',
+         async_views.transaction_list,
+         name='async-transactions'),
 ]
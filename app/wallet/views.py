@@ -1,43 +1,178 @@
+import csv
+import hashlib
+import itertools
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
 from rest_framework import status
-from rest_framework import viewsets, mixins
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework import generics, viewsets, mixins
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from core.pagination import EstimatedCountPagination
+from wallet.cache import balance_cache
 from wallet.models import (
-    Transaction, UserBalance, TransferTransaction
+    Transaction,
+    UserBalance,
+    TransferTransaction,
+    TransferError,
+    IdempotencyKey,
+    Wallet,
+    DailyRollup,
+)
+from wallet.pagination import (
+    BalanceCursorPagination,
+    TimelineCursorPagination,
 )
+from wallet.parsers import NDJSONParser
 from wallet.serializers import (
     TransactionSerializer,
+    TransactionExportSerializer,
     UserBalanceSerializer,
+    BalanceSeriesSerializer,
     TransferTransactionSerializer,
     TransferTransactionDetailSerializer,
+    BatchTransferSerializer,
+    ValuesSerializer,
 )
 
 
-class BaseViewSet(viewsets.GenericViewSet,
+EXPORT_FIELDS = ('id', 'transaction_type', 'amount', 'created_time')
+
+
+class Echo:
+    """File-like object returning what is written to it"""
+
+    def write(self, value):
+        return value
+
+
+class IdempotentMixin:
+    """Replay the stored response of write requests retried with the
+    same Idempotency-Key header instead of handling them again"""
+    idempotency_header = 'Idempotency-Key'
+
+    def get_request_fingerprint(self, request):
+        data = request.data
+        if hasattr(data, 'lists'):
+            data = dict(data.lists())
+        payload = json.dumps(
+            [request.method, request.path, data],
+            sort_keys=True,
+            cls=DjangoJSONEncoder
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def idempotent(self, request, handler):
+        """Return the response of handler, or the stored one when the
+        request carries a key that was already used"""
+        key = request.headers.get(self.idempotency_header)
+        if key is None:
+            return handler()
+        if not key or len(key) > 255:
+            return Response(
+                data={'error': f'Invalid {self.idempotency_header}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        fingerprint = self.get_request_fingerprint(request)
+        record, handle = IdempotencyKey.claim(request.user, key, fingerprint)
+        if not handle:
+            if record.fingerprint != fingerprint:
+                return Response(
+                    data={'error': f'{self.idempotency_header} was '
+                                   f'used for another request.'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            if record.is_pending:
+                return Response(
+                    data={'error': f'A request with this '
+                                   f'{self.idempotency_header} is still '
+                                   f'being handled.'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            response = Response(
+                data=record.response, status=record.status_code
+            )
+            response['Idempotent-Replayed'] = 'true'
+            return response
+        # The handler runs in its own transactions, retried as a whole,
+        # and the key is not locked meanwhile
+        try:
+            response = handler()
+        except Exception:
+            record.release()
+            raise
+        # Only successful writes are kept, failed ones may be retried
+        if status.is_success(response.status_code):
+            record.store(response.status_code, response.data)
+        else:
+            record.release()
+        return response
+
+
+class ValuesListMixin:
+    """List rows read with values() and serialized by the plan compiled
+    from the serializer class, skipping model instances"""
+
+    def list(self, request, *args, **kwargs):
+        serializer = ValuesSerializer.for_serializer(
+            self.get_serializer_class()
+        )
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values(*serializer.lookups)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(serializer.serialize(rows))
+        return self.get_paginated_response(serializer.serialize(page))
+
+
+class ListPaginationMixin:
+    """Paginate lists as chosen by the WALLET_LIST_PAGINATION setting"""
+    pagination_classes = {
+        'cursor': TimelineCursorPagination,
+        'page': EstimatedCountPagination,
+    }
+
+    @property
+    def pagination_class(self):
+        return self.pagination_classes[settings.WALLET_LIST_PAGINATION]
+
+
+class BaseViewSet(ListPaginationMixin,
+                  ValuesListMixin,
+                  viewsets.GenericViewSet,
                   mixins.ListModelMixin,
                   mixins.CreateModelMixin):
     """Base view set to manage database models"""
-    authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
         """Return objects for the current authenticated user only"""
         return self.queryset.filter(
             user=self.request.user
-        ).order_by('-created_time')
+        ).order_by('-created_time', '-id')
 
     def perform_create(self, serializer):
         """Creating a new transaction"""
         serializer.save(user=self.request.user)
 
 
-class TransactionViewSet(BaseViewSet):
+class TransactionViewSet(IdempotentMixin, BaseViewSet):
     """Manage transaction in the database"""
     serializer_class = TransactionSerializer
     queryset = Transaction.objects.all()
 
+    def create(self, request, *args, **kwargs):
+        return self.idempotent(
+            request, lambda: super(TransactionViewSet, self).create(
+                request, *args, **kwargs
+            )
+        )
+
     @action(
         detail=True,
         methods=['GET'],
@@ -49,16 +184,102 @@ class TransactionViewSet(BaseViewSet):
         balance = Transaction.get_user_balance(user)
         return Response({'user balance': balance})
 
+    @action(
+        detail=False,
+        methods=['POST'],
+        url_path='bulk',
+        parser_classes=[JSONParser, NDJSONParser]
+    )
+    def bulk_create(self, request):
+        """Create many transactions from a JSON list or NDJSON body"""
+        return self.idempotent(request, lambda: self._bulk_create(request))
+
+    def _bulk_create(self, request):
+        max_items = settings.WALLET_BULK_MAX_ITEMS
+        if isinstance(request.data, list) and len(request.data) > max_items:
+            return Response(
+                data={'error': f'At most {max_items} items are allowed.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=self.request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['GET'])
+    def export(self, request):
+        """Stream the transaction history as CSV or NDJSON"""
+        serializer = TransactionExportSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        queryset = Transaction.objects.filter(user=request.user)
+        if 'start' in params:
+            queryset = queryset.filter(created_time__gte=params['start'])
+        if 'end' in params:
+            queryset = queryset.filter(created_time__lt=params['end'])
+        if 'transaction_type' in params:
+            queryset = queryset.filter(
+                transaction_type=params['transaction_type']
+            )
+        rows = queryset.order_by('created_time', 'id').values_list(
+            *EXPORT_FIELDS
+        ).iterator(chunk_size=settings.WALLET_EXPORT_CHUNK_SIZE)
+
+        rows = (
+            (pk, transaction_type, amount, created_time.isoformat())
+            for pk, transaction_type, amount, created_time in rows
+        )
+
+        if params['export_format'] == 'ndjson':
+            content = (
+                json.dumps(dict(zip(EXPORT_FIELDS, row))) + '\n'
+                for row in rows
+            )
+            content_type = 'application/x-ndjson'
+        else:
+            writer = csv.writer(Echo())
+            content = (
+                writer.writerow(row)
+                for row in itertools.chain([EXPORT_FIELDS], rows)
+            )
+            content_type = 'text/csv'
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="transactions.{params["export_format"]}"'
+        )
+        return response
+
 
 class UserBalanceViewSet(BaseViewSet):
     """Manage user balance in database"""
     serializer_class = UserBalanceSerializer
     queryset = UserBalance.objects.all()
 
+    @action(detail=False, methods=['GET'])
+    def series(self, request):
+        """Retrieve the balance at the end of hourly, daily or monthly
+        buckets of a time range"""
+        serializer = BalanceSeriesSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        opening, series = UserBalance.get_balance_series(
+            request.user, params['interval'], params['start'], params['end']
+        )
+        return Response({
+            'interval': params['interval'],
+            'start': params['start'],
+            'end': params['end'],
+            'opening_balance': opening,
+            'results': [
+                {'time': bucket, 'balance': balance}
+                for bucket, balance in series
+            ],
+        })
+
 
-class TransferTransactionViewSet(viewsets.ModelViewSet):
+class TransferTransactionViewSet(IdempotentMixin, ListPaginationMixin,
+                                 ValuesListMixin, viewsets.ModelViewSet):
     """Manage transfer transaction in database"""
-    authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated,)
     serializer_class = TransferTransactionSerializer
     queryset = TransferTransaction.objects.all()
@@ -66,28 +287,35 @@ class TransferTransactionViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Retrieve the transfer transaction for the authenticated user"""
         return self.queryset.select_related(
-            'sender_transaction__user'
-        )
+            'sender_transaction', 'receiver_transaction'
+        ).order_by('-created_time', '-id')
 
     def get_serializer_class(self):
         """Return appropriate serializer class"""
         if self.action == 'retrieve':
             return TransferTransactionDetailSerializer
+        if self.action == 'batch':
+            return BatchTransferSerializer
         return self.serializer_class
 
-
     def create(self, request, *args, **kwargs):
+        return self.idempotent(request, lambda: self._transfer(request))
+
+    def _transfer(self, request):
         serializer = TransferTransactionSerializer(data=request.data)
         if serializer.is_valid(raise_exception=True):
-            TransferTransaction.transfer(
-                sender=serializer.validated_data.get(
-                    'sender_transaction'
-                )['user'],
-                receiver=serializer.validated_data.get(
-                    'receiver_transaction'
-                )['user'],
-                amount=serializer.validated_data['sender_transaction']['amount']
-            )
+            data = serializer.validated_data
+            try:
+                TransferTransaction.transfer(
+                    sender=data['sender_transaction']['user'],
+                    receiver=data['receiver_transaction']['user'],
+                    amount=data['sender_transaction']['amount']
+                )
+            except TransferError as error:
+                return Response(
+                    data={'error': str(error)},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             UserBalance.record_user_balance(
                 user=self.request.user
             )
@@ -99,3 +327,68 @@ class TransferTransactionViewSet(viewsets.ModelViewSet):
             data={'error': serializer.errors},
             status=status.HTTP_400_BAD_REQUEST
         )
+
+    @action(detail=False, methods=['POST'])
+    def batch(self, request):
+        """Transfer from the authenticated user to many receivers"""
+        return self.idempotent(request, lambda: self._batch(request))
+
+    def _batch(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        payouts = [
+            (payout['receiver'], payout['amount'])
+            for payout in serializer.validated_data['transfers']
+        ]
+        try:
+            transfers = TransferTransaction.batch_transfer(
+                sender=request.user,
+                payouts=payouts
+            )
+        except TransferError as error:
+            return Response(
+                data={'error': str(error)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        UserBalance.record_user_balance(user=request.user)
+        return Response(
+            data={
+                'success': TransferTransactionDetailSerializer(
+                    transfers, many=True
+                ).data
+            },
+            status=status.HTTP_201_CREATED
+        )
+
+
+class BalanceCacheStatsView(APIView):
+    """Show hit and miss counters of the balance cache in this process"""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(balance_cache.stats())
+
+
+class BalanceReportView(generics.GenericAPIView):
+    """Report the balance and transaction count of every user, with
+    the grand totals of all users"""
+    permission_classes = (IsAdminUser,)
+    pagination_class = BalanceCursorPagination
+    queryset = Wallet.objects.values('user_id', 'user__email', 'balance')
+
+    def get(self, request):
+        rows = self.paginate_queryset(self.get_queryset())
+        counts = DailyRollup.get_transaction_counts(
+            [row['user_id'] for row in rows]
+        )
+        response = self.get_paginated_response([
+            {
+                'user': row['user_id'],
+                'email': row['user__email'],
+                'balance': row['balance'],
+                'transactions_count': counts.get(row['user_id'], 0),
+            }
+            for row in rows
+        ])
+        response.data['total'] = Wallet.get_totals()
+        return response
@@ -5,6 +5,12 @@ server {
     alias /vol/static;
   }
 
+  location /api/wallet/async/ {
+    proxy_pass          http://${ASYNC_APP_HOST}:${ASYNC_APP_PORT};
+    proxy_set_header    Host $host;
+    proxy_set_header    X-Forwarded-For $proxy_add_x_forwarded_for;
+  }
+
   location / {
     uwsgi_pass    ${APP_HOST}:${APP_PORT}
     include       /etc/nginx/uwsgi_pass;
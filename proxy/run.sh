@@ -2,5 +2,6 @@
 
 set -e
 
-envsubst < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
+envsubst '${LISTEN_PORT} ${APP_HOST} ${APP_PORT} ${ASYNC_APP_HOST} ${ASYNC_APP_PORT}' \
+    < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
 nginx -g 'daemon off;'
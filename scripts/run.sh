@@ -3,7 +3,12 @@
 set -e
 
 python manage.py wait_for_db
-python manage.py collectstatic --noinput
-python manage.py migrate
 
-uwsgi --socket :9000 --worker 4 --master --enable-threads --module config.wsgi
+if [ "$APP_SERVER" = "asgi" ]; then
+    uvicorn config.asgi:application --host 0.0.0.0 --port 9001 --workers 4
+else
+    python manage.py collectstatic --noinput
+    python manage.py migrate
+
+    uwsgi --socket :9000 --worker 4 --master --enable-threads --module config.wsgi
+fi